@@ -0,0 +1,86 @@
+"""Compare fixed and adaptive fetch batch sizes against a local Postgres.
+
+The benchmark builds a temp table and reads it back through a server
+side cursor, first with the old fixed batch size of 50 rows, then with
+the adaptive fetcher used by the runner.
+
+run with::
+
+   FLASK_ENV=test uv run python benchmarks/fetch_size.py \
+       --connection "host=127.0.0.1 user=postgres password=12345" \
+       --rows 1000000 --width 20
+
+"""
+
+import argparse
+import time
+from typing import Any, Callable, Iterator, List
+
+import psycopg2
+
+from runner.scripts.em_fetch import AdaptiveFetcher
+
+
+def fixed_batches(cursor: Any, size: int = 50) -> Iterator[List[Any]]:
+    """Fetch with a fixed batch size, as the runner used to."""
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        yield rows
+
+
+def adaptive_batches(cursor: Any) -> Iterator[List[Any]]:
+    """Fetch with the runner's adaptive batch size."""
+    yield from AdaptiveFetcher(cursor).batches()
+
+
+def measure(conn: Any, name: str, batches: Callable[[Any], Iterator[List[Any]]]) -> None:
+    """Read the benchmark table and print rows/sec."""
+    cursor = conn.cursor(name=f"benchmark_{name}")
+    cursor.execute("select * from fetch_benchmark")
+
+    started = time.monotonic()
+    rows = 0
+    fetches = 0
+    for batch in batches(cursor):
+        rows += len(batch)
+        fetches += 1
+    elapsed = time.monotonic() - started
+
+    cursor.close()
+    conn.rollback()
+
+    print(  # noqa: T201
+        f"{name:>10}: {rows:>10} rows  {fetches:>7} fetches  "
+        f"{elapsed:8.2f}s  {rows / elapsed:12.0f} rows/sec"
+    )
+
+
+def main() -> None:
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--connection", default="host=127.0.0.1 user=postgres password=12345")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--width", type=int, default=20, help="number of text columns")
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.connection)
+    columns = ", ".join(f"md5((i + {x})::text) as col_{x}" for x in range(args.width))
+
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"create temp table fetch_benchmark as "  # noqa: S608
+            f"select i, {columns} from generate_series(1, %s) as i",
+            (args.rows,),
+        )
+    conn.commit()
+
+    measure(conn, "fixed", fixed_batches)
+    measure(conn, "adaptive", adaptive_batches)
+
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Compare sftp transfer speeds at different network latencies.
+
+The benchmark connects to an OpenSSH server through a local proxy that
+delays all traffic, to simulate the round trip time to a remote partner.
+A test file is uploaded and downloaded, first the way the runner used to
+(``SFTPClient.put`` and 1 KB reads) then with pipelined uploads and
+prefetched downloads for a few transfer windows. 1 KB reads are very slow
+on high latency links, so only the first --old-limit MB are read. The test file is
+removed from the server at the end.
+
+run with::
+
+   FLASK_ENV=test uv run python benchmarks/sftp_transfer.py \
+       --host 127.0.0.1 --username me --password secret \
+       --size 64 --latency 0 10 50 --window 2 8 32
+
+"""
+
+import argparse
+import os
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import suppress
+from functools import partial
+from typing import Any, Callable, Deque, Tuple
+
+import paramiko
+from paramiko import SFTPClient
+from paramiko.common import DEFAULT_WINDOW_SIZE
+
+from runner.scripts.em_sftp import download, upload
+
+
+class LatencyProxy:
+    """TCP proxy that delays data by half the round trip in each direction."""
+
+    def __init__(self, host: str, port: int, latency: float) -> None:
+        self.target = (host, port)
+        self.delay = latency / 2
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self.__accept, daemon=True).start()
+
+    def __accept(self) -> None:
+        while True:
+            client, _ = self.server.accept()
+            remote = socket.create_connection(self.target)
+            for source, destination in ((client, remote), (remote, client)):
+                queue: Deque[Tuple[float, bytes]] = deque()
+                ready = threading.Condition()
+                threading.Thread(
+                    target=self.__read, args=(source, queue, ready), daemon=True
+                ).start()
+                threading.Thread(
+                    target=self.__write, args=(destination, queue, ready), daemon=True
+                ).start()
+
+    def __read(self, source: socket.socket, queue: Deque, ready: threading.Condition) -> None:
+        while True:
+            data = b""
+            with suppress(OSError):
+                data = source.recv(65536)
+
+            with ready:
+                queue.append((time.monotonic() + self.delay, data))
+                ready.notify()
+            if not data:
+                return
+
+    @staticmethod
+    def __write(destination: socket.socket, queue: Deque, ready: threading.Condition) -> None:
+        while True:
+            with ready:
+                while not queue:
+                    ready.wait()
+                due, data = queue.popleft()
+
+            time.sleep(max(0, due - time.monotonic()))
+
+            try:
+                if not data:
+                    destination.shutdown(socket.SHUT_WR)
+                    return
+                destination.sendall(data)
+
+            # the other side closed the connection
+            except OSError:
+                return
+
+
+def old_download(conn: SFTPClient, remote: str, limit: int) -> None:
+    """Read 1 KB at a time, as the runner used to."""
+    with conn.open(remote, mode="rb") as sftp_file:
+        for _ in range(limit // 1024):
+            sftp_file.read(1024)
+
+
+def new_download(conn: SFTPClient, remote: str, window: int) -> None:
+    """Read with prefetch."""
+    with download(conn, remote, window) as sftp_file:
+        while sftp_file.read(1024 * 1024):
+            pass
+
+
+def old_upload(conn: SFTPClient, local: str, remote: str) -> None:
+    """Upload with SFTPClient.put, as the runner used to."""
+    conn.put(local, remote, confirm=True)
+
+
+def new_upload(conn: SFTPClient, local: str, remote: str) -> None:
+    """Upload with pipelined writes."""
+    with open(local, "rb") as local_file:
+        upload(conn, local_file, remote)
+
+
+def measure(name: str, size: int, method: Callable[[], Any]) -> None:
+    """Run a transfer and print MB/sec."""
+    started = time.monotonic()
+    method()
+    elapsed = time.monotonic() - started
+
+    print(  # noqa: T201
+        f"{name:>24}: {elapsed:8.2f}s  {size / 1024 / 1024 / elapsed:10.2f} MB/sec"
+    )
+
+
+def main() -> None:
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=22)
+    parser.add_argument("--username", required=True)
+    parser.add_argument("--password", default="")
+    parser.add_argument("--size", type=int, default=64, help="file size in MB")
+    parser.add_argument("--latency", type=int, nargs="+", default=[0, 10, 50], help="ms")
+    parser.add_argument("--window", type=int, nargs="+", default=[2, 8, 32], help="MB")
+    parser.add_argument("--old-limit", type=int, default=2, help="MB read 1 KB at a time")
+    parser.add_argument("--remote", default="atlas_hub_sftp_benchmark")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    old_size = min(size, args.old_limit * 1024 * 1024)
+
+    with tempfile.NamedTemporaryFile() as local:
+        for _ in range(args.size):
+            local.write(os.urandom(1024 * 1024))
+        local.flush()
+
+        for latency in args.latency:
+            proxy = LatencyProxy(args.host, args.port, latency / 1000)
+            print(f"round trip {latency} ms")  # noqa: T201
+
+            for window in [None, *args.window]:
+                window_size = window * 1024 * 1024 if window else DEFAULT_WINDOW_SIZE
+
+                transport = paramiko.Transport(("127.0.0.1", proxy.port))
+                transport.connect(username=args.username, password=args.password)
+                conn = SFTPClient.from_transport(transport, window_size=window_size)
+                assert conn is not None  # noqa: S101
+
+                if window is None:
+                    measure("put", size, partial(old_upload, conn, local.name, args.remote))
+                    measure(
+                        "1 KB reads",
+                        old_size,
+                        partial(old_download, conn, args.remote, old_size),
+                    )
+                else:
+                    measure(
+                        f"pipelined {window} MB",
+                        size,
+                        partial(new_upload, conn, local.name, args.remote),
+                    )
+                    measure(
+                        f"prefetch {window} MB",
+                        size,
+                        partial(new_download, conn, args.remote, window_size),
+                    )
+
+                if latency == args.latency[-1] and window == args.window[-1]:
+                    conn.remove(args.remote)
+
+                conn.close()
+                transport.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare the old chunked delimiter rewrite with the streaming transcoder.
+
+The benchmark writes a pipe delimited file of the requested size, with
+quoted values and multibyte characters, then rewrites it as comma
+separated. The old method read 1 KB chunks and made a new csv reader and
+writer for each chunk, it is run on the first --old-limit MB. Rows split
+between two chunks show up as extra output rows.
+
+run with::
+
+   uv run python benchmarks/transcode.py --size 2048 --block-size 1048576
+
+"""
+
+import argparse
+import csv
+import io
+import tempfile
+import time
+from pathlib import Path
+from typing import IO, Callable
+
+from runner.scripts.em_transcode import transcode
+
+ROW = '{0}|"quoted | value"|café € {0}|2023-01-01 00:00:00|{1}\r\n'
+
+
+def make_file(path: Path, size: int) -> None:
+    """Write a pipe delimited file of about size bytes."""
+    block = "".join(ROW.format(x, "x" * (x % 40)) for x in range(10000)).encode("utf-8")
+
+    with open(path, "wb") as source:
+        written = 0
+        while written < size:
+            source.write(block)
+            written += len(block)
+
+
+def chunked(source: IO[bytes], destination: IO[bytes], delimiter: str, _: int) -> None:
+    """Rewrite 1 KB at a time, as the source readers used to."""
+    output = io.TextIOWrapper(destination, encoding="utf-8", newline="")  # type: ignore[arg-type]
+
+    while True:
+        data = source.read(1024).decode("utf-8", "replace")
+        if not data:
+            break
+        csv.writer(output).writerows(csv.reader(data.splitlines(), delimiter=delimiter))
+
+    output.flush()
+    output.detach()
+
+
+def measure(
+    path: Path,
+    name: str,
+    method: Callable[[IO[bytes], IO[bytes], str, int], None],
+    limit: int,
+    block_size: int,
+) -> None:
+    """Rewrite the benchmark file and print MB/sec."""
+    with open(path, "rb") as source, tempfile.TemporaryFile() as destination:
+        reader = io.BytesIO(source.read(limit)) if limit else source
+
+        started = time.monotonic()
+        method(reader, destination, "|", block_size)
+        elapsed = time.monotonic() - started
+
+        size = limit or path.stat().st_size
+
+        # generated values have no line breaks, each line is a row.
+        destination.seek(0)
+        rows = sum(block.count(b"\n") for block in iter(lambda: destination.read(block_size), b""))
+
+    print(  # noqa: T201
+        f"{name:>10}: {size / 1024 / 1024:10.0f} MB  {rows:>10} rows  "
+        f"{elapsed:8.2f}s  {size / 1024 / 1024 / elapsed:10.1f} MB/sec"
+    )
+
+
+def main() -> None:
+    """Run benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=2048, help="file size in MB")
+    parser.add_argument("--block-size", type=int, default=1024 * 1024)
+    parser.add_argument("--old-limit", type=int, default=64, help="MB read by the old method")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "source.txt"
+        make_file(path, args.size * 1024 * 1024)
+
+        measure(path, "chunked", chunked, args.old_limit * 1024 * 1024, args.block_size)
+        measure(path, "streaming", transcode, 0, args.block_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -252,6 +252,102 @@ class Config:
     # minutes
     DEFAULT_SQL_TIMEOUT = 90
 
+    """
+        Query results are streamed from the database in batches. When
+        enabled, postgres queries run on a server side cursor so the
+        result set is never fully loaded into runner memory.
+    """
+    SQL_STREAMING = True
+    SQL_ITERSIZE = 5000
+
+    """
+        Fetch batch sizes adapt while a query runs. SQL_ITERSIZE is the
+        first batch, following batches grow or shrink toward the byte
+        and time targets. Database connections can set a lower ceiling.
+    """
+    SQL_FETCH_MAX_SIZE = 100000
+    SQL_FETCH_TARGET_BYTES = 8 * 1024 * 1024
+    SQL_FETCH_TARGET_SECONDS = 1
+
+    """
+        Query progress is counted in redis on every fetch. The task log
+        message is only updated every SQL_PROGRESS_LOG_SECONDS seconds,
+        and once more when the query finishes.
+    """
+    SQL_PROGRESS_LOG_SECONDS = 10
+
+    """
+        Database connections are pooled by each runner process. Up to
+        SQL_POOL_SIZE idle connections are kept per database, and closed
+        after SQL_POOL_IDLE_TIMEOUT seconds unused. Set the size to 0 to
+        open a new connection for every run.
+    """
+    SQL_POOL_SIZE = 5
+    SQL_POOL_IDLE_TIMEOUT = 600
+
+    """
+        Postgres and SQL Server sessions are reset before a connection is
+        reused. SQL Server connections that made temp tables are closed.
+        JDBC drivers have no common way to reset a session, so temp tables
+        and session settings carry over into the next task using the
+        connection. Turn SQL_POOL_KEEP_SESSIONS off to open a new JDBC
+        connection for every run.
+    """
+    SQL_POOL_KEEP_SESSIONS = True
+
+    """
+        Partitioned queries run at most SQL_PARTITION_WORKERS partitions
+        at the same time, each on its own database connection.
+    """
+    SQL_PARTITION_WORKERS = 4
+
+    """
+        Parquet output files (requires pyarrow). Query batches are
+        buffered into row groups of about PARQUET_ROW_GROUP_SIZE rows.
+    """
+    PARQUET_ROW_GROUP_SIZE = 100000
+    PARQUET_COMPRESSION = "zstd"
+
+    """
+        Source files are read from SMB, SFTP and FTP servers in blocks of
+        SOURCE_FILE_BLOCK_SIZE bytes. Files with a source delimiter are
+        rewritten as comma separated while they download. FTP uploads
+        are sent in blocks of the same size.
+    """
+    SOURCE_FILE_BLOCK_SIZE = 1024 * 1024
+
+    """
+        Files matching a wildcard source file name are downloaded at the
+        same time, each worker on its own connection. At most
+        SOURCE_DOWNLOAD_WORKERS files are downloaded from one connection
+        at the same time, across all running tasks.
+    """
+    SOURCE_DOWNLOAD_WORKERS = 4
+
+    """
+        Output files are sent to the backup share and to all destinations
+        of a task at the same time, up to DELIVERY_WORKERS at once. Set to
+        1 to send to one destination at a time.
+    """
+    DELIVERY_WORKERS = 4
+
+    """
+        With STREAM_DELIVERY, a run with one output file reads it from disk
+        once, and hands each block to all destinations at the same time.
+        Each destination buffers up to STREAM_DELIVERY_BUFFERS blocks of
+        SOURCE_FILE_BLOCK_SIZE. A slow destination slows the others down,
+        rather than using more memory.
+    """
+    STREAM_DELIVERY = False
+    STREAM_DELIVERY_BUFFERS = 8
+
+    """
+        Folder listings used to find wildcard source files are cached for
+        SOURCE_LISTING_CACHE_SECONDS, so tasks polling the same folder
+        share one listing. Set to 0 to always list the folder.
+    """
+    SOURCE_LISTING_CACHE_SECONDS = 30
+
     """
         SMB Connection for file storage
 
@@ -264,6 +360,51 @@ class Config:
     SMB_SERVER_NAME = "servername"
     SMB_DEFAULT_SHARE = "BackupShare"
 
+    """
+        SMB connections are pooled by each runner process, one pool per
+        server login. Up to SMB_POOL_SIZE idle connections are kept per
+        login, and closed after SMB_POOL_IDLE_TIMEOUT seconds unused.
+        Set the size to 0 to open a new connection for every run.
+    """
+    SMB_POOL_SIZE = 4
+    SMB_POOL_IDLE_TIMEOUT = 300
+
+    """
+        SMB downloads that fail with a network error are resumed from the
+        last byte received, on a new connection, up to SMB_DOWNLOAD_RETRIES
+        times. SMB_DOWNLOAD_TIMEOUT is the seconds to wait for the server.
+    """
+    SMB_DOWNLOAD_RETRIES = 3
+    SMB_DOWNLOAD_TIMEOUT = 120
+
+    """
+        Backup folders known to exist are not checked again for
+        SMB_DIRECTORY_CACHE_SECONDS. The folders of a share are checked
+        again after any failed save. Set to 0 to check every save.
+    """
+    SMB_DIRECTORY_CACHE_SECONDS = 3600
+
+    """
+        With BACKUP_ARCHIVE, output files are saved to the backup share once
+        per file hash, in BACKUP_ARCHIVE_FOLDER, and runs with the same
+        output point to the same file. A daily scheduler job removes archived
+        files that no task file points to, once they were last written
+        more than BACKUP_ARCHIVE_MIN_AGE seconds ago. Runs hold the archived
+        file they use for the same time, so it must be longer than a run.
+    """
+    BACKUP_ARCHIVE = False
+    BACKUP_ARCHIVE_FOLDER = "archive"
+    BACKUP_ARCHIVE_MIN_AGE = 60 * 60 * 24
+
+    """
+        Output files are kept on the runner, up to FILE_CACHE_SIZE bytes, so
+        sending a file again or downloading it does not load it from the
+        backup share. The least recently used files are removed first, and
+        also while free disk space is below MIN_DISK_SPACE. Set to 0 to
+        turn the cache off.
+    """
+    FILE_CACHE_SIZE = 2 * 1024 * 1024 * 1024
+
     """
         Email connection info
     """
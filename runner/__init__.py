@@ -21,6 +21,10 @@ Other Urls
 **********
 
 * /api/send_<type>/<task_id>/<run_id>/<file_id> - use to resend archived output files
+* /api/file/<file_id>/stream - download an archived output file, with range requests
+* /api/database/<database_id>/pool - connection pool statistics of the worker
+* /api/smb/<smb_id>/pool - SMB connection pool statistics of the worker
+* /api/archive/clean - remove archived backup files that are no longer used
 * /api/whoami - returns the username of the active user on the web server
 * /<my_id>/<code_type> - returns tasks's source code for viewing
 
@@ -357,6 +357,7 @@ class ConnectionSftp(db.Model):
     username: Optional[str] = None
     key: Optional[str] = None
     password: Optional[str] = None
+    window_size: Optional[int] = None
 
     id = db.Column(db.Integer, primary_key=True, index=True)
     connection_id = db.Column(db.Integer, db.ForeignKey(Connection.id), nullable=True, index=True)
@@ -368,6 +369,8 @@ class ConnectionSftp(db.Model):
     key = db.Column(db.String(8000), nullable=True)
     password = db.Column(db.Text, nullable=True)
     key_password = db.Column(db.Text, nullable=True)
+    # transfer window in MB, larger windows are faster on high latency links
+    window_size = db.Column(db.Integer, nullable=True)
     task = db.relationship(
         "Task",
         backref="destination_sftp_conn",
@@ -577,6 +580,7 @@ class ConnectionDatabase(db.Model):
     connection_string: Optional[str] = None
     connection_id: Optional[int] = None
     timeout: Optional[int] = None
+    max_fetch_size: Optional[int] = None
 
     id = db.Column(db.Integer, primary_key=True, index=True)
     type_id = db.Column(
@@ -586,6 +590,8 @@ class ConnectionDatabase(db.Model):
     name = db.Column(db.String(500), nullable=True)
     connection_string = db.Column(db.Text, nullable=True)
     timeout = db.Column(db.Integer, nullable=True)
+    # ceiling for the number of rows pulled per fetch
+    max_fetch_size = db.Column(db.Integer, nullable=True)
     task_source = db.relationship(
         "Task",
         backref="source_database_conn",
@@ -678,6 +684,12 @@ class Task(db.Model):
     source_code: Optional[str] = None
 
     source_require_sql_output: Optional[int] = None
+    source_postgres_copy: Optional[int] = None
+    source_partition_count: Optional[int] = None
+    source_partition_column: Optional[str] = None
+    source_partition_predicates: Optional[str] = None
+    source_watermark_column: Optional[str] = None
+    source_watermark_param: Optional[str] = None
 
     query_smb_id: Optional[int] = None
     query_smb_file: Optional[str] = None
@@ -738,16 +750,19 @@ class Task(db.Model):
     destination_sftp_overwrite: Optional[int] = None
     destination_sftp_id: Optional[int] = None
     destination_sftp_dont_send_empty_file: Optional[int] = None
+    destination_sftp_skip_unchanged: Optional[int] = None
 
     destination_ftp: Optional[int] = None
     destination_ftp_overwrite: Optional[int] = None
     destination_ftp_id: Optional[int] = None
     destination_ftp_dont_send_empty_file: Optional[int] = None
+    destination_ftp_skip_unchanged: Optional[int] = None
 
     destination_smb: Optional[int] = None
     destination_smb_overwrite: Optional[int] = None
     destination_smb_id: Optional[int] = None
     destination_smb_dont_send_empty_file: Optional[int] = None
+    destination_smb_skip_unchanged: Optional[int] = None
 
     file_gpg: Optional[int] = None
     file_gpg_id: Optional[int] = None
@@ -798,6 +813,19 @@ class Task(db.Model):
     source_query_include_header = db.Column(db.Integer, nullable=True)
 
     source_require_sql_output = db.Column(db.Integer, nullable=True)
+
+    # use postgres COPY to extract query output
+    source_postgres_copy = db.Column(db.Integer, nullable=True)
+
+    # run the query in partitions, split by a column range or by predicates
+    source_partition_count = db.Column(db.Integer, nullable=True)
+    source_partition_column = db.Column(db.String(1000), nullable=True)
+    source_partition_predicates = db.Column(db.Text, nullable=True)
+
+    # incremental extracts. max of the column is passed to the query in the param
+    source_watermark_column = db.Column(db.String(1000), nullable=True)
+    source_watermark_param = db.Column(db.String(500), nullable=True)
+
     # source git
     source_git = db.Column(db.String(1000), nullable=True)
 
@@ -915,6 +943,7 @@ class Task(db.Model):
         db.Integer, db.ForeignKey(ConnectionSftp.id), nullable=True, index=True
     )
     destination_sftp_dont_send_empty_file = db.Column(db.Integer, nullable=True)
+    destination_sftp_skip_unchanged = db.Column(db.Integer, nullable=True)
 
     # save to ftp server
     destination_ftp = db.Column(db.Integer, nullable=True, index=True)
@@ -923,6 +952,7 @@ class Task(db.Model):
         db.Integer, db.ForeignKey(ConnectionFtp.id), nullable=True, index=True
     )
     destination_ftp_dont_send_empty_file = db.Column(db.Integer, nullable=True)
+    destination_ftp_skip_unchanged = db.Column(db.Integer, nullable=True)
 
     # save to smb server
     destination_smb = db.Column(db.Integer, nullable=True, index=True)
@@ -931,6 +961,7 @@ class Task(db.Model):
         db.Integer, db.ForeignKey(ConnectionSmb.id), nullable=True, index=True
     )
     destination_smb_dont_send_empty_file = db.Column(db.Integer, nullable=True)
+    destination_smb_skip_unchanged = db.Column(db.Integer, nullable=True)
 
     file_gpg = db.Column(db.Integer, nullable=True, index=True)
     file_gpg_id = db.Column(db.Integer, db.ForeignKey(ConnectionGpg.id), nullable=True, index=True)
@@ -1060,3 +1091,48 @@ class TaskParam(db.Model):
     value = db.Column(db.String(8000), nullable=True)
     task_id = db.Column(db.Integer, db.ForeignKey(Task.id), nullable=True, index=True)
     sensitive = db.Column(db.Integer, nullable=True, index=True)
+
+
+@dataclass
+class TaskWatermark(db.Model):
+    """Last extracted value of an incremental task."""
+
+    __tablename__ = "task_watermark"
+    id: Optional[int] = None
+    task_id: Optional[int] = None
+    value: Optional[str] = None
+    job_id: Optional[str] = None
+    updated: Optional[datetime.datetime] = None
+
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    task_id = db.Column(db.Integer, db.ForeignKey(Task.id), nullable=True, index=True, unique=True)
+    value = db.Column(db.String(8000), nullable=True)
+    job_id = db.Column(db.String(1000), nullable=True)
+    updated = db.Column(db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
+
+
+@dataclass
+class TaskDelivery(db.Model):
+    """Last file delivered to each destination of a task."""
+
+    __tablename__ = "task_delivery"
+    id: Optional[int] = None
+    task_id: Optional[int] = None
+    destination: Optional[str] = None
+    file_name: Optional[str] = None
+    file_hash: Optional[str] = None
+    job_id: Optional[str] = None
+    delivered: Optional[datetime.datetime] = None
+
+    id = db.Column(db.Integer, primary_key=True, index=True)
+    task_id = db.Column(db.Integer, db.ForeignKey(Task.id), nullable=True, index=True)
+    # destination type and connection id, for example sftp-1
+    destination = db.Column(db.String(100), nullable=True)
+    file_name = db.Column(db.String(1000), nullable=True)
+    file_hash = db.Column(db.String(1000), nullable=True)
+    job_id = db.Column(db.String(1000), nullable=True)
+    delivered = db.Column(
+        db.DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now
+    )
+
+    __table_args__ = (db.Index("ix_task_delivery_task_id_destination", "task_id", "destination"),)
@@ -0,0 +1,174 @@
+"""Local cache of output files.
+
+Output files are kept on the runner after a run, and after they are
+loaded from the backup share, so sending a file again or downloading it
+does not load it from the backup share every time. Files are kept under
+their task file id and md5 hash, up to FILE_CACHE_SIZE bytes. The least
+recently used files are removed first.
+
+The access time of a cached file is its last use. The modified time is
+left alone, because downloads use it for their ETag and Last-Modified
+headers, and a resumed download only gets the rest of the file if they
+have not changed.
+
+Cached files are also removed while free disk space is below
+MIN_DISK_SPACE, so the cache does not stop tasks from running.
+
+Files are hard linked in and out of the cache when possible, so a cached
+output file does not use more disk space while its run folder exists.
+Removing a file that is still linked from a run folder frees no disk
+space, so those files are kept when disk space is low.
+"""
+
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+import psutil
+from flask import current_app as app
+
+
+def _link(source: Union[str, Path], destination: Path) -> None:
+    """Link a file to a new name, or copy it to another disk."""
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copyfile(source, destination)
+
+
+class FileCache:
+    """Disk backed cache of output files, keyed by file id and hash."""
+
+    def __init__(self, folder: Path) -> None:
+        """Set up class parameters."""
+        self.folder = folder
+        self.lock = threading.Lock()
+
+    def __path(self, file_id: int, file_hash: Optional[str]) -> Optional[Path]:
+        # files without a hash cannot be checked and are not cached
+        if not file_hash or int(app.config.get("FILE_CACHE_SIZE", 0)) <= 0:
+            return None
+
+        return self.folder / f"{int(file_id)}-{file_hash}"
+
+    @staticmethod
+    def __use(path: Path) -> None:
+        """Mark a cached file as used, without changing its modified time."""
+        os.utime(path, ns=(time.time_ns(), path.stat().st_mtime_ns))
+
+    def find(self, file_id: int, file_hash: Optional[str]) -> Optional[Path]:
+        """Get the path of a cached file, marking it as used.
+
+        :returns: the cached file, or None if the file is not cached.
+        """
+        path = self.__path(file_id, file_hash)
+
+        if path is None:
+            return None
+
+        try:
+            self.__use(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    def get(self, file_id: int, file_hash: Optional[str], destination: Path) -> Optional[Path]:
+        """Copy a cached file to destination.
+
+        :returns: destination, or None if the file is not cached.
+        """
+        path = self.find(file_id, file_hash)
+
+        if path is None:
+            return None
+
+        try:
+            if destination.is_symlink() or destination.is_file():
+                destination.unlink()
+
+            _link(path, destination)
+
+        # the file was just removed
+        except FileNotFoundError:
+            return None
+
+        return destination
+
+    def add(self, file_id: int, file_hash: Optional[str], source: Union[str, Path]) -> None:
+        """Add a file to the cache, removing old files to make room."""
+        path = self.__path(file_id, file_hash)
+
+        if path is None or os.path.getsize(source) > int(app.config["FILE_CACHE_SIZE"]):
+            return
+
+        self.folder.mkdir(parents=True, exist_ok=True)
+
+        # files are added under a temp name, so a half copied file is never used
+        temp_path = self.folder / f"{path.name}.{os.getpid()}.{threading.get_ident()}.part"
+
+        try:
+            _link(source, temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        self.__use(path)
+
+        self.trim()
+
+    def trim(self) -> int:
+        """Remove the least recently used files.
+
+        Files are removed until the cache is under FILE_CACHE_SIZE and free
+        disk space is over MIN_DISK_SPACE. Only files that are not linked
+        from anywhere else are removed to free disk space.
+
+        :returns: number of removed files.
+        """
+        size = int(app.config.get("FILE_CACHE_SIZE", 0))
+        min_disk_space = int(app.config.get("MIN_DISK_SPACE", 0))
+        removed = 0
+
+        if not self.folder.exists():
+            return removed
+
+        with self.lock:
+            files = []
+            for path in self.folder.iterdir():
+                if path.suffix == ".part":
+                    continue
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((stat.st_atime, stat.st_size, stat.st_nlink, path))
+
+            files.sort()
+            total = sum(file_size for _, file_size, _, _ in files)
+
+            for _, file_size, links, path in files:
+                if total <= size:
+                    if psutil.disk_usage(str(self.folder)).free >= min_disk_space:
+                        break
+
+                    # the file is still linked from a run folder
+                    if links > 1:
+                        continue
+
+                try:
+                    path.unlink()
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+
+                total -= file_size
+
+        return removed
+
+
+file_cache = FileCache(Path(__file__).parent.parent / "cache")
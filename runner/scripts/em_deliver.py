@@ -0,0 +1,64 @@
+"""Deliver output files to their destinations.
+
+An output file is sent to the backup share and to each destination of the
+task at the same time, so a run takes about as long as its slowest
+destination instead of the sum of all of them. Up to DELIVERY_WORKERS
+destinations are sent to at once.
+
+Destinations that are already running are allowed to finish when another
+one fails. The first error, in destination order, is then raised.
+
+Errors in the delivery threads are not handled there, because the threads
+do not own the run's database session. The error is logged, and the task
+updated, when it is raised again on the run's thread.
+
+Set DELIVERY_WORKERS to 1 to send to one destination at a time, stopping
+at the first error.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Any, Callable, List
+
+from flask import current_app as app
+
+from runner.scripts.em_messages import RunnerException, deferred_errors
+
+
+def deliver(deliveries: List[Callable[[], Any]], workers: int = 0) -> List[Any]:
+    """Run the deliveries of one file.
+
+    :param deliveries: sends the file to one destination.
+    :param workers: number of workers. Defaults to DELIVERY_WORKERS.
+    :returns: the result of each delivery, in the order of the deliveries.
+    """
+    size = workers or int(app.config.get("DELIVERY_WORKERS", 4))
+
+    if size <= 1 or len(deliveries) <= 1:
+        return [delivery() for delivery in deliveries]
+
+    # pylint: disable=protected-access
+    flask_app = app._get_current_object()  # type: ignore[attr-defined]
+
+    def run(delivery: Callable[[], Any]) -> Any:
+        with flask_app.app_context(), deferred_errors():
+            return delivery()
+
+    with ThreadPoolExecutor(max_workers=min(size, len(deliveries))) as executor:
+        futures = [executor.submit(run, delivery) for delivery in deliveries]
+
+        wait(futures)
+
+    for future in futures:
+        error = future.exception()
+
+        if isinstance(error, RunnerException) and error.deferred:
+            # raised here, so the trace of the delivery thread is logged
+            try:
+                raise error
+            except RunnerException:
+                raise error.handle() from error
+
+        if error is not None:
+            raise error
+
+    return [future.result() for future in futures]
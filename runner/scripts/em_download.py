@@ -0,0 +1,97 @@
+"""Parallel source file downloads.
+
+A wildcard source file name can match many files. They are downloaded at
+the same time by a small pool of workers. Each worker opens its own
+connection to the server and reuses it for all of the files it downloads.
+
+The number of downloads running at the same time from one connection is
+capped at SOURCE_DOWNLOAD_WORKERS. The cap is shared by all tasks run by
+this runner, so tasks reading from the same partner do not flood it.
+
+Downloaded files are returned in the order they were matched, so the
+files are processed the same way on every run.
+"""
+
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import suppress
+from typing import IO, Any, Callable, Dict, List
+
+from flask import current_app as app
+
+# download slots of each connection
+_limits: Dict[str, threading.BoundedSemaphore] = {}
+_limits_lock = threading.Lock()
+
+
+def connection_limit(key: str, size: int) -> threading.BoundedSemaphore:
+    """Get the download slots of a connection."""
+    with _limits_lock:
+        if key not in _limits:
+            _limits[key] = threading.BoundedSemaphore(max(1, size))
+
+        return _limits[key]
+
+
+# pylint: disable=too-many-arguments
+def download_files(
+    key: str,
+    file_list: List[str],
+    load: Callable[[Any, str, int, int], IO[str]],
+    connect: Callable[[], Any],
+    close: Callable[[Any], None],
+    workers: int = 0,
+) -> List[IO[str]]:
+    """Download a list of files at the same time.
+
+    :param key: name of the connection the cap is counted for.
+    :param load: downloads one file with a worker connection. It is passed
+        the connection, file name, file number and number of files.
+    :param connect: opens a worker connection.
+    :param close: closes a worker connection.
+    :param workers: number of workers. Defaults to SOURCE_DOWNLOAD_WORKERS.
+    :returns: the downloaded files, in the order of the file list.
+    """
+    size = workers or int(app.config.get("SOURCE_DOWNLOAD_WORKERS", 4))
+    limit = connection_limit(key, size)
+
+    # pylint: disable=protected-access
+    flask_app = app._get_current_object()  # type: ignore[attr-defined]
+
+    local = threading.local()
+    opened: List[Any] = []
+    opened_lock = threading.Lock()
+
+    def worker_connection() -> Any:
+        if not hasattr(local, "conn"):
+            local.conn = connect()
+            with opened_lock:
+                opened.append(local.conn)
+
+        return local.conn
+
+    def download(index: int, file_name: str) -> IO[str]:
+        with flask_app.app_context(), limit:
+            return load(worker_connection(), file_name, index, len(file_list))
+
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, min(size, len(file_list)))) as executor:
+            futures = [
+                executor.submit(download, index, file_name)
+                for index, file_name in enumerate(file_list, 1)
+            ]
+
+            done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+
+            for future in done:
+                if future.exception() is not None:
+                    for other in pending:
+                        other.cancel()
+                    raise future.exception()  # type: ignore[misc]
+
+            return [future.result() for future in futures]
+
+    finally:
+        for conn in opened:
+            with suppress(BaseException):
+                close(conn)
@@ -0,0 +1,102 @@
+"""Adaptive batch fetching for database cursors.
+
+Rows are pulled from a cursor with ``fetchmany``. Instead of using a fixed
+batch size, the size of the next batch is picked from how large and how
+slow the previous batch was.
+
+Narrow, fast result sets grow toward large batches (fewer round trips),
+while very wide rows (xml, large text columns) shrink back toward small
+batches so runner memory stays flat.
+"""
+
+import time
+from typing import Any, Generator, List, Optional
+
+from flask import current_app as app
+
+
+class AdaptiveFetcher:
+    """Fetch rows from a cursor in batches sized toward a target.
+
+    :param cursor: any dbapi cursor with ``fetchmany``.
+    :param start: size of the first batch.
+    :param maximum: ceiling for the batch size.
+    :param minimum: floor for the batch size.
+    :param target_bytes: approximate size in bytes of one batch.
+    :param target_seconds: approximate time one batch should take to fetch.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        cursor: Any,
+        start: int = 5000,
+        maximum: Optional[int] = None,
+        minimum: int = 1,
+        target_bytes: int = 8 * 1024 * 1024,
+        target_seconds: float = 1.0,
+    ) -> None:
+        """Set up class parameters."""
+        self.cursor = cursor
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum or 100000, self.minimum)
+        self.target_bytes = target_bytes
+        self.target_seconds = target_seconds
+        self.size = self.__clamp(start)
+
+        # size used for the most recent fetch
+        self.requested = self.size
+
+    @classmethod
+    def from_config(cls, cursor: Any, maximum: Optional[int] = None) -> "AdaptiveFetcher":
+        """Build a fetcher using the runner config.
+
+        :param maximum: connection specific ceiling, overrides the config ceiling.
+        """
+        return cls(
+            cursor,
+            start=int(app.config.get("SQL_ITERSIZE", 5000)),
+            maximum=maximum or app.config.get("SQL_FETCH_MAX_SIZE", 100000),
+            target_bytes=int(app.config.get("SQL_FETCH_TARGET_BYTES", 8 * 1024 * 1024)),
+            target_seconds=float(app.config.get("SQL_FETCH_TARGET_SECONDS", 1.0)),
+        )
+
+    def __clamp(self, size: float) -> int:
+        return int(min(max(size, self.minimum), self.maximum))
+
+    @staticmethod
+    def row_bytes(row: Any) -> int:
+        """Estimate the written size of a row."""
+        return sum(len(str(value)) + 1 for value in row if value is not None) or 1
+
+    def resize(self, rows: List[Any], elapsed: float) -> None:
+        """Pick the next batch size from the last batch.
+
+        The size moves toward whichever target (bytes or time) is hit
+        first, but never more than doubles or halves in one step so a
+        single slow batch does not swing the size around.
+        """
+        # sample the first row only, checking every row costs as much as writing it.
+        wanted = self.target_bytes / self.row_bytes(rows[0])
+
+        if elapsed > 0:
+            # rows per second from the last batch
+            wanted = min(wanted, len(rows) / elapsed * self.target_seconds)
+
+        self.size = self.__clamp(min(max(wanted, self.size / 2), self.size * 2))
+
+    def batches(self) -> Generator[List[Any], None, None]:
+        """Return batches of rows until the cursor is empty."""
+        while True:
+            self.requested = self.size
+
+            started = time.monotonic()
+            rows = self.cursor.fetchmany(self.requested)
+            elapsed = time.monotonic() - started
+
+            if not rows:
+                break
+
+            yield rows
+
+            self.resize(rows, elapsed)
@@ -2,20 +2,20 @@
 
 import csv
 import hashlib
+import io
 import os
+import shutil
 import sys
-import zipfile
+from dataclasses import dataclass
 from pathlib import Path
-from typing import IO, Optional, Tuple, Union
-
-import gnupg
-from crypto import em_decrypt
-from flask import current_app as app
+from typing import IO, Any, List, Optional, Tuple, Union
 
 from runner.model import Task
 from runner.scripts.em_date import DateParsing
-from runner.scripts.em_messages import RunnerException, RunnerLog
+from runner.scripts.em_messages import RunnerLog
 from runner.scripts.em_params import ParamLoader
+from runner.scripts.em_parquet import PARQUET_FILE_TYPE, csv_to_parquet, is_parquet
+from runner.scripts.em_stages import OutputStages
 
 # set the limit for a csv cell value to something massive.
 # this is needed when users are building xml in a sql query
@@ -33,6 +33,41 @@ while True:
     except OverflowError:
         MAX_INT = int(MAX_INT / 10)
 
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def passthrough(source: str, destination: str, file_hash: Optional[Any] = None) -> bool:
+    """Copy a file that needs no changes without reading it into python.
+
+    The file is hard linked when possible, otherwise copied by the kernel.
+    When a hash is passed in, the copy is done in python instead, and the
+    hash is updated from the same buffer so the file is only read once.
+
+    :returns: True if the hash was updated.
+    """
+    try:
+        os.link(source, destination)
+        return False
+    except OSError:
+        pass
+
+    if file_hash is None:
+        shutil.copyfile(source, destination)
+        return False
+
+    buffer = bytearray(COPY_BUFFER_SIZE)
+    view = memoryview(buffer)
+
+    with open(source, "rb") as source_file, open(destination, "wb") as destination_file:
+        while True:
+            size = source_file.readinto(buffer)
+            if not size:
+                break
+            file_hash.update(view[:size])
+            destination_file.write(view[:size])
+
+    return True
+
 
 def file_size(size: Union[str, int]) -> str:
     """Convert file size from bytes to appropriate file size string.
@@ -50,6 +85,24 @@ def file_size(size: Union[str, int]) -> str:
     return str(size) + " bytes"
 
 
+@dataclass
+class FormattedFile:
+    """Output file already written in the destination file format.
+
+    :name: path of the written file, or zip archive.
+    :file_name: destination file name.
+    :file_hash: md5 hash of the file, after encrypting.
+    :zip_name: zip archive name, if the file was zipped.
+    :encrypted: if the file was encrypted.
+    """
+
+    name: str
+    file_name: str
+    file_hash: Any
+    zip_name: Optional[str] = None
+    encrypted: bool = False
+
+
 class File:
     """Files are created in the drive /em/temp/ from any data sent.
 
@@ -104,11 +157,8 @@ class File:
 
         return '"'
 
-    def save(self) -> Tuple[str, str, str]:
-        """Create and save the file.
-
-        returns [filename, filepath] of final file.
-        """
+    def build_file_name(self) -> None:
+        """Get the destination file name and path from the task settings."""
         if self.task.destination_file_name is None or self.task.destination_file_name == "":
             RunnerLog(
                 self.task,
@@ -135,6 +185,91 @@ class File:
 
         self.file_path = str(Path(self.base_path).joinpath(self.file_name))
 
+    def build_zip_name(self) -> str:
+        """Get the zip archive name from the task settings."""
+        zip_name = DateParsing(
+            self.task, self.run_id, str(self.task.destination_zip_name)
+        ).string_to_date()
+
+        # parse params
+        zip_name = self.params.insert_file_params(zip_name)
+
+        return zip_name.replace(".zip", "") + ".zip"
+
+    def writer(self, myfile: IO[str]) -> Optional[Any]:
+        """Get a csv writer for the destination file format.
+
+        Returns None when lines should be copied as they are.
+        """
+        # if csv (1) or text (2) and had delimiter
+        if (
+            self.task.destination_file_type_id == 1
+            or self.task.destination_file_type_id == 2
+            or self.task.destination_file_type_id == 4
+        ) and (
+            self.task.destination_ignore_delimiter is None
+            or self.task.destination_ignore_delimiter != 1
+        ):
+            return (
+                csv.writer(
+                    myfile,
+                    delimiter=str(self.task.destination_file_delimiter)
+                    .encode("utf-8")
+                    .decode("unicode_escape"),
+                    quoting=self.__quote_level(),
+                    quotechar=self.__quotechar(),
+                )
+                if self.task.destination_file_delimiter is not None
+                and len(self.task.destination_file_delimiter) > 0
+                and (
+                    self.task.destination_file_type_id == 2
+                    or self.task.destination_file_type_id == 4
+                )  # txt or other
+                else csv.writer(
+                    myfile,
+                    quoting=self.__quote_level(),
+                    quotechar=self.__quotechar(),
+                )
+            )
+
+        # if xlxs (3)
+        if self.task.destination_file_type_id == 3:
+            return csv.writer(
+                myfile,
+                dialect="excel",
+                quoting=self.__quote_level(),
+                quotechar=self.__quotechar(),
+            )
+
+        return None
+
+    def format_row(self, row: List[Any]) -> List[Any]:
+        """Clean up a row before writing it to the destination file."""
+        new_row = [(x.strip('"').strip("'") if isinstance(x, str) else x) for x in row]
+
+        if (
+            self.task.destination_file_type_id == 1
+            or self.task.destination_file_type_id == 2
+            or self.task.destination_file_type_id == 4
+        ) and (
+            self.task.destination_file_line_terminator is not None
+            and self.task.destination_file_line_terminator != ""
+        ):
+            new_row.append(self.task.destination_file_line_terminator)
+
+        return new_row
+
+    def save(self) -> Tuple[str, str, str]:
+        """Create and save the file.
+
+        returns [filename, filepath] of final file.
+        """
+        # query output that was already written in the destination format.
+        if isinstance(self.data_file, FormattedFile):
+            return self.__saved(self.data_file)
+
+        self.build_file_name()
+
         # if the source name matches the destination name, rename the source and update tmp file name.
         if self.data_file.name == self.file_path:
             data_file_as_path = Path(self.data_file.name)
@@ -145,176 +280,98 @@ class File:
             os.rename(self.data_file.name, new_data_file_name)
             self.data_file.name = new_data_file_name  # type: ignore[misc]
 
-        # if ignore delimiter is checked, then use binary to copy contents
-        if self.task.destination_ignore_delimiter == 1:
-            with (
-                open(self.data_file.name, "rb") as data_file_binary,
-                open(self.file_path, mode="wb") as myfile_binary,
-            ):
-                for line_binary in data_file_binary:
-                    myfile_binary.write(line_binary)
-
-        # otherwise use unicode.
-        else:
-            with open(self.data_file.name, "r", newline="") as data_file:
-                reader = csv.reader(data_file)
-
-                with open(self.file_path, mode="w") as myfile:
-                    # if csv (1) or text (2) and had delimiter
-
-                    if (
-                        self.task.destination_file_type_id == 1
-                        or self.task.destination_file_type_id == 2
-                        or self.task.destination_file_type_id == 4
-                    ) and (
-                        self.task.destination_ignore_delimiter is None
-                        or self.task.destination_ignore_delimiter != 1
-                    ):
-                        wrtr = (
-                            csv.writer(
-                                myfile,
-                                delimiter=str(self.task.destination_file_delimiter)
-                                .encode("utf-8")
-                                .decode("unicode_escape"),
-                                quoting=self.__quote_level(),
-                                quotechar=self.__quotechar(),
-                            )
-                            if self.task.destination_file_delimiter is not None
-                            and len(self.task.destination_file_delimiter) > 0
-                            and (
-                                self.task.destination_file_type_id == 2
-                                or self.task.destination_file_type_id == 4
-                            )  # txt or other
-                            else csv.writer(
-                                myfile,
-                                quoting=self.__quote_level(),
-                                quotechar=self.__quotechar(),
-                            )
-                        )
-                        for row in reader:
-                            new_row = [
-                                (x.strip('"').strip("'") if isinstance(x, str) else x) for x in row
-                            ]
-
-                            if (
-                                self.task.destination_file_type_id == 1
-                                or self.task.destination_file_type_id == 2
-                                or self.task.destination_file_type_id == 4
-                            ) and (
-                                self.task.destination_file_line_terminator is not None
-                                and self.task.destination_file_line_terminator != ""
-                            ):
-                                new_row.append(self.task.destination_file_line_terminator)
-
-                            wrtr.writerow(new_row)
-
-                    # if xlxs (3)
-                    elif self.task.destination_file_type_id == 3:
-                        wrtr = csv.writer(
-                            myfile,
-                            dialect="excel",
-                            quoting=self.__quote_level(),
-                            quotechar=self.__quotechar(),
-                        )
-                        for row in reader:
-                            new_row = [
-                                (x.strip('"').strip("'") if isinstance(x, str) else x) for x in row
-                            ]
-                            wrtr.writerow(new_row)
+        zip_name = self.build_zip_name() if self.task.destination_create_zip == 1 else None
+        source = self.data_file.name
+        is_parquet_type = self.task.destination_file_type_id == PARQUET_FILE_TYPE
 
-                    else:
-                        for line in data_file:
-                            myfile.write(line)
-
-        RunnerLog(
-            self.task,
-            self.run_id,
-            11,
-            f"File {self.file_name} created. Size: {file_size(Path(self.file_path).stat().st_size)}.\n{self.file_path}",
+        # if ignore delimiter is checked, the query was already saved as parquet,
+        # or the file type has no formatting, then the file is passed through as is.
+        unchanged = (
+            self.task.destination_ignore_delimiter == 1
+            or (is_parquet_type and is_parquet(source))
+            or self.task.destination_file_type_id not in (1, 2, 3, 4, PARQUET_FILE_TYPE)
         )
 
-        # encrypt file
-        if self.task.file_gpg == 1:
-            gpg = gnupg.GPG("/usr/local/bin/gpg")
+        # convert other files, like processing script output, to parquet.
+        if is_parquet_type and not unchanged:
+            csv_to_parquet(source, self.file_path, bool(self.task.source_query_include_header))
+            source = self.file_path
+            unchanged = True
 
-            # import the key
-            keychain = gpg.import_keys(
-                em_decrypt(self.task.file_gpg_conn.key, app.config["PASS_KEY"])
+        if unchanged and not zip_name and self.task.file_gpg != 1:
+            hashed = source != self.file_path and passthrough(
+                source, self.file_path, self.file_hash
             )
 
-            # set it to trusted
-            gpg.trust_keys(keychain.fingerprints, "TRUST_ULTIMATE")
-
-            # encrypt file
-            with open(self.file_path, "rb") as my_file:
-                encrypt_status = gpg.encrypt_file(
-                    my_file,  # the file
-                    keychain.fingerprints,  # the recipients
-                    output=self.file_path + ".gpg",
-                )
-
-            # remove key
-            gpg.delete_keys(keychain.fingerprints)
-
-            # update global file name
-            if not encrypt_status.ok:
-                raise RunnerException(
-                    self.task,
-                    self.run_id,
-                    11,
-                    "File failed to encrypt.\n%s\n%s\n%s"
-                    % (
-                        self.file_path,
-                        encrypt_status.status,
-                        encrypt_status.stderr,
-                    ),
+            if not hashed:
+                with open(self.file_path, "rb") as my_file:
+                    while True:
+                        chunk = my_file.read(8192)
+                        if not chunk:
+                            break
+                        self.file_hash.update(chunk)
+
+            return self.__saved(
+                FormattedFile(
+                    name=self.file_path, file_name=self.file_name, file_hash=self.file_hash
                 )
-
-            self.file_path = self.file_path + ".gpg"
-            self.file_name = self.file_name + ".gpg"
-
-            RunnerLog(
-                self.task,
-                self.run_id,
-                11,
-                "File encrypted.\n%s\n%s\n%s"
-                % (self.file_path, encrypt_status.status, encrypt_status.stderr),
             )
 
-        # get file hash.. after encrypting
-        with open(self.file_path, "rb") as my_file:
-            while True:
-                chunk = my_file.read(8192)
-                if not chunk:
-                    break
-                self.file_hash.update(chunk)
-
-        RunnerLog(self.task, self.run_id, 11, f"File md5 hash: {self.file_hash.hexdigest()}")
-
-        # create zip
-        if self.task.destination_create_zip == 1:
-            self.zip_name = DateParsing(
-                self.task, self.run_id, str(self.task.destination_zip_name)
-            ).string_to_date()
+        # encrypt, hash and zip the file while it is written.
+        with OutputStages(self.task, self.base_path, self.file_name, zip_name) as stages:
+            if unchanged:
+                with open(source, "rb") as data_file_binary:
+                    shutil.copyfileobj(data_file_binary, stages.binary, COPY_BUFFER_SIZE)
+
+            # otherwise use unicode.
+            else:
+                with (
+                    open(source, "r", newline="") as data_file,
+                    io.TextIOWrapper(stages.binary) as myfile,
+                ):
+                    reader = csv.reader(data_file)
+                    wrtr = self.writer(myfile)
+
+                    if wrtr is not None:
+                        for row in reader:
+                            wrtr.writerow(self.format_row(row))
+
+        # remove the unencrypted parquet file
+        if source == self.file_path:
+            Path(source).unlink()
+
+        return self.__saved(
+            FormattedFile(
+                name=stages.file_path,
+                file_name=stages.file_name,
+                file_hash=stages.file_hash,
+                zip_name=zip_name,
+                encrypted=stages.encrypted,
+            )
+        )
 
-            # parse params
-            self.zip_name = self.params.insert_file_params(self.zip_name)
+    def __saved(self, saved: "FormattedFile") -> Tuple[str, str, str]:
+        """Log details of the finished file."""
+        self.file_name = saved.file_name
+        self.file_path = saved.name
+        self.file_hash = saved.file_hash
 
-            self.zip_name = self.zip_name.replace(".zip", "") + ".zip"
+        RunnerLog(
+            self.task,
+            self.run_id,
+            11,
+            f"File {self.file_name} created{' in ZIP archive' if saved.zip_name else ''}. Size: {file_size(Path(self.file_path).stat().st_size)}.\n{self.file_path}",
+        )
 
-            with zipfile.ZipFile(
-                str(Path(self.base_path).joinpath(self.zip_name)), "w"
-            ) as zip_file:
-                zip_file.write(
-                    self.file_path,
-                    compress_type=zipfile.ZIP_DEFLATED,
-                    arcname=self.file_name,
-                )
+        if saved.encrypted:
+            RunnerLog(self.task, self.run_id, 11, f"File encrypted.\n{self.file_name}")
 
-            # now we change all file stuff to our zip.
+        RunnerLog(self.task, self.run_id, 11, f"File md5 hash: {self.file_hash.hexdigest()}")
 
+        # now we change all file stuff to our zip.
+        if saved.zip_name:
+            self.zip_name = saved.zip_name
             self.file_name = self.zip_name
-            self.file_path = str(Path(self.base_path).joinpath(self.zip_name))
 
             RunnerLog(self.task, self.run_id, 11, f"ZIP archive created.\n{self.file_path}")
 
@@ -1,7 +1,5 @@
 """FTP connection manager."""
 
-import csv
-import fnmatch
 import ftplib  # noqa: S402
 import os
 import re
@@ -10,12 +8,15 @@ import tempfile
 import time
 from ftplib import FTP  # noqa: S402
 from pathlib import Path
-from typing import IO, Any, Dict, Generator, List, Optional, Tuple
+from typing import IO, Dict, List, Optional, Tuple
 
 from flask import current_app as app
 
 from runner.model import ConnectionFtp, Task
+from runner.scripts.em_download import download_files
+from runner.scripts.em_glob import find_files
 from runner.scripts.em_messages import RunnerException, RunnerLog
+from runner.scripts.em_transcode import DEFAULT_BLOCK_SIZE, transcode
 
 sys.path.append(str(Path(__file__).parents[2]) + "/scripts")
 from crypto import em_decrypt
@@ -92,7 +93,15 @@ class Ftp:
         except ValueError as e:
             raise RunnerException(self.task, self.run_id, 13, str(e))
 
-    def _walk(self, directory: str) -> Generator[Tuple[str, List[Any], List[str]], None, None]:
+    def __worker_connect(self) -> FTP:
+        """Open a connection for a download worker."""
+        conn = connect(self.connection)
+        conn.cwd(self.__clean_path(self.connection.path or "/"))
+
+        return conn
+
+    def _list_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """List the folders and files in a folder."""
         dirs = []
         nondirs = []
 
@@ -100,38 +109,40 @@ class Ftp:
             if stats["type"] == "dir":
                 dirs.append(name)
             elif stats["type"] == "file":
-                nondirs.append(str(Path(directory).joinpath(name)))
-
-        yield directory, dirs, nondirs
+                nondirs.append(name)
 
-        # Recurse into sub-directories
-        for dirname in dirs:
-            new_path = str(Path(directory).joinpath(dirname))
-            yield from self._walk(new_path)
+        return dirs, nondirs
 
-    def __load_file(self, file_name: str) -> IO[str]:
-        """Download file from sftp server."""
-        my_binary: List[bytes] = []
+    def __load_file(self, file_name: str, conn: Optional[FTP] = None) -> IO[str]:
+        """Download file from ftp server.
 
-        def handle_binary(more_data: bytes) -> None:
-            my_binary.append(more_data)
+        The file is streamed from the data connection into the temp file
+        one block at a time, the same as ``retrbinary``.
 
-        self.conn.retrbinary("RETR " + file_name, callback=handle_binary)
-        data = "".join([str(x) for x in my_binary])
-
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, dir=self.dir) as data_file:
-            if self.task.source_sftp_ignore_delimiter != 1 and self.task.source_sftp_delimiter:
-                my_delimiter = self.task.source_sftp_delimiter or ","
-
-                csv_reader = csv.reader(
-                    data.splitlines(),
-                    delimiter=my_delimiter,
+        :param conn: connection to download with, defaults to the task connection.
+        """
+        conn = conn or self.conn
+        block_size = app.config.get("SOURCE_FILE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE)
+
+        conn.voidcmd("TYPE I")
+
+        with tempfile.NamedTemporaryFile(mode="wb+", delete=False, dir=self.dir) as data_file:
+            with (
+                conn.transfercmd("RETR " + file_name) as sock,
+                sock.makefile("rb", buffering=block_size) as ftp_file,
+            ):
+                transcode(
+                    ftp_file,
+                    data_file,
+                    (
+                        self.task.source_ftp_delimiter
+                        if self.task.source_ftp_ignore_delimiter != 1
+                        else None
+                    ),
+                    block_size,
                 )
-                writer = csv.writer(data_file)
-                writer.writerows(csv_reader)
 
-            else:
-                data_file.write(data)
+            conn.voidresp()
 
             original_name = str(self.dir.joinpath(file_name.split("/")[-1]))
             if os.path.islink(original_name):
@@ -162,14 +173,11 @@ class Ftp:
             if "*" in file_name:
                 RunnerLog(self.task, self.run_id, 13, "Searching for matching files...")
 
-                # get the path up to the *
-                base_dir = str(Path(file_name.split("*")[0]).parent)
-
-                file_list = []
-                for _, _, walk_file_list in self._walk(base_dir):
-                    for this_file in walk_file_list:
-                        if fnmatch.fnmatch(this_file, file_name):
-                            file_list.append(this_file)
+                file_list = find_files(
+                    file_name,
+                    self._list_dir,
+                    f"ftp-{self.connection.id}:{self.connection.path or '/'}",
+                )
 
                 RunnerLog(
                     self.task,
@@ -182,7 +190,13 @@ class Ftp:
                         "\n".join(file_list),
                     ),
                 )
-                return [self.__load_file(file_name) for file_name in file_list]
+                return download_files(
+                    f"ftp-{self.connection.id}",
+                    file_list,
+                    lambda worker, file_name, *_: self.__load_file(file_name, worker),
+                    self.__worker_connect,
+                    lambda worker: worker.close(),
+                )
 
             return [self.__load_file(file_name)]
 
@@ -195,10 +209,11 @@ class Ftp:
                 f"File failed to load file from server.\n{e}",
             )
 
-    def save(self, overwrite: int, file_name: str) -> None:
+    def save(self, overwrite: int, file_name: str, source: Optional[IO[bytes]] = None) -> bool:
         """Use to copy local file to FTP server.
 
-        :returns: true if successful.
+        :param source: file to upload, instead of the local file.
+        :returns: true if the file was uploaded, false if it already exists.
         """
         self.__connect()
         try:
@@ -219,20 +234,28 @@ class Ftp:
                 )
                 self.__close()
 
-                return
+                return False
 
             # pylint: disable=broad-except
             except BaseException:
                 pass
 
         try:
-            with open(str(self.dir.joinpath(file_name)), "rb") as file:
-                self.conn.storbinary("STOR " + file_name, file)
+            with (
+                source if source is not None else open(str(self.dir.joinpath(file_name)), "rb")
+            ) as file:
+                self.conn.storbinary(
+                    "STOR " + file_name,
+                    file,
+                    blocksize=app.config.get("SOURCE_FILE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE),
+                )
 
             RunnerLog(self.task, self.run_id, 13, "File loaded to server.")
 
             self.__close()
 
+            return True
+
         except BaseException as e:
             raise RunnerException(
                 self.task, self.run_id, 13, f"Failed to save file on server.\n{e}"
@@ -0,0 +1,195 @@
+"""Find remote source files matching a wildcard file name.
+
+The full path of each file is matched with the file name like fnmatch,
+so a ``*`` also matches across folders.
+
+.. code-block:: text
+
+    exports/2023-*/orders_*.csv
+
+matches ``exports/2023-01/orders_1.csv`` and
+``exports/2023-01/old/orders_5.csv``, but not anything in
+``exports/2022-12``.
+
+Folders are only listed if a path in them can still match the file name.
+The folders before the first wildcard are not listed at all.
+
+Folder listings are cached for SOURCE_LISTING_CACHE_SECONDS, so tasks
+polling the same folder of a connection share one listing.
+"""
+
+import fnmatch
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from flask import current_app as app
+
+WILDCARD = re.compile(r"[*?\[]")
+
+# (folders, files) in a folder
+Listing = Tuple[List[str], List[str]]
+
+
+class ListingCache:
+    """Folder listings of each connection, kept for a few seconds."""
+
+    def __init__(self) -> None:
+        """Set up class parameters."""
+        self.listings: Dict[Tuple[str, str], Tuple[float, Listing]] = {}
+        self.lock = threading.Lock()
+
+    def get(
+        self,
+        key: Tuple[str, str],
+        list_dir: Callable[[], Listing],
+        ttl: float,
+    ) -> Listing:
+        """Get a listing from the cache, or list the folder."""
+        now = time.monotonic()
+
+        with self.lock:
+            # drop old listings
+            for old_key in [k for k, (expires, _) in self.listings.items() if expires <= now]:
+                del self.listings[old_key]
+
+            if key in self.listings:
+                return self.listings[key][1]
+
+        listing = list_dir()
+
+        if ttl > 0:
+            with self.lock:
+                self.listings[key] = (time.monotonic() + ttl, listing)
+
+        return listing
+
+    def clear(self) -> None:
+        """Remove all listings."""
+        with self.lock:
+            self.listings.clear()
+
+
+listing_cache = ListingCache()
+
+
+class Pattern:
+    """A wildcard file name, matched one character at a time.
+
+    Each part of the pattern matches one character, or is None for a
+    ``*``, which matches any number of characters.
+    """
+
+    def __init__(self, pattern: str) -> None:
+        """Split the pattern into its parts."""
+        self.parts: List[Optional[Callable[[str], bool]]] = []
+
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            end = self.__set_end(pattern, index) if char == "[" else -1
+
+            if char == "*":
+                self.parts.append(None)
+            elif char == "?":
+                self.parts.append(lambda _: True)
+            elif end > 0:
+                self.parts.append(re.compile(fnmatch.translate(pattern[index : end + 1])).match)
+                index = end
+            else:
+                self.parts.append(char.__eq__)
+
+            index += 1
+
+    @staticmethod
+    def __set_end(pattern: str, start: int) -> int:
+        """Find the closing ] of a [set], or -1 if the [ is a plain character."""
+        end = start + 1
+        if end < len(pattern) and pattern[end] == "!":
+            end += 1
+        if end < len(pattern) and pattern[end] == "]":
+            end += 1
+
+        return pattern.find("]", end)
+
+    def __skip_stars(self, states: Set[int]) -> Set[int]:
+        """Add the states after each *, since a * can match nothing."""
+        states = set(states)
+        for state in sorted(states):
+            while state < len(self.parts) and self.parts[state] is None:
+                state += 1
+                states.add(state)
+        return states
+
+    def __states(self, text: str) -> Set[int]:
+        """Get the parts the pattern can be at after matching text."""
+        states = self.__skip_stars({0})
+
+        for char in text:
+            next_states = set()
+            for state in states:
+                if state == len(self.parts):
+                    continue
+                part = self.parts[state]
+                if part is None:
+                    next_states.add(state)
+                elif part(char):
+                    next_states.add(state + 1)
+
+            states = self.__skip_stars(next_states)
+            if not states:
+                break
+
+        return states
+
+    def match(self, path: str) -> bool:
+        """Check if a path matches the pattern."""
+        return len(self.parts) in self.__states(path)
+
+    def match_folder(self, folder: str) -> bool:
+        """Check if any path in a folder can match the pattern."""
+        return bool(self.__states(folder.rstrip("/") + "/"))
+
+
+def find_files(
+    file_name: str,
+    list_dir: Callable[[str], Listing],
+    cache_key: str,
+) -> List[str]:
+    """Find files matching a wildcard file name.
+
+    :param list_dir: lists a folder, returning its folder and file names.
+    :param cache_key: name of the connection listings are cached for.
+    :returns: matching file paths. The files of a folder come before its
+        sub folders, in name order.
+    """
+    ttl = float(app.config.get("SOURCE_LISTING_CACHE_SECONDS", 30))
+
+    def listing(directory: str) -> Listing:
+        return listing_cache.get((cache_key, directory), lambda: list_dir(directory), ttl)
+
+    parts = [part for part in file_name.split("/") if part]
+    directory = "/" if file_name.startswith("/") else "."
+
+    # folders before the first wildcard do not need to be listed
+    while len(parts) > 1 and not WILDCARD.search(parts[0]):
+        directory = str(Path(directory).joinpath(parts.pop(0)))
+
+    return list(_walk(directory, Pattern(file_name), listing))
+
+
+def _walk(directory: str, pattern: Pattern, listing: Callable[[str], Listing]) -> Iterator[str]:
+    """Find files in a folder and its sub folders matching the pattern."""
+    folders, files = listing(directory)
+
+    for name in sorted(files):
+        path = str(Path(directory).joinpath(name))
+        if pattern.match(path):
+            yield path
+
+    for name in sorted(folders):
+        path = str(Path(directory).joinpath(name))
+        if pattern.match_folder(path):
+            yield from _walk(path, pattern, listing)
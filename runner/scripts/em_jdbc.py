@@ -1,16 +1,22 @@
 """Connection handler for Jdbc Databases."""
 
 import csv
-import itertools
 import sys
-import tempfile
+from contextlib import suppress
 from pathlib import Path
 from typing import IO, Any, Generator, List, Optional, Tuple
 
 import jaydebeapi
+from flask import current_app as app
 
-from runner import db
-from runner.model import Task, TaskLog
+from runner.model import Task
+from runner.scripts.em_fetch import AdaptiveFetcher
+from runner.scripts.em_parquet import PARQUET_FILE_TYPE, write_parquet
+from runner.scripts.em_partition import PartitionedQuery, partitioned
+from runner.scripts.em_pipeline import OutputPipeline
+from runner.scripts.em_pool import ConnectionPool, get_pool
+from runner.scripts.em_progress import ProgressReporter
+from runner.scripts.em_watermark import Watermark
 
 # set the limit for a csv cell value to something massive.
 # this is needed when users are building xml in a sql query
@@ -47,6 +53,38 @@ def connect(connection: str) -> Tuple[Any, Any]:
         raise ValueError(f"Failed to connect to database.\n{e}")
 
 
+def validate(conn: Any) -> None:
+    """Check a pooled connection still works."""
+    if not conn.jconn.isValid(30):
+        raise ValueError("Connection is no longer valid.")
+
+
+def reset(conn: Any) -> None:
+    """Roll back any open transaction before a pooled connection is reused.
+
+    JDBC drivers have no common way to clear other session state, like
+    temp tables and session settings, so it stays with the connection.
+    Turn off SQL_POOL_KEEP_SESSIONS to close connections after each run.
+    """
+    if not conn.jconn.getAutoCommit():
+        conn.rollback()
+
+
+def pool(database_id: int, connection: str) -> ConnectionPool:
+    """Get the connection pool of a database."""
+    connection = connection.strip()
+    return get_pool(
+        database_id,
+        ("jdbc", connection),
+        lambda: connect(connection)[0],
+        validate,
+        reset,
+        # session state cannot be cleared, connections are closed after
+        # each run when it must not be kept.
+        max_size=None if app.config.get("SQL_POOL_KEEP_SESSIONS", True) else 0,
+    )
+
+
 class Jdbc:
     """Functions to query against jdbc server."""
 
@@ -56,51 +94,110 @@ class Jdbc:
         run_id: Optional[str],
         connection: str,
         directory: Path,
+        max_fetch_size: Optional[int] = None,
+        connection_pool: Optional[ConnectionPool] = None,
+        watermark: Optional[Watermark] = None,
     ):
-        """Initialize class."""
+        """Initialize class.
+
+        When a connection pool is passed in, the connection is taken
+        from the pool and returned to it after the query. A watermark
+        is updated from the query rows.
+        """
         self.task = task
         self.connection = connection
         self.run_id = run_id
         self.dir = directory
+        self.pool = connection_pool
         self.conn, self.cur = self.__connect()
         self.row_count = 0
+        self.itersize = int(app.config.get("SQL_ITERSIZE", 5000))
+        self.max_fetch_size = max_fetch_size
+        self.watermark = watermark
 
-    def __rows(self, size: int = 50) -> Generator:
-        """Return data from query by a generator."""
-        log = TaskLog(
-            task_id=self.task.id,
-            job_id=self.run_id,
-            status_id=20,
-            message=("Getting first %d query rows." % size),
-        )
-        db.session.add(log)
-        db.session.commit()
+    def __batches(self) -> Generator:
+        """Return batches of query rows by a generator."""
+        fetcher = AdaptiveFetcher.from_config(self.cur, self.max_fetch_size)
 
-        for iteration in itertools.count():
+        with ProgressReporter(
+            self.task, self.run_id, "Getting first %d query rows." % fetcher.size
+        ) as progress:
             if self.cur.description is None:
-                break
-
-            rows = self.cur.fetchmany(size)
+                return
 
-            if not rows:
-                break
+            for rows in fetcher.batches():
+                self.row_count += len(rows)
+                progress.update(len(rows))
 
-            self.row_count = size * iteration + len(rows)
+                if self.watermark is not None:
+                    self.watermark.update(self.cur.description, rows)
 
-            log.message = "Getting query rows %d-%d of ?" % (
-                (size * iteration),
-                (size * iteration + len(rows)),
-            )
-            db.session.add(log)
-            db.session.commit()
+                yield rows
 
+    def __rows(self) -> Generator:
+        """Return data from query by a generator."""
+        for rows in self.__batches():
             yield from rows
 
     def __connect(self) -> Tuple[Any, Any]:
+        if self.pool is not None:
+            conn = self.pool.checkout()
+            return conn, conn.cursor()
+
         return connect(self.connection.strip())
 
-    def __close(self) -> None:
-        self.conn.close()
+    def __close(self, failed: bool = False) -> None:
+        if self.conn is None:
+            return
+
+        if self.pool is not None:
+            self.pool.checkin(self.conn, discard=failed)
+        else:
+            self.conn.close()
+
+        self.conn = None
+
+    def __partition_cursor(self, conn: Any, query: str) -> Any:
+        """Run one partition of the query."""
+        cur = conn.cursor()
+        cur.execute(query)
+
+        if getattr(cur, "_rs", None) is not None:
+            with suppress(Exception):
+                cur._rs.setFetchSize(self.itersize)
+
+        return cur
+
+    def __run_partitioned(self, query: str) -> Tuple[int, List[IO[str]]]:
+        """Run the query in partitions, each on a connection from the pool."""
+        partitions = PartitionedQuery(
+            self.task,
+            self.run_id,
+            self.dir,
+            self.pool
+            or ConnectionPool(
+                lambda: connect(self.connection.strip())[0],
+                validate,
+                reset,
+                max_size=0,
+                idle_timeout=0,
+            ),
+            self.__partition_cursor,
+            self.max_fetch_size,
+            self.watermark,
+        )
+
+        predicates = partitions.predicates(self.cur, query)
+
+        # the partitions use their own connections.
+        self.__close()
+
+        self.row_count, data_files = partitions.run(query, predicates)
+
+        if self.task.source_require_sql_output == 1 and self.row_count == 0:
+            raise ValueError("SQL output is required but no records returned.")
+
+        return self.row_count, data_files
 
     def run(self, query: str) -> Tuple[int, List[IO[str]]]:
         """Run a sql query.
@@ -109,13 +206,39 @@ class Jdbc:
 
         Returns a path or raises an exception.
         """
+        try:
+            return self.__run(query)
+        except BaseException:
+            self.__close(failed=True)
+            raise
+
+    def __run(self, query: str) -> Tuple[int, List[IO[str]]]:
+        if partitioned(self.task):
+            return self.__run_partitioned(query)
+
         self.cur.execute(query)
 
-        with tempfile.NamedTemporaryFile(
-            mode="w+", newline="", delete=False, dir=self.dir
-        ) as data_file:
-            writer = csv.writer(data_file)
+        # ask the driver to pull rows in batches instead of loading
+        # the full result set. this is only a hint, some drivers ignore it.
+        if getattr(self.cur, "_rs", None) is not None:
+            with suppress(Exception):
+                self.cur._rs.setFetchSize(self.itersize)
+
+        # parquet files are written straight from the fetched batches.
+        # processing scripts get csv, their output is converted on save.
+        if (
+            self.task.destination_file_type_id == PARQUET_FILE_TYPE
+            and not self.task.processing_type_id
+        ):
+            parquet_file = write_parquet(self.cur, self.__batches(), self.dir)
+            self.__close()
+
+            if self.task.source_require_sql_output == 1 and self.row_count == 0:
+                raise ValueError("SQL output is required but no records returned.")
+
+            return self.row_count, [parquet_file]
 
+        with OutputPipeline(self.task, self.run_id, self.dir) as writer:
             if self.task.source_query_include_header:
                 writer.writerow(
                     [i[0] for i in self.cur.description] if self.cur.description else []
@@ -129,4 +252,4 @@ class Jdbc:
         if self.task.source_require_sql_output == 1 and self.row_count == 0:
             raise ValueError("SQL output is required but no records returned.")
 
-        return self.row_count, [data_file]
+        return self.row_count, [writer.data_file]
@@ -0,0 +1,49 @@
+"""Delivery ledger.
+
+The md5 hash of the last file delivered to each destination of a task is
+kept in the ledger. Destinations set to skip unchanged files are not sent
+a file with the same name and hash as the last one they received, so a
+partner polling for changes is not sent the same file every run.
+
+Destinations are recorded by type and connection id, so changing the
+connection of a destination sends the file again.
+"""
+
+from typing import Optional
+
+from runner.extensions import db
+from runner.model import Task, TaskDelivery
+
+
+def destination_key(destination: str, connection_id: Optional[int]) -> str:
+    """Name a destination in the ledger, for example sftp-1."""
+    return f"{destination}-{connection_id}"
+
+
+def unchanged(task: Task, destination: str, file_name: str, file_hash: str) -> bool:
+    """Check if a file was the last one delivered to a destination."""
+    delivery = (
+        TaskDelivery.query.filter_by(task_id=task.id, destination=destination, file_name=file_name)
+        .order_by(TaskDelivery.id.desc())  # type: ignore[attr-defined]
+        .first()
+    )
+
+    return delivery is not None and delivery.file_hash == file_hash
+
+
+def record_delivery(
+    task_id: int, run_id: Optional[str], destination: str, file_name: str, file_hash: str
+) -> None:
+    """Save a delivered file as the last one sent to its destination."""
+    # pylint: disable=too-many-arguments
+    delivery = TaskDelivery.query.filter_by(
+        task_id=task_id, destination=destination, file_name=file_name
+    ).first()
+
+    if delivery is None:
+        delivery = TaskDelivery(task_id=task_id, destination=destination, file_name=file_name)
+        db.session.add(delivery)
+
+    delivery.file_hash = file_hash
+    delivery.job_id = run_id
+    db.session.commit()
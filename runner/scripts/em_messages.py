@@ -2,9 +2,11 @@
 
 import datetime
 import sys
+import threading
+from contextlib import contextmanager
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Union
+from typing import Generator, Optional, Union
 
 import requests
 from flask import current_app as app
@@ -18,6 +20,23 @@ from runner.web.filters import datetime_format
 sys.path.append(str(Path(__file__).parents[2]) + "/scripts")
 from error_print import full_stack
 
+_thread = threading.local()
+
+
+@contextmanager
+def deferred_errors() -> Generator[None, None, None]:
+    """Only raise RunnerExceptions in this thread, without handling them.
+
+    Used by threads that work for a run, like output file deliveries. They
+    do not own the run's task, so the exception is raised again with
+    :meth:`RunnerException.handle` on the run's thread.
+    """
+    _thread.deferred = True
+    try:
+        yield
+    finally:
+        _thread.deferred = False
+
 
 class RunnerException(Exception):
     """Log exceptions and handle."""
@@ -30,6 +49,16 @@ class RunnerException(Exception):
         message: Union[ValueError, str],
     ) -> None:
         """Set up class."""
+        super().__init__(message)
+        self.task = task
+        self.run_id = run_id
+        self.source_id = source_id
+        self.message = message
+        self.deferred = getattr(_thread, "deferred", False)
+
+        if self.deferred:
+            return
+
         # set to errored
         task.status_id = 2
         task.last_run = datetime.datetime.now()
@@ -45,7 +74,6 @@ class RunnerException(Exception):
         )
         db.session.add(log)
         db.session.commit()
-        super().__init__(message)
 
         # log a cancellation message from the runner.
         log = TaskLog(
@@ -166,6 +194,15 @@ class RunnerException(Exception):
                         for this_id in task_id_list[task_id_list.index(task.id) + 1 :]:
                             Task.query.filter_by(id=this_id).update({"status_id": 2})
 
+    def handle(self) -> "RunnerException":
+        """Handle an exception that was raised in a thread working for the run.
+
+        Must be called on the run's thread, while handling the exception.
+
+        :returns: a new, handled, exception.
+        """
+        return RunnerException(self.task, self.run_id, self.source_id, self.message)
+
 
 @dataclass
 class RunnerLog:
@@ -8,6 +8,7 @@ from flask import current_app as app
 
 from runner.model import ProjectParam, Task, TaskParam
 from runner.scripts.em_date import DateParsing
+from runner.scripts.em_watermark import watermark_param
 
 
 class ParamLoader:
@@ -19,6 +20,13 @@ class ParamLoader:
         self.run_id = run_id
         self.project_params, self.task_params = self.__load()
 
+        # incremental tasks get the watermark from their last run. it is
+        # only set in the query, not in file names or script params.
+        self.watermark_params: Dict[Any, Any] = {}
+        watermark = watermark_param(self.task)
+        if watermark is not None:
+            self.watermark_params[str(self.task.source_watermark_param).strip()] = watermark
+
     def __load(self) -> Tuple[Dict[Any, Any], Dict[Any, Any]]:
         """Get current params."""
         project_params = {}
@@ -75,6 +83,7 @@ class ParamLoader:
         # add global parameters
         query = insert_code_params(query, self.project_params)
         query = insert_code_params(query, self.task_params)
+        query = insert_code_params(query, self.watermark_params)
 
         return query
 
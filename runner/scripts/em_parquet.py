@@ -0,0 +1,299 @@
+"""Parquet file writer.
+
+Query results are written to parquet one batch at a time as they are
+fetched from the database. Column types are taken from the cursor
+description, so the file keeps numbers, dates, etc. as typed columns
+instead of text.
+
+pyarrow is an optional dependency. Install it with the ``parquet``
+extra to enable the parquet file type.
+"""
+
+import csv
+import datetime
+import decimal
+import tempfile
+import uuid
+from pathlib import Path
+from typing import IO, Any, Callable, Iterable, List, Optional, Sequence, Tuple
+
+from flask import current_app as app
+
+# task destination file type id of parquet files.
+PARQUET_FILE_TYPE = 5
+
+# parquet files start and end with this marker.
+PARQUET_MAGIC = b"PAR1"
+
+Converter = Optional[Callable[[Any], Any]]
+
+
+def import_pyarrow() -> Tuple[Any, Any]:
+    """Import pyarrow, or raise a readable error if it is not installed."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ValueError(
+            "Parquet files require pyarrow. Install Hub with the 'parquet' extra to use them."
+        )
+
+    return pyarrow, pyarrow.parquet
+
+
+def is_parquet(path: str) -> bool:
+    """Check if a file is already a parquet file."""
+    with open(path, "rb") as data_file:
+        return data_file.read(4) == PARQUET_MAGIC
+
+
+def column_type(column: Sequence[Any]) -> Tuple[Any, Converter]:
+    """Get the arrow type of a cursor description column.
+
+    Each driver describes types differently. Postgres uses type oids,
+    pyodbc uses python types and jdbc uses named type groups. Anything
+    not recognized is saved as text.
+
+    :returns: arrow type and a function to convert values to that type.
+    """
+    pa, _ = import_pyarrow()
+
+    type_code = column[1]
+    precision = column[4] if len(column) > 4 else None
+    scale = column[5] if len(column) > 5 else None
+
+    def decimal_type() -> Tuple[Any, Converter]:
+        if precision and 0 < precision <= 38 and scale is not None and 0 <= scale <= precision:
+            return pa.decimal128(precision, scale), None
+        return pa.string(), str
+
+    # postgres type oids
+    if isinstance(type_code, int):
+        postgres_types = {
+            16: (pa.bool_(), None),
+            17: (pa.binary(), bytes),
+            20: (pa.int64(), None),
+            21: (pa.int16(), None),
+            23: (pa.int32(), None),
+            26: (pa.int64(), None),
+            700: (pa.float32(), None),
+            701: (pa.float64(), None),
+            1082: (pa.date32(), None),
+            1083: (pa.time64("us"), None),
+            1114: (pa.timestamp("us"), None),
+            1184: (pa.timestamp("us", tz="UTC"), None),
+        }
+        if type_code == 1700:
+            return decimal_type()
+
+        return postgres_types.get(type_code, (pa.string(), str))
+
+    # pyodbc python types
+    if isinstance(type_code, type):
+        if issubclass(type_code, bool):
+            return pa.bool_(), None
+        if issubclass(type_code, int):
+            return pa.int64(), None
+        if issubclass(type_code, float):
+            return pa.float64(), None
+        if issubclass(type_code, decimal.Decimal):
+            return decimal_type()
+        if issubclass(type_code, datetime.datetime):
+            return pa.timestamp("us"), None
+        if issubclass(type_code, datetime.date):
+            return pa.date32(), None
+        if issubclass(type_code, datetime.time):
+            return pa.time64("us"), None
+        if issubclass(type_code, (bytes, bytearray)):
+            return pa.binary(), bytes
+        if issubclass(type_code, uuid.UUID):
+            return pa.string(), str
+
+        return pa.string(), str
+
+    # jdbc type groups. jaydebeapi returns dates as text already.
+    jdbc_types = set(getattr(type_code, "values", ()))
+    if jdbc_types & {"TINYINT", "SMALLINT", "INTEGER", "BIGINT"}:
+        return pa.int64(), int
+    if jdbc_types & {"REAL", "FLOAT", "DOUBLE"}:
+        return pa.float64(), float
+
+    return pa.string(), str
+
+
+class ParquetWriter:
+    """Write batches of rows to a parquet file.
+
+    Batches are buffered until there are enough rows for a row group,
+    so small fetches do not make lots of tiny row groups.
+
+    :param data_file: binary file to write to.
+    :param description: cursor description of the rows.
+    """
+
+    def __init__(self, data_file: IO[bytes], description: Optional[Sequence[Any]]) -> None:
+        """Set up class parameters."""
+        self.pa, pq = import_pyarrow()
+
+        columns = [column_type(column) for column in description or []]
+        self.converters = [converter for _, converter in columns]
+        self.schema = self.pa.schema(
+            [
+                (str(column[0] or f"column_{x}"), arrow_type)
+                for x, (column, (arrow_type, _)) in enumerate(zip(description or [], columns))
+            ]
+        )
+
+        self.row_group_size = int(app.config.get("PARQUET_ROW_GROUP_SIZE", 100000))
+        self.pending: List[Any] = []
+        self.pending_rows = 0
+
+        self.writer = pq.ParquetWriter(
+            data_file,
+            self.schema,
+            compression=app.config.get("PARQUET_COMPRESSION", "zstd"),
+        )
+
+    def __convert(self, values: Iterable[Any], converter: Converter) -> Iterable[Any]:
+        if converter is None:
+            return values
+        return [None if value is None else converter(value) for value in values]
+
+    def __flush(self) -> None:
+        if self.pending:
+            self.writer.write_table(
+                self.pa.Table.from_batches(self.pending, schema=self.schema),
+                row_group_size=self.row_group_size,
+            )
+            self.pending = []
+            self.pending_rows = 0
+
+    def write(self, rows: List[Any]) -> None:
+        """Add a batch of rows."""
+        if not rows or not self.converters:
+            return
+
+        arrays = [
+            self.pa.array(self.__convert(values, converter), type=field.type)
+            for values, converter, field in zip(zip(*rows), self.converters, self.schema)
+        ]
+        self.pending.append(self.pa.RecordBatch.from_arrays(arrays, schema=self.schema))
+        self.pending_rows += len(rows)
+
+        if self.pending_rows >= self.row_group_size:
+            self.__flush()
+
+    def close(self) -> None:
+        """Write any remaining rows and the file footer."""
+        self.__flush()
+        self.writer.close()
+
+
+def write_parquet(cursor: Any, batches: Iterable[List[Any]], directory: Path) -> IO[str]:
+    """Write query batches to a parquet temp file.
+
+    The writer is started on the first batch, as some cursors only
+    have a description after data is fetched.
+    """
+    # check for pyarrow before running through the query.
+    import_pyarrow()
+
+    with tempfile.NamedTemporaryFile(mode="wb+", delete=False, dir=directory) as data_file:
+        writer: Optional[ParquetWriter] = None
+
+        for rows in batches:
+            if writer is None:
+                writer = ParquetWriter(data_file, cursor.description)
+            writer.write(rows)
+
+        if writer is None:
+            writer = ParquetWriter(data_file, cursor.description)
+
+        writer.close()
+
+    return data_file  # type: ignore[return-value]
+
+
+def merge_parquet(paths: List[str], directory: Path) -> IO[str]:
+    """Join parquet files with the same columns into one parquet temp file.
+
+    Files are copied one batch at a time, in order, so they are never
+    fully loaded into memory.
+    """
+    pa, pq = import_pyarrow()
+
+    row_group_size = int(app.config.get("PARQUET_ROW_GROUP_SIZE", 100000))
+    schema = pq.read_schema(paths[0]) if paths else pa.schema([])
+
+    with tempfile.NamedTemporaryFile(mode="wb+", delete=False, dir=directory) as data_file:
+        writer = pq.ParquetWriter(
+            data_file, schema, compression=app.config.get("PARQUET_COMPRESSION", "zstd")
+        )
+
+        # small files are combined into full row groups.
+        pending: List[Any] = []
+        pending_rows = 0
+
+        for path in paths:
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=row_group_size):
+                pending.append(batch)
+                pending_rows += batch.num_rows
+
+                if pending_rows >= row_group_size:
+                    writer.write_table(
+                        pa.Table.from_batches(pending, schema=schema),
+                        row_group_size=row_group_size,
+                    )
+                    pending = []
+                    pending_rows = 0
+
+        if pending:
+            writer.write_table(
+                pa.Table.from_batches(pending, schema=schema), row_group_size=row_group_size
+            )
+
+        writer.close()
+
+    return data_file  # type: ignore[return-value]
+
+
+def csv_to_parquet(csv_path: str, parquet_path: str, header: bool) -> None:
+    """Convert a csv file to parquet.
+
+    Used for files that do not come straight from a query, like
+    processing script output. All columns are saved as text.
+    """
+    pa, pq = import_pyarrow()
+
+    with open(csv_path, "r", newline="") as data_file:
+        reader = csv.reader(data_file)
+        first_row = next(reader, None)
+
+        if first_row is None:
+            pq.write_table(pa.table({}), parquet_path)
+            return
+
+        names = (
+            [name or f"column_{x}" for x, name in enumerate(first_row)]
+            if header
+            else [f"column_{x}" for x in range(len(first_row))]
+        )
+        description = [(name, None) for name in names]
+
+        with open(parquet_path, "wb") as parquet_file:
+            writer = ParquetWriter(parquet_file, description)
+
+            if not header:
+                writer.write([first_row])
+
+            batch: List[Any] = []
+            for row in reader:
+                # pad or trim ragged rows to the header width
+                batch.append((row + [None] * len(names))[: len(names)])
+
+                if len(batch) >= writer.row_group_size:
+                    writer.write(batch)
+                    batch = []
+
+            writer.write(batch)
+            writer.close()
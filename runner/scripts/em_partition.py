@@ -0,0 +1,453 @@
+"""Partitioned query extraction.
+
+Very large queries can be split into partitions that run at the same
+time, each on its own database connection. A partition is the task's
+query with an extra filter:
+
+.. code-block:: sql
+
+    SELECT * FROM (<task query>) AS atlas_hub_partition WHERE <predicate>
+
+Statements before the final select, like the ``DECLARE`` and ``SET``
+statements of query parameters or a temp table that the select reads
+from, are run first in every partition. Statements must be separated by
+a semicolon. Common table expressions are kept in front of the filter.
+
+An ``ORDER BY`` of the final select is moved to the partition query, so
+the rows of each partition keep their order. It can only use output
+column names or positions. It is also kept in the select when it is
+needed for a ``TOP``, ``LIMIT`` or ``OFFSET``. The joined output is only
+in order across partitions when the query is ordered by the partition
+column first.
+
+Predicates are either typed in by the user, one per line, or built by
+splitting the range of a numeric or date column into equal steps. Rows
+with a null key are included in the first range.
+
+Each partition is saved to its own temp file. When all partitions are
+done, the files are joined in partition order into the query output.
+
+Queries must end with a select statement, and cannot end with a
+``SELECT INTO``.
+"""
+
+import csv
+import datetime
+import decimal
+import re
+import tempfile
+import threading
+from concurrent.futures import FIRST_EXCEPTION, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from itertools import pairwise
+from pathlib import Path
+from typing import IO, Any, Callable, List, Optional, Tuple
+
+import sqlparse
+from flask import current_app as app
+from sqlparse import tokens as sql_tokens
+from sqlparse.sql import IdentifierList
+
+from runner.model import Task
+from runner.scripts.em_fetch import AdaptiveFetcher
+from runner.scripts.em_parquet import PARQUET_FILE_TYPE, merge_parquet, write_parquet
+from runner.scripts.em_pipeline import OutputPipeline
+from runner.scripts.em_pool import ConnectionPool
+from runner.scripts.em_progress import ProgressReporter
+from runner.scripts.em_watermark import Watermark
+
+
+def partitioned(task: Task) -> bool:
+    """Check if a task's query should be run in partitions."""
+    return bool(
+        (task.source_partition_predicates or "").strip()
+        or (task.source_partition_column and (task.source_partition_count or 0) > 1)
+    )
+
+
+# a column name, with an optional table or schema in front.
+ORDER_COLUMN = re.compile(
+    r"^(?:(?:\[[^\]]+\]|\"[^\"]+\"|`[^`]+`|\w+)\.)*(\[[^\]]+\]|\"[^\"]+\"|`[^`]+`|\w+)"
+    r"(\s+(?:ASC|DESC))?(\s+NULLS\s+(?:FIRST|LAST))?$",
+    re.IGNORECASE,
+)
+
+
+def order_columns(order: Any) -> str:
+    """Get an ORDER BY that can be used on the output of the query.
+
+    Raises a ValueError if the query is ordered by an expression.
+    """
+    items = order.get_identifiers() if isinstance(order, IdentifierList) else [order]
+    columns = []
+
+    for item in items:
+        match = ORDER_COLUMN.match(str(item).strip())
+
+        if not match:
+            raise ValueError(
+                "Partitioned queries can only be ordered by the names or positions "
+                "of the columns they return, not by %s." % str(item).strip()
+            )
+
+        # columns are named without their table in the query output
+        columns.append("".join(part or "" for part in match.groups()))
+
+    return ", ".join(columns)
+
+
+def split_query(query: str) -> Tuple[List[str], str, str, str]:
+    """Split a query into its first statements, common table expressions and final select.
+
+    Raises a ValueError if the query cannot be partitioned.
+
+    :returns: first statements, common table expressions, final select and
+        the ORDER BY columns of the final select.
+    """
+    statements = [
+        statement.strip().rstrip(";").strip()
+        for statement in sqlparse.split(sqlparse.format(query, strip_comments=True))
+    ]
+    *preamble, final = [statement for statement in statements if statement] or [""]
+
+    tokens = [token for token in sqlparse.parse(final)[0].tokens if not token.is_whitespace]
+    words = [token.normalized.upper() for token in tokens]
+
+    # the select starts at the first top level select, after any common table expressions
+    start = 0
+    if tokens and tokens[0].ttype is sql_tokens.CTE:
+        start = next(
+            (index for index, token in enumerate(tokens) if token.ttype is sql_tokens.DML), 0
+        )
+
+    if not tokens or words[start] != "SELECT":
+        raise ValueError(
+            "Partitioned queries must end with a select statement. "
+            "Statements before it must end with a semicolon."
+        )
+
+    if "INTO" in words[start:]:
+        raise ValueError("Partitioned queries cannot end with a SELECT INTO.")
+
+    order = ""
+    if "ORDER BY" in words[start:]:
+        index = words.index("ORDER BY", start)
+        order = order_columns(tokens[index + 1])
+
+        # the order of a subquery is not kept, it is only
+        # needed to pick the rows of a TOP, LIMIT or OFFSET.
+        limited = {"LIMIT", "OFFSET", "FETCH"}.intersection(words) or any(
+            word == "TOP" or word.startswith("TOP ") for word in words
+        )
+        if not limited:
+            del tokens[index : index + 2]
+
+    return (
+        preamble,
+        " ".join(str(token) for token in tokens[:start]),
+        " ".join(str(token) for token in tokens[start:]),
+        order,
+    )
+
+
+def select_from(
+    query: str, columns: str, predicate: Optional[str] = None, ordered: bool = False
+) -> str:
+    """Select from the output of a query, keeping the statements before it.
+
+    :param ordered: keep the order of the query.
+    """
+    preamble, ctes, select, order = split_query(query)
+
+    if ctes:
+        ctes += ", atlas_hub_partition AS (%s) " % select
+        source = "atlas_hub_partition"
+    else:
+        source = "(%s) AS atlas_hub_partition" % select
+
+    outer = "%sSELECT %s FROM %s" % (ctes, columns, source)  # noqa: S608
+
+    if predicate is not None:
+        outer += " WHERE %s" % predicate
+
+    if ordered and order:
+        outer += " ORDER BY %s" % order
+
+    return ";\n".join([*preamble, outer])
+
+
+def partition_query(query: str, predicate: str) -> str:
+    """Filter a query to one partition, keeping its order."""
+    return select_from(query, "*", predicate, ordered=True)
+
+
+def first_result(cursor: Any) -> Any:
+    """Skip the row counts of statements before the final select."""
+    while cursor.description is None:
+        try:
+            if not cursor.nextset():
+                break
+        # drivers without several result sets
+        except Exception:  # pylint: disable=broad-except
+            break
+
+    return cursor
+
+
+def literal(value: Any) -> str:
+    """Write a partition boundary as a sql literal."""
+    if isinstance(value, datetime.datetime):
+        return "'%s'" % value.strftime("%Y-%m-%d %H:%M:%S")
+
+    if isinstance(value, datetime.date):
+        return "'%s'" % value.isoformat()
+
+    if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+        return str(value)
+
+    raise ValueError(f"Partition column must be a number or date, not {type(value).__name__}.")
+
+
+def key_range_predicates(column: str, low: Any, high: Any, count: int) -> List[str]:
+    """Split the range of a column into partition predicates.
+
+    Each boundary is the upper limit of one partition and the lower limit
+    of the next, so every row is in exactly one partition, even if the
+    boundaries are rounded.
+    """
+    if low is None or high is None or count < 2:
+        return ["1 = 1"]
+
+    if isinstance(low, datetime.datetime):
+        bounds = [low + (high - low) * x / count for x in range(1, count)]
+    elif isinstance(low, datetime.date):
+        bounds = [
+            low + datetime.timedelta(days=(high - low).days * x // count) for x in range(1, count)
+        ]
+    elif isinstance(low, int):
+        bounds = [low + (high - low) * x // count for x in range(1, count)]
+    else:
+        bounds = [low + (high - low) * x / count for x in range(1, count)]
+
+    # small ranges can have fewer boundaries than partitions
+    limits: List[str] = []
+    for bound in bounds:
+        if low < bound <= high and literal(bound) not in limits:
+            limits.append(literal(bound))
+
+    if not limits:
+        return ["1 = 1"]
+
+    predicates = [f"({column} < {limits[0]} OR {column} IS NULL)"]
+    predicates.extend(
+        f"{column} >= {lower} AND {column} < {upper}" for lower, upper in pairwise(limits)
+    )
+    predicates.append(f"{column} >= {limits[-1]}")
+
+    return predicates
+
+
+@dataclass
+class Partition:
+    """Output of one partition.
+
+    :name: path of the partition temp file.
+    :row_count: number of rows in the partition.
+    :columns: column names of the query.
+    """
+
+    name: str
+    row_count: int = 0
+    columns: List[str] = field(default_factory=list)
+
+
+class PartitionedQuery:
+    """Run a query in partitions on a pool of connections.
+
+    :param connection_pool: pool each partition takes a connection from.
+    :param open_cursor: executes a query on a connection, returning the cursor.
+    :param max_fetch_size: connection specific ceiling for the fetch size.
+    :param watermark: updated from the rows of every partition.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        task: Task,
+        run_id: Optional[str],
+        directory: Path,
+        connection_pool: ConnectionPool,
+        open_cursor: Callable[[Any, str], Any],
+        max_fetch_size: Optional[int] = None,
+        watermark: Optional[Watermark] = None,
+    ) -> None:
+        """Set up class parameters."""
+        self.task = task
+        self.run_id = run_id
+        self.dir = directory
+        self.pool = connection_pool
+        self.open_cursor = open_cursor
+        self.max_fetch_size = max_fetch_size
+        self.watermark = watermark
+        self.parquet = (
+            task.destination_file_type_id == PARQUET_FILE_TYPE and not task.processing_type_id
+        )
+
+        # pylint: disable=protected-access
+        self.app = app._get_current_object()  # type: ignore[attr-defined]
+        self.lock = threading.Lock()
+        self.failed = threading.Event()
+        self.fetched = 0
+
+    def predicates(self, cursor: Any, query: str) -> List[str]:
+        """Get the filter of each partition.
+
+        :param cursor: cursor used to look up the range of the partition column.
+        """
+        predicates = [
+            line.strip()
+            for line in (self.task.source_partition_predicates or "").splitlines()
+            if line.strip()
+        ]
+
+        if predicates:
+            return predicates
+
+        column = str(self.task.source_partition_column).strip()
+
+        cursor.execute(select_from(query, f"MIN({column}), MAX({column})"))
+        low, high = first_result(cursor).fetchone()
+
+        return key_range_predicates(column, low, high, int(self.task.source_partition_count))
+
+    def __batches(self, cursor: Any, partition: Partition) -> Any:
+        fetcher = AdaptiveFetcher.from_config(cursor, self.max_fetch_size)
+
+        for rows in fetcher.batches():
+            if self.failed.is_set():
+                raise ValueError("Query stopped, another partition failed.")
+
+            partition.row_count += len(rows)
+            with self.lock:
+                self.fetched += len(rows)
+
+            if self.watermark is not None:
+                self.watermark.update(cursor.description, rows)
+
+            yield rows
+
+    def __run_partition(self, query: str) -> Partition:
+        """Save one partition to a temp file."""
+        with self.app.app_context():
+            conn = self.pool.checkout()
+            partition = Partition("")
+
+            try:
+                cursor = first_result(self.open_cursor(conn, query))
+
+                if self.parquet:
+                    partition.name = write_parquet(
+                        cursor, self.__batches(cursor, partition), self.dir
+                    ).name
+
+                else:
+                    with tempfile.NamedTemporaryFile(
+                        mode="w+", newline="", delete=False, dir=self.dir
+                    ) as data_file:
+                        partition.name = data_file.name
+                        writer = csv.writer(data_file)
+
+                        if cursor.description is not None:
+                            for rows in self.__batches(cursor, partition):
+                                writer.writerows(rows)
+
+                partition.columns = [column[0] for column in cursor.description or []]
+
+            except BaseException:
+                self.failed.set()
+                self.pool.checkin(conn, discard=True)
+
+                if partition.name:
+                    Path(partition.name).unlink(missing_ok=True)
+                raise
+
+            self.pool.checkin(conn)
+            return partition
+
+    def __wait(self, futures: List[Future], progress: ProgressReporter) -> None:
+        """Wait for the partitions, updating the query progress."""
+        reported = 0
+        pending = set(futures)
+
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_EXCEPTION)
+
+            with self.lock:
+                fetched = self.fetched
+
+            progress.update(fetched - reported)
+            reported = fetched
+
+            for future in done:
+                if future.exception() is not None:
+                    self.failed.set()
+                    for other in pending:
+                        other.cancel()
+                    wait(pending)
+                    raise future.exception()  # type: ignore[misc]
+
+    def run(self, query: str, predicates: List[str]) -> Tuple[int, List[IO[str]]]:
+        """Run the query partitions and join their output.
+
+        :param predicates: filter of each partition, from :meth:`predicates`.
+        :returns: row count and output file.
+        """
+        queries = [partition_query(query, predicate) for predicate in predicates]
+        workers = min(len(queries), int(self.app.config.get("SQL_PARTITION_WORKERS", 4)))
+
+        with (
+            ProgressReporter(
+                self.task,
+                self.run_id,
+                "Getting query rows from %d partitions on %d connections."
+                % (len(queries), workers),
+            ) as progress,
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            futures = [executor.submit(self.__run_partition, query) for query in queries]
+
+            try:
+                self.__wait(futures, progress)
+
+            except BaseException:
+                # remove the output of partitions that did finish
+                for future in futures:
+                    if future.done() and not future.cancelled() and future.exception() is None:
+                        Path(future.result().name).unlink(missing_ok=True)
+                raise
+
+        partitions = [future.result() for future in futures]
+
+        try:
+            return sum(partition.row_count for partition in partitions), [self.__join(partitions)]
+
+        finally:
+            for partition in partitions:
+                Path(partition.name).unlink(missing_ok=True)
+
+    def __join(self, partitions: List[Partition]) -> IO[str]:
+        """Join the partition files, in order, into the query output."""
+        if self.parquet:
+            return merge_parquet([partition.name for partition in partitions], self.dir)
+
+        columns = next((partition.columns for partition in partitions if partition.columns), [])
+
+        with OutputPipeline(self.task, self.run_id, self.dir) as writer:
+            if self.task.source_query_include_header:
+                writer.writerow(columns)
+
+            for partition in partitions:
+                writer.write_csv(partition.name)
+
+        return writer.data_file
@@ -0,0 +1,140 @@
+"""Single pass query output.
+
+Query rows are written straight into the destination file format
+instead of a temp csv that is re-read and re-written when saved.
+Each stage streams into the next, so the file is only written once.
+
+.. code-block:: text
+
+    rows > delimiter, quoting and terminator > text > gpg > md5 > zip > disk
+
+Tasks with a processing script still get the plain query output, as
+the script expects python's csv formatting of the data.
+"""
+
+import csv
+import io
+import shutil
+import tempfile
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, Optional, Type
+
+from runner.model import Task
+from runner.scripts.em_file import File, FormattedFile
+from runner.scripts.em_params import ParamLoader
+from runner.scripts.em_stages import OutputStages
+
+
+class OutputPipeline:
+    """Write query rows in the destination file format.
+
+    Used as a context manager around the query rows. ``data_file``
+    is the output to pass on to :obj:`runner.scripts.em_file.File`.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(self, task: Task, run_id: Optional[str], directory: Path) -> None:
+        """Set up class parameters."""
+        self.task = task
+        self.run_id = run_id
+        self.dir = directory
+        self.formatted = not task.processing_type_id
+        self.data_file: Any = None
+
+        self.file: Optional[File] = None
+        self.stages: Optional[OutputStages] = None
+        self.__text: Optional[IO[str]] = None
+        self.__writer: Any = None
+        self.__format = False
+
+    def __enter__(self) -> "OutputPipeline":
+        """Open the pipeline stages."""
+        if not self.formatted:
+            self.data_file = tempfile.NamedTemporaryFile(  # noqa: SIM115
+                mode="w+", newline="", delete=False, dir=self.dir
+            )
+            self.__writer = csv.writer(self.data_file)
+            return self
+
+        # the temp name is used as the file name if the task has none.
+        with tempfile.NamedTemporaryFile(dir=self.dir) as placeholder:
+            self.file = File(
+                self.task, self.run_id, placeholder, ParamLoader(self.task, self.run_id)  # type: ignore[arg-type]
+            )
+            self.file.build_file_name()
+
+        self.stages = OutputStages(
+            self.task,
+            self.file.base_path,
+            self.file.file_name,
+            self.file.build_zip_name() if self.task.destination_create_zip == 1 else None,
+        ).__enter__()
+
+        # same encoding and line endings as File.save
+        self.__text = io.TextIOWrapper(self.stages.binary)
+
+        writer = (
+            self.file.writer(self.__text) if self.task.destination_ignore_delimiter != 1 else None
+        )
+
+        if writer is not None:
+            self.__writer = writer
+            self.__format = True
+        else:
+            # file is copied as it is
+            self.__writer = csv.writer(self.__text)
+
+        return self
+
+    def writerow(self, row: Any) -> None:
+        """Write a row through the pipeline."""
+        if self.__format and self.file:
+            # values are formatted as text first, as they would be when
+            # read back from a csv file.
+            row = self.file.format_row(["" if x is None else str(x) for x in row])
+
+        self.__writer.writerow(row)
+
+    def write_csv(self, path: str) -> None:
+        """Write the rows of a csv file through the pipeline.
+
+        The csv must be written with python's default csv format.
+        """
+        with open(path, "r", newline="") as csv_file:
+            # rows that need no formatting are copied as they are.
+            if not self.__format:
+                shutil.copyfileobj(csv_file, self.__text or self.data_file)
+                return
+
+            for row in csv.reader(csv_file):
+                self.writerow(row)
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the pipeline stages."""
+        if not self.formatted:
+            self.data_file.close()
+            return
+
+        if self.stages is None:
+            return
+
+        try:
+            if self.__text:
+                self.__text.close()
+        finally:
+            self.stages.__exit__(exc_type, exc_value, traceback)
+
+        if exc_type is None:
+            self.data_file = FormattedFile(
+                name=self.stages.file_path,
+                file_name=self.stages.file_name,
+                file_hash=self.stages.file_hash,
+                zip_name=self.stages.zip_name,
+                encrypted=self.stages.encrypted,
+            )
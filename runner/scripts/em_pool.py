@@ -0,0 +1,250 @@
+"""Database connection pool.
+
+Connections to external databases are kept open between runs, so tasks
+that run often against the same server do not pay the login cost on
+every run. There is one pool per database connection in each runner
+process. SMB file shares are pooled the same way, one pool per server
+and login.
+
+Connections are checked with a quick query before they are handed
+out, and closed after sitting idle for ``SQL_POOL_IDLE_TIMEOUT``
+seconds. At most ``SQL_POOL_SIZE`` idle connections are kept; busy
+times can open more, they are closed when returned.
+"""
+
+import hashlib
+import threading
+import time
+from contextlib import contextmanager, suppress
+from typing import Any, Callable, Dict, Generator, Hashable, List, Optional, Tuple
+
+from flask import current_app as app
+
+_pools_lock = threading.Lock()
+
+# pool and hash of the connection settings, by database connection id
+_pools: Dict[Hashable, Tuple[str, "ConnectionPool"]] = {}
+
+
+class ConnectionPool:
+    """Pool of open connections to one database.
+
+    :param connect: opens a new connection.
+    :param validate: raises if a connection is no longer usable.
+    :param reset: clears session state before a connection is reused.
+    :param max_size: number of idle connections to keep.
+    :param idle_timeout: seconds before an idle connection is closed.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        connect: Callable[[], Any],
+        validate: Callable[[Any], None],
+        reset: Callable[[Any], None],
+        max_size: int,
+        idle_timeout: int,
+    ) -> None:
+        """Set up class parameters."""
+        self.connect = connect
+        self.validate = validate
+        self.reset = reset
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+
+        self.lock = threading.Lock()
+
+        # (connection, time returned). most recently used last.
+        self.idle: List[Tuple[Any, float]] = []
+        self.in_use = 0
+
+        # set once the pool is replaced. returned connections are closed.
+        self.is_closed = False
+
+        self.created = 0
+        self.reused = 0
+        self.failed_validation = 0
+        self.closed = 0
+
+    def __close(self, conn: Any) -> None:
+        with suppress(BaseException):
+            conn.close()
+
+        with self.lock:
+            self.closed += 1
+
+    def prune(self) -> None:
+        """Close connections that have been idle too long."""
+        now = time.monotonic()
+
+        with self.lock:
+            expired = [conn for conn, returned in self.idle if now - returned > self.idle_timeout]
+            self.idle = [
+                (conn, returned)
+                for conn, returned in self.idle
+                if now - returned <= self.idle_timeout
+            ]
+
+        for conn in expired:
+            self.__close(conn)
+
+    def checkout(self) -> Any:
+        """Get a working connection, opening a new one if none are idle."""
+        self.prune()
+
+        while True:
+            with self.lock:
+                if not self.idle:
+                    break
+                conn, _ = self.idle.pop()
+
+            try:
+                self.validate(conn)
+            # pylint: disable=broad-except
+            except BaseException:
+                with self.lock:
+                    self.failed_validation += 1
+                self.__close(conn)
+                continue
+
+            with self.lock:
+                self.reused += 1
+                self.in_use += 1
+            return conn
+
+        conn = self.connect()
+
+        with self.lock:
+            self.created += 1
+            self.in_use += 1
+
+        return conn
+
+    def checkin(self, conn: Any, discard: bool = False) -> None:
+        """Return a connection to the pool.
+
+        Connections that failed, or that do not fit in the pool, are closed.
+        """
+        with self.lock:
+            self.in_use -= 1
+
+        if not discard:
+            try:
+                self.reset(conn)
+            # pylint: disable=broad-except
+            except BaseException:
+                discard = True
+
+        if not discard:
+            with self.lock:
+                if not self.is_closed and len(self.idle) < self.max_size:
+                    self.idle.append((conn, time.monotonic()))
+                    return
+
+        self.__close(conn)
+
+    @contextmanager
+    def connection(self) -> Generator[Any, None, None]:
+        """Check out a connection for the length of a with block."""
+        conn = self.checkout()
+
+        try:
+            yield conn
+        except BaseException:
+            self.checkin(conn, discard=True)
+            raise
+
+        self.checkin(conn)
+
+    def close(self) -> None:
+        """Close all idle connections.
+
+        Connections that are checked out are closed when they are returned.
+        """
+        with self.lock:
+            self.is_closed = True
+            idle = self.idle
+            self.idle = []
+
+        for conn, _ in idle:
+            self.__close(conn)
+
+    def stats(self) -> Dict[str, int]:
+        """Get pool statistics."""
+        with self.lock:
+            return {
+                "idle": len(self.idle),
+                "in_use": self.in_use,
+                "max_size": self.max_size,
+                "idle_timeout": self.idle_timeout,
+                "created": self.created,
+                "reused": self.reused,
+                "failed_validation": self.failed_validation,
+                "closed": self.closed,
+            }
+
+
+# pylint: disable=too-many-arguments
+def get_pool(
+    database_id: Hashable,
+    definition: Tuple[Any, ...],
+    connect: Callable[[], Any],
+    validate: Callable[[Any], None],
+    reset: Callable[[Any], None],
+    max_size: Optional[int] = None,
+    idle_timeout: Optional[int] = None,
+) -> ConnectionPool:
+    """Get the pool of a database connection.
+
+    :param database_id: id of the database connection, or another key for
+        connections that are not databases.
+    :param definition: connection settings. When they change, the old
+        pool is closed and a new one is started.
+    :param max_size: number of idle connections to keep, defaults to SQL_POOL_SIZE.
+    :param idle_timeout: idle seconds, defaults to SQL_POOL_IDLE_TIMEOUT.
+    """
+    definition_hash = hashlib.sha256(repr(definition).encode("utf8")).hexdigest()
+
+    with _pools_lock:
+        current_hash, pool = _pools.get(database_id, ("", None))
+
+        if pool is not None and current_hash != definition_hash:
+            pool.close()
+            pool = None
+
+        if pool is None:
+            pool = ConnectionPool(
+                connect,
+                validate,
+                reset,
+                max_size=(
+                    int(app.config.get("SQL_POOL_SIZE", 5)) if max_size is None else max_size
+                ),
+                idle_timeout=(
+                    int(app.config.get("SQL_POOL_IDLE_TIMEOUT", 600))
+                    if idle_timeout is None
+                    else idle_timeout
+                ),
+            )
+            _pools[database_id] = (definition_hash, pool)
+
+        pools = [other for _, other in _pools.values()]
+
+    # close idle connections of databases that have not been used lately.
+    for other in pools:
+        if other is not pool:
+            other.prune()
+
+    return pool
+
+
+def pool_stats(database_id: Hashable) -> Optional[Dict[str, int]]:
+    """Get statistics of a database connection pool, if it has one."""
+    with _pools_lock:
+        _, pool = _pools.get(database_id, ("", None))
+
+    if pool is None:
+        return None
+
+    pool.prune()
+    return pool.stats()
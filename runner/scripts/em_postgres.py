@@ -1,16 +1,24 @@
 """Connection handler for Postgres Databases."""
 
 import csv
-import itertools
 import sys
 import tempfile
 from pathlib import Path
 from typing import IO, Any, Generator, List, Optional, Tuple
 
 import psycopg2
+import sqlparse
+from flask import current_app as app
 
 from runner import db
 from runner.model import Task, TaskLog
+from runner.scripts.em_fetch import AdaptiveFetcher
+from runner.scripts.em_parquet import PARQUET_FILE_TYPE, write_parquet
+from runner.scripts.em_partition import PartitionedQuery, partitioned
+from runner.scripts.em_pipeline import OutputPipeline
+from runner.scripts.em_pool import ConnectionPool, get_pool
+from runner.scripts.em_progress import ProgressReporter
+from runner.scripts.em_watermark import Watermark
 
 # set the limit for a csv cell value to something massive.
 # this is needed when users are building xml in a sql query
@@ -29,6 +37,23 @@ while True:
         MAX_INT = int(MAX_INT / 10)
 
 
+# column types that COPY writes as python formats the fetched values.
+# others, like booleans, timestamps and numerics, are written differently.
+COPY_TYPES = {
+    18,  # char
+    19,  # name
+    20,  # bigint
+    21,  # smallint
+    23,  # integer
+    25,  # text
+    26,  # oid
+    1042,  # character
+    1043,  # varchar
+    1082,  # date
+    2950,  # uuid
+}
+
+
 def connect(connection: str, timeout: int) -> Tuple[Any, Any]:
     """Connect to postgres server."""
     try:
@@ -44,6 +69,46 @@ def connect(connection: str, timeout: int) -> Tuple[Any, Any]:
         raise ValueError(f"Failed to connect to database.\n{e}")
 
 
+def single_statement(query: str) -> bool:
+    """Check if a query is one statement, so it can run on a named cursor."""
+    statements = sqlparse.split(sqlparse.format(query, strip_comments=True))
+    return len([statement for statement in statements if statement.strip().rstrip(";")]) == 1
+
+
+def validate(conn: Any) -> None:
+    """Check a pooled connection still works."""
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1")
+    conn.rollback()
+
+
+def reset(conn: Any) -> None:
+    """Clear session state before a pooled connection is reused.
+
+    Temp tables, settings and prepared statements are dropped. Startup
+    options, like the statement timeout, are kept.
+    """
+    conn.rollback()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("DISCARD ALL")
+    finally:
+        conn.autocommit = False
+
+
+def pool(database_id: int, connection: str, timeout: int) -> ConnectionPool:
+    """Get the connection pool of a database."""
+    connection = connection.strip()
+    return get_pool(
+        database_id,
+        ("postgres", connection, timeout),
+        lambda: connect(connection, timeout)[0],
+        validate,
+        reset,
+    )
+
+
 class Postgres:
     """Functions to query against sql server."""
 
@@ -54,52 +119,193 @@ class Postgres:
         connection: str,
         timeout: int,
         directory: Path,
+        max_fetch_size: Optional[int] = None,
+        connection_pool: Optional[ConnectionPool] = None,
+        watermark: Optional[Watermark] = None,
     ):
-        """Initialize class."""
+        """Initialize class.
+
+        When a connection pool is passed in, the connection is taken
+        from the pool and returned to it after the query. A watermark
+        is updated from the query rows.
+        """
         self.task = task
         self.connection = connection
         self.run_id = run_id
         self.dir = directory
         self.timeout = timeout
+        self.pool = connection_pool
         self.conn, self.cur = self.__connect()
         self.row_count = 0
+        self.itersize = int(app.config.get("SQL_ITERSIZE", 5000))
+        self.max_fetch_size = max_fetch_size
+        self.watermark = watermark
+
+    def __batches(self) -> Generator:
+        """Return batches of query rows by a generator."""
+        fetcher = AdaptiveFetcher.from_config(self.cur, self.max_fetch_size)
+
+        with ProgressReporter(
+            self.task, self.run_id, "Getting first %d query rows." % fetcher.size
+        ) as progress:
+            # server side cursors only have a description after the first fetch.
+            if self.cur.name is None and self.cur.description is None:
+                return
+
+            for rows in fetcher.batches():
+                self.row_count += len(rows)
+                progress.update(len(rows))
+
+                if self.watermark is not None:
+                    self.watermark.update(self.cur.description, rows)
 
-    def __rows(self, size: int = 50) -> Generator:
+                yield rows
+
+    def __rows(self) -> Generator:
         """Return data from query by a generator."""
+        for rows in self.__batches():
+            yield from rows
+
+    def __connect(self) -> Tuple[Any, Any]:
+        if self.pool is not None:
+            conn = self.pool.checkout()
+            return conn, conn.cursor()
+
+        return connect(self.connection.strip(), self.timeout)
+
+    def __close(self, failed: bool = False) -> None:
+        if self.conn is None:
+            return
+
+        if self.pool is not None:
+            self.pool.checkin(self.conn, discard=failed)
+        else:
+            self.conn.close()
+
+        self.conn = None
+
+    def __execute(self, query: str) -> None:
+        """Execute the query, streaming the results when possible.
+
+        A named cursor keeps the result set on the server and only
+        pulls ``itersize`` rows at a time. Named cursors are limited
+        to a single select statement. Queries with several statements
+        run on a regular cursor, so the rows of the last statement are
+        returned. Other statements that cannot be declared as a cursor
+        (updates, etc) fall back to a regular cursor too. Postgres only
+        plans the query on DECLARE, so nothing has run yet when the
+        fallback is needed.
+        """
+        if app.config.get("SQL_STREAMING", True) and single_statement(query):
+            try:
+                self.cur = self.conn.cursor(name="atlas_hub_extract")
+                self.cur.itersize = self.itersize
+                self.cur.execute(query)
+                return
+
+            except psycopg2.ProgrammingError:
+                self.conn.rollback()
+
+        self.cur = self.conn.cursor()
+        self.cur.execute(query)
+
+    def __copy(self, query: str) -> Optional[IO[str]]:
+        """Stream the query output directly into a csv file.
+
+        COPY writes the csv on the server, skipping python row handling
+        completely. The csv is formatted for the destination when saved,
+        as it would be from a cursor. Returns None if the query cannot be
+        run by COPY, for example when it contains several statements, or
+        if it returns types that COPY formats differently.
+        """
         log = TaskLog(
             task_id=self.task.id,
             job_id=self.run_id,
             status_id=20,
-            message=("Getting first %d query rows." % size),
+            message="Getting query rows with COPY.",
         )
         db.session.add(log)
         db.session.commit()
 
-        for iteration in itertools.count():
-            if self.cur.description is None:
-                break
+        query = query.strip().rstrip(";")
 
-            rows = self.cur.fetchmany(size)
-
-            if not rows:
-                break
+        try:
+            self.cur.execute(
+                "SELECT * FROM (%s) AS atlas_hub_copy LIMIT 0" % query  # noqa: S608
+            )
+            copy_types = all(column.type_code in COPY_TYPES for column in self.cur.description)
+        except psycopg2.ProgrammingError:
+            copy_types = False
 
-            self.row_count = size * iteration + len(rows)
+        if not copy_types:
+            self.conn.rollback()
 
-            log.message = "Getting query rows %d-%d of ?" % (
-                (size * iteration),
-                (size * iteration + len(rows)),
-            )
+            log.message = "Query cannot be run with COPY, getting rows from a cursor."
             db.session.add(log)
             db.session.commit()
+            return None
 
-            yield from rows
+        copy_query = "COPY (%s) TO STDOUT WITH (FORMAT csv%s)" % (
+            query,
+            ", HEADER" if self.task.source_query_include_header else "",
+        )
 
-    def __connect(self) -> Tuple[Any, Any]:
-        return connect(self.connection.strip(), self.timeout)
+        with tempfile.NamedTemporaryFile(mode="wb+", delete=False, dir=self.dir) as data_file:
+            self.cur.copy_expert(copy_query, data_file, size=1024 * 1024)
+
+        self.row_count = max(self.cur.rowcount, 0)
+
+        log.message = "Getting query rows %d-%d of %d" % (
+            0,
+            self.row_count,
+            self.row_count,
+        )
+        db.session.add(log)
+        db.session.commit()
+
+        return data_file  # type: ignore[return-value]
+
+    def __partition_cursor(self, conn: Any, query: str) -> Any:
+        """Run one partition of the query, on a server side cursor if enabled."""
+        if app.config.get("SQL_STREAMING", True) and single_statement(query):
+            cur = conn.cursor(name="atlas_hub_partition")
+            cur.itersize = self.itersize
+        else:
+            cur = conn.cursor()
+
+        cur.execute(query)
+        return cur
+
+    def __run_partitioned(self, query: str) -> Tuple[int, List[IO[str]]]:
+        """Run the query in partitions, each on a connection from the pool."""
+        partitions = PartitionedQuery(
+            self.task,
+            self.run_id,
+            self.dir,
+            self.pool
+            or ConnectionPool(
+                lambda: connect(self.connection.strip(), self.timeout)[0],
+                validate,
+                reset,
+                max_size=0,
+                idle_timeout=0,
+            ),
+            self.__partition_cursor,
+            self.max_fetch_size,
+            self.watermark,
+        )
+
+        predicates = partitions.predicates(self.cur, query)
 
-    def __close(self) -> None:
-        self.conn.close()
+        # the partitions use their own connections.
+        self.__close()
+
+        self.row_count, data_files = partitions.run(query, predicates)
+
+        if self.task.source_require_sql_output == 1 and self.row_count == 0:
+            raise ValueError("SQL output is required but no records returned.")
+
+        return self.row_count, data_files
 
     def run(self, query: str) -> Tuple[int, List[IO[str]]]:
         """Run a sql query.
@@ -108,19 +314,69 @@ class Postgres:
 
         Returns a path or raises an exception.
         """
-        self.cur.execute(query)
+        try:
+            return self.__run(query)
+        except BaseException:
+            self.__close(failed=True)
+            raise
+
+    def __run(self, query: str) -> Tuple[int, List[IO[str]]]:
+        if partitioned(self.task):
+            return self.__run_partitioned(query)
+
+        # copy can be used when the output is csv that is formatted for
+        # the destination when saved. Processing scripts may depend on
+        # python's formatting of the data, and watermarks are read from
+        # the fetched rows.
+        if (
+            self.task.source_postgres_copy == 1
+            and self.task.destination_file_type_id in (1, 2, 3, 4)
+            and self.task.destination_ignore_delimiter != 1
+            and not self.task.processing_type_id
+            and self.watermark is None
+        ):
+            copy_file = self.__copy(query)
 
-        with tempfile.NamedTemporaryFile(
-            mode="w+", newline="", delete=False, dir=self.dir
-        ) as data_file:
-            writer = csv.writer(data_file)
+            if copy_file is not None:
+                self.__close()
+
+                if self.task.source_require_sql_output == 1 and self.row_count == 0:
+                    raise ValueError("SQL output is required but no records returned.")
+
+                return self.row_count, [copy_file]
+
+        self.__execute(query)
+
+        # parquet files are written straight from the fetched batches.
+        # processing scripts get csv, their output is converted on save.
+        if (
+            self.task.destination_file_type_id == PARQUET_FILE_TYPE
+            and not self.task.processing_type_id
+        ):
+            parquet_file = write_parquet(self.cur, self.__batches(), self.dir)
+            self.__close()
+
+            if self.task.source_require_sql_output == 1 and self.row_count == 0:
+                raise ValueError("SQL output is required but no records returned.")
+
+            return self.row_count, [parquet_file]
+
+        with OutputPipeline(self.task, self.run_id, self.dir) as writer:
+            rows = self.__rows()
+
+            # get the first row before writing headers.. server side
+            # cursors do not have a description until data is fetched.
+            first_row = next(rows, None)
 
             if self.task.source_query_include_header:
                 writer.writerow(
                     [i[0] for i in self.cur.description] if self.cur.description else []
                 )
 
-            for row in self.__rows():
+            if first_row is not None:
+                writer.writerow(first_row)
+
+            for row in rows:
                 writer.writerow(row)
 
         self.__close()
@@ -128,4 +384,4 @@ class Postgres:
         if self.task.source_require_sql_output == 1 and self.row_count == 0:
             raise ValueError("SQL output is required but no records returned.")
 
-        return self.row_count, [data_file]
+        return self.row_count, [writer.data_file]
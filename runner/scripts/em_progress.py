@@ -0,0 +1,147 @@
+"""Query progress reporting.
+
+Row counts are kept in redis on every fetch so the web app can show
+live progress. The task log is only updated every few seconds, keeping
+the app database out of the extraction loop.
+
+The reporter is used as a context manager, so the query is marked as
+failed if it stops with an error.
+
+Progress is stored in a redis hash at ``runner_<task id>_progress``.
+
+:run_id: run the progress belongs to.
+:status: ``running``, ``done`` or ``failed``.
+:rows: number of rows received so far.
+:started: unix time the query started.
+:updated: unix time of the last fetch.
+"""
+
+import time
+from contextlib import suppress
+from types import TracebackType
+from typing import Any, Callable, Optional, Type
+
+from flask import current_app as app
+from redis.exceptions import RedisError
+
+from runner.extensions import db, redis_client
+from runner.model import Task, TaskLog
+
+# progress is kept for a day after the last update.
+PROGRESS_EXPIRE = 60 * 60 * 24
+
+
+def progress_key(task_id: int) -> str:
+    """Get the redis key holding a task's progress."""
+    return f"runner_{task_id}_progress"
+
+
+class ProgressReporter:
+    """Report query progress to redis and, throttled, to the task log."""
+
+    def __init__(
+        self,
+        task: Task,
+        run_id: Optional[str],
+        message: str,
+        interval: Optional[float] = None,
+    ) -> None:
+        """Set up class parameters."""
+        self.task = task
+        self.run_id = run_id
+        self.key = progress_key(task.id)
+        self.interval = float(
+            interval if interval is not None else app.config.get("SQL_PROGRESS_LOG_SECONDS", 10)
+        )
+        self.row_count = 0
+
+        self.log = TaskLog(
+            task_id=task.id,
+            job_id=run_id,
+            status_id=20,
+            message=message,
+        )
+        db.session.add(self.log)
+        db.session.commit()
+
+        self.logged = time.monotonic()
+
+        now = time.time()
+        self.__redis(
+            lambda pipe: pipe.delete(self.key).hset(
+                self.key,
+                mapping={
+                    "run_id": run_id or "",
+                    "status": "running",
+                    "rows": 0,
+                    "started": now,
+                    "updated": now,
+                },
+            )
+        )
+
+    def __redis(self, commands: Callable[[Any], Any]) -> None:
+        """Run redis commands in one round trip.
+
+        Progress is only informational, a redis outage should not fail the task.
+        """
+        with suppress(RedisError):
+            pipe = redis_client.pipeline(transaction=False)
+            commands(pipe)
+            pipe.expire(self.key, PROGRESS_EXPIRE)
+            pipe.execute()
+
+    def update(self, rows: int) -> None:
+        """Add a batch of rows to the progress."""
+        self.row_count += rows
+
+        self.__redis(
+            lambda pipe: pipe.hincrby(self.key, "rows", rows).hset(
+                self.key, "updated", time.time()
+            )
+        )
+
+        if time.monotonic() - self.logged >= self.interval:
+            self.log.message = "Getting query rows, %d received." % self.row_count
+            db.session.commit()
+            self.logged = time.monotonic()
+
+    def finish(self) -> None:
+        """Mark the query as done."""
+        self.__redis(
+            lambda pipe: pipe.hset(
+                self.key,
+                mapping={"status": "done", "rows": self.row_count, "updated": time.time()},
+            )
+        )
+
+        self.log.message = "Query returned %d rows." % self.row_count
+        db.session.commit()
+
+    def fail(self) -> None:
+        """Mark the query as failed."""
+        self.__redis(
+            lambda pipe: pipe.hset(
+                self.key,
+                mapping={"status": "failed", "rows": self.row_count, "updated": time.time()},
+            )
+        )
+
+        self.log.message = "Query failed after %d rows." % self.row_count
+        db.session.commit()
+
+    def __enter__(self) -> "ProgressReporter":
+        """Report progress until the query is done."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Mark the query as done, or as failed if it raised an error."""
+        if exc_type is None:
+            self.finish()
+        else:
+            self.fail()
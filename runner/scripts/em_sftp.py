@@ -1,9 +1,8 @@
 """SFTP connection manager."""
 
-import csv
-import fnmatch
 import os
 import re
+import shutil
 import sys
 import tempfile
 import time
@@ -11,7 +10,7 @@ import warnings
 from contextlib import suppress
 from pathlib import Path
 from stat import S_ISDIR
-from typing import IO, Any, Dict, Generator, List, Optional, Tuple
+from typing import IO, Dict, List, Optional, Tuple
 
 import paramiko
 from cryptography.utils import CryptographyDeprecationWarning
@@ -20,10 +19,14 @@ from flask import current_app as app
 with warnings.catch_warnings():
     warnings.filterwarnings("ignore", category=CryptographyDeprecationWarning)
     from paramiko import SFTPClient, SFTPFile, Transport
+    from paramiko.common import DEFAULT_WINDOW_SIZE
 
 from runner.model import ConnectionSftp, Task
+from runner.scripts.em_download import download_files
 from runner.scripts.em_file import file_size
+from runner.scripts.em_glob import find_files
 from runner.scripts.em_messages import RunnerException, RunnerLog
+from runner.scripts.em_transcode import DEFAULT_BLOCK_SIZE, transcode
 
 sys.path.append(str(Path(__file__).parents[2]) + "/scripts")
 from crypto import em_decrypt
@@ -61,6 +64,96 @@ def connection_json(connection: ConnectionSftp) -> Dict:
     }
 
 
+def transfer_window(connection: ConnectionSftp) -> int:
+    """Get the transfer window of a connection in bytes."""
+    return (connection.window_size or 0) * 1024 * 1024 or DEFAULT_WINDOW_SIZE
+
+
+class WindowedFile:
+    """Remote file read in order, a window of bytes at a time.
+
+    The reads of a whole window are requested at once, so the download is
+    not slowed down by a round trip for every read. At most one window is
+    buffered, however slowly the data is used.
+    """
+
+    def __init__(self, sftp_file: SFTPFile, size: int, window: int) -> None:
+        """Set up class parameters."""
+        self.sftp_file = sftp_file
+        self.size = size
+        self.window = max(window, SFTPFile.MAX_REQUEST_SIZE)
+        self.offset = 0
+        self.buffer = memoryview(b"")
+
+    def __fill(self) -> None:
+        length = min(self.window, self.size - self.offset)
+        self.buffer = memoryview(b"")
+
+        if length > 0:
+            (data,) = self.sftp_file.readv(
+                [(self.offset, length)],
+                max_concurrent_prefetch_requests=self.window // SFTPFile.MAX_REQUEST_SIZE,
+            )
+            self.offset += length
+            self.buffer = memoryview(data)
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes, or the rest of the file."""
+        if not self.buffer:
+            self.__fill()
+
+        if size < 0:
+            blocks = []
+            while self.buffer:
+                blocks.append(bytes(self.buffer))
+                self.__fill()
+            return b"".join(blocks)
+
+        data = bytes(self.buffer[:size])
+        self.buffer = self.buffer[size:]
+        return data
+
+    def close(self) -> None:
+        """Close the remote file."""
+        self.sftp_file.close()
+
+
+def download(
+    conn: SFTPClient,
+    file_name: str,
+    window: int = DEFAULT_WINDOW_SIZE,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> WindowedFile:
+    """Open a remote file for a fast sequential read."""
+    sftp_file = conn.open(file_name, mode="rb", bufsize=block_size)
+    return WindowedFile(sftp_file, sftp_file.stat().st_size, window)
+
+
+def upload(
+    conn: SFTPClient,
+    local_file: IO[bytes],
+    file_name: str,
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> int:
+    """Upload a file with pipelined writes.
+
+    Writes are sent without waiting for each one to be acknowledged. The
+    size of the remote file is checked when the upload is done.
+
+    :returns: size of the uploaded file.
+    """
+    with conn.open(file_name, mode="wb", bufsize=block_size) as sftp_file:
+        sftp_file.set_pipelined(True)
+        shutil.copyfileobj(local_file, sftp_file, block_size)
+        size = sftp_file.tell()
+
+    remote_size = conn.stat(file_name).st_size
+    if remote_size != size:
+        raise OSError(f"Size mismatch on upload. {remote_size} != {size}")
+
+    return size
+
+
 def connect(connection: ConnectionSftp) -> Tuple[Transport, SFTPClient]:
     """Connect to sftp server."""
     try:
@@ -101,7 +194,9 @@ def connect(connection: ConnectionSftp) -> Tuple[Transport, SFTPClient]:
                         pkey=key,
                     )
 
-                conn = paramiko.SFTPClient.from_transport(transport)
+                conn = paramiko.SFTPClient.from_transport(
+                    transport, window_size=transfer_window(connection)
+                )
                 if conn is None:
                     raise ValueError("Failed to create connection.")
 
@@ -144,6 +239,8 @@ class Sftp:
         self.run_id = run_id
         self.connection = connection
         self.dir = directory
+        self.window = transfer_window(connection)
+        self.block_size = app.config.get("SOURCE_FILE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE)
         self.transport, self.conn = self.__connect()
 
     def __connect(self) -> Tuple[Transport, SFTPClient]:
@@ -152,7 +249,20 @@ class Sftp:
         except ValueError as e:
             raise RunnerException(self.task, self.run_id, 9, str(e))
 
-    def _walk(self, directory: str) -> Generator[Tuple[str, List[Any], List[str]], None, None]:
+    def __worker_connect(self) -> Tuple[Transport, SFTPClient]:
+        """Open a connection for a download worker."""
+        transport, conn = connect(self.connection)
+        conn.chdir(self.__clean_path(self.connection.path or "/"))
+
+        return transport, conn
+
+    @staticmethod
+    def __worker_close(worker: Tuple[Transport, SFTPClient]) -> None:
+        worker[1].close()
+        worker[0].close()
+
+    def _list_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """List the folders and files in a folder."""
         dirs = []
         nondirs = []
 
@@ -160,48 +270,37 @@ class Sftp:
             if S_ISDIR(entry.st_mode or 0):
                 dirs.append(entry.filename)
             else:
-                nondirs.append(str(Path(directory).joinpath(entry.filename)))
+                nondirs.append(entry.filename)
+
+        return dirs, nondirs
 
-        yield directory, dirs, nondirs
+    def __load_file(self, file_name: str, conn: Optional[SFTPClient] = None) -> IO[str]:
+        """Download file from sftp server.
 
-        # Recurse into sub-directories
-        for dirname in dirs:
-            new_path = str(Path(directory).joinpath(dirname))
-            yield from self._walk(new_path)
+        :param conn: connection to download with, defaults to the task connection.
+        """
+        conn = conn or self.conn
 
-    def __load_file(self, file_name: str) -> IO[str]:
-        """Download file from sftp server."""
         RunnerLog(
             self.task,
             self.run_id,
             9,
-            f"Downloading {file_size(self.conn.stat(file_name).st_size or 0)} from {file_name}.",
+            f"Downloading {file_size(conn.stat(file_name).st_size or 0)} from {file_name}.",
         )
 
-        sftp_file = self.conn.open(file_name, mode="rb")
-
-        def load_data(file_obj: SFTPFile) -> Generator:
-            with file_obj as this_file:
-                while True:
-                    data = this_file.read(1024).decode("utf-8", "replace")  # type: ignore[attr-defined]
-                    if not data:
-                        break
-                    yield data
+        sftp_file = download(conn, file_name, self.window, self.block_size)
 
-        with tempfile.NamedTemporaryFile(mode="w", delete=False, dir=self.dir) as data_file:
-            for data in load_data(sftp_file):
-                if self.task.source_sftp_ignore_delimiter != 1 and self.task.source_sftp_delimiter:
-                    my_delimiter = self.task.source_sftp_delimiter or ","
-
-                    csv_reader = csv.reader(
-                        data.splitlines(),
-                        delimiter=my_delimiter,
-                    )
-                    writer = csv.writer(data_file)
-                    writer.writerows(csv_reader)
-
-                else:
-                    data_file.write(data)
+        with tempfile.NamedTemporaryFile(mode="wb+", delete=False, dir=self.dir) as data_file:
+            transcode(
+                sftp_file,
+                data_file,
+                (
+                    self.task.source_sftp_delimiter
+                    if self.task.source_sftp_ignore_delimiter != 1
+                    else None
+                ),
+                self.block_size,
+            )
 
             original_name = str(self.dir.joinpath(file_name.split("/")[-1]))
             if os.path.islink(original_name):
@@ -240,14 +339,11 @@ class Sftp:
             if "*" in file_name:
                 RunnerLog(self.task, self.run_id, 9, "Searching for matching files...")
 
-                # get the path up to the *
-                base_dir = str(Path(file_name.split("*")[0]).parent)
-
-                file_list = []
-                for _, _, walk_file_list in self._walk(base_dir):
-                    for this_file in walk_file_list:
-                        if fnmatch.fnmatch(this_file, file_name):
-                            file_list.append(this_file)
+                file_list = find_files(
+                    file_name,
+                    self._list_dir,
+                    f"sftp-{self.connection.id}:{self.connection.path or '/'}",
+                )
 
                 RunnerLog(
                     self.task,
@@ -260,7 +356,13 @@ class Sftp:
                         "\n".join(file_list),
                     ),
                 )
-                return [self.__load_file(file_name) for file_name in file_list]
+                return download_files(
+                    f"sftp-{self.connection.id}",
+                    file_list,
+                    lambda worker, file_name, *_: self.__load_file(file_name, worker[1]),
+                    self.__worker_connect,
+                    self.__worker_close,
+                )
 
             return [self.__load_file(file_name)]
 
@@ -269,10 +371,11 @@ class Sftp:
                 self.task, self.run_id, 9, f"File failed to load file from server.\n{e}"
             )
 
-    def save(self, overwrite: int, file_name: str) -> None:
+    def save(self, overwrite: int, file_name: str, source: Optional[IO[bytes]] = None) -> bool:
         """Use to copy local file to FTP server.
 
-        :returns: true if successful.
+        :param source: file to upload, instead of the local file.
+        :returns: true if the file was uploaded, false if it already exists.
         """
         try:
             self.conn.chdir(self.__clean_path(self.connection.path or "/"))
@@ -292,7 +395,7 @@ class Sftp:
 
                 self.__close()
 
-                return
+                return False
 
             except BaseException:
                 # continue of file does not exist.
@@ -316,18 +419,23 @@ class Sftp:
                 # continue of file does not exist.
                 pass
 
-            self.conn.put(str(self.dir.joinpath(file_name)), file_name, confirm=True)
+            with (
+                source if source is not None else open(str(self.dir.joinpath(file_name)), "rb")
+            ) as local_file:
+                size = upload(self.conn, local_file, file_name, self.block_size)
 
-            # file is now confirmed on server w/ confirm=True flag
+            # file size is confirmed on server by upload
             RunnerLog(
                 self.task,
                 self.run_id,
                 9,
-                f"{file_size(self.conn.stat(file_name).st_size or 0)} stored on server as {file_name}.",
+                f"{file_size(size)} stored on server as {file_name}.",
             )
 
             self.__close()
 
+            return True
+
         except BaseException as e:
             raise RunnerException(
                 self.task, self.run_id, 9, f"Failed to save file on server.\n{e}"
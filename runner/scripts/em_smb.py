@@ -1,16 +1,13 @@
 """SMB Connection Manager."""
 
-import csv
-import fnmatch
 import os
-import pickle
 import sys
 import tempfile
+import threading
 import time
-import urllib
-from io import TextIOWrapper
+from contextlib import contextmanager
 from pathlib import Path
-from typing import IO, Any, Dict, Generator, List, Optional, Tuple
+from typing import IO, Any, Dict, Generator, List, Optional, Set, Tuple
 
 from flask import current_app as app
 from pathvalidate import sanitize_filename
@@ -18,11 +15,15 @@ from smb.base import NotConnectedError, SMBTimeout
 from smb.smb_structs import OperationFailure
 from smb.SMBConnection import SMBConnection
 
-from runner import redis_client
+from runner.extensions import redis_client
 from runner.model import ConnectionSmb, Task
+from runner.scripts.em_download import download_files
 from runner.scripts.em_file import file_size
+from runner.scripts.em_glob import find_files
 from runner.scripts.em_messages import RunnerException, RunnerLog
-from runner.scripts.smb_fix import SMBHandler
+from runner.scripts.em_pool import ConnectionPool, get_pool
+from runner.scripts.em_tee import TeeReader
+from runner.scripts.em_transcode import DEFAULT_BLOCK_SIZE, transcode
 
 sys.path.append(str(Path(__file__).parents[2]) + "/scripts")
 from crypto import em_decrypt
@@ -39,18 +40,53 @@ def connection_json(connection: SMBConnection) -> Dict:
     }
 
 
+class DirectoryCache:
+    """Folders known to exist on each share, kept for a while."""
+
+    def __init__(self) -> None:
+        """Set up class parameters."""
+        self.folders: Dict[Tuple[str, str, str], float] = {}
+        self.lock = threading.Lock()
+
+    def exists(self, server_name: str, share_name: str, folder: str) -> bool:
+        """Check if a folder is known to exist."""
+        with self.lock:
+            expires = self.folders.get((server_name, share_name, folder))
+
+            if expires is None:
+                return False
+
+            if expires <= time.monotonic():
+                del self.folders[(server_name, share_name, folder)]
+                return False
+
+            return True
+
+    def add(self, server_name: str, share_name: str, folder: str, ttl: float) -> None:
+        """Remember that a folder exists."""
+        if ttl > 0:
+            with self.lock:
+                self.folders[(server_name, share_name, folder)] = time.monotonic() + ttl
+
+    def forget(self, server_name: str, share_name: str) -> None:
+        """Forget all folders of a share."""
+        with self.lock:
+            for key in [key for key in self.folders if key[:2] == (server_name, share_name)]:
+                del self.folders[key]
+
+
+directory_cache = DirectoryCache()
+
+
 def connect(username: str, password: str, server_name: str, server_ip: str) -> SMBConnection:
     """Connect to SMB server.
 
-    After making a connection we save it to redis. Next time we need a connection
-    we can grab if from redis and attempt to use. If it is no longer connected
-    then reconnect.
-
-    Because we want to use existing connection we will not close them...
+    Logins that time out are retried for a few minutes before giving up.
+    Use :func:`pool` to reuse connections between runs.
     """
 
     def build_connect() -> SMBConnection:
-        conn = SMBConnection(
+        return SMBConnection(
             username,
             em_decrypt(password, app.config["PASS_KEY"]),
             "EM2.0 Webapp",
@@ -58,21 +94,13 @@ def connect(username: str, password: str, server_name: str, server_ip: str) -> S
             use_ntlm_v2=True,
         )
 
-        redis_client.set("smb_connection_" + str(server_name), pickle.dumps(conn))
-
-        return conn
-
     try:
-        smb_connection = redis_client.get("smb_connection_" + str(server_name))
-        conn = pickle.loads(smb_connection) if smb_connection else None
-
-        # there is no timeout in paramiko so...
+        # there is no timeout in pysmb so...
         # continue to attemp to login during time limit
         # if we are getting timeout exceptions
 
         conn = build_connect()
 
-        # make connection is not already connected.
         timeout = time.time() + 60 * 3  # 3 mins from now
 
         while True:
@@ -93,6 +121,7 @@ def connect(username: str, password: str, server_name: str, server_ip: str) -> S
                 if time.time() <= timeout:
                     time.sleep(30)  # wait 30 sec before retrying
                     # recreate login
+                    conn.close()
                     conn = build_connect()
                     continue
                 elif time.time() > timeout:
@@ -107,6 +136,139 @@ def connect(username: str, password: str, server_name: str, server_ip: str) -> S
         raise ValueError(f"Connection failed.\n{e}")
 
 
+def validate(conn: SMBConnection) -> None:
+    """Check a pooled connection is still logged in."""
+    conn.echo(b"atlas hub", timeout=10)
+
+
+def reset(conn: SMBConnection) -> None:
+    """SMB connections do not keep any state between runs."""
+
+
+def pool(username: str, password: str, server_name: str, server_ip: str) -> ConnectionPool:
+    """Get the connection pool of a server login.
+
+    Connections to a server are shared by all tasks using the same login,
+    whatever share they read from.
+    """
+    return get_pool(
+        ("smb", server_name, server_ip, username),
+        ("smb", server_name, server_ip, username, password),
+        lambda: connect(username, password, server_name, server_ip),
+        validate,
+        reset,
+        max_size=int(app.config.get("SMB_POOL_SIZE", 4)),
+        idle_timeout=int(app.config.get("SMB_POOL_IDLE_TIMEOUT", 300)),
+    )
+
+
+# archived files in use by runs, with the time they were held.
+ARCHIVE_HOLDS = "runner_archive_holds"
+
+
+def archive_folder() -> str:
+    """Get the folder of archived files on the backup share."""
+    return str(
+        Path(sanitize_filename(app.config.get("SMB_SUBFOLDER") or ""))
+        / app.config.get("BACKUP_ARCHIVE_FOLDER", "archive")
+    )
+
+
+def archive_path(file_hash: str) -> str:
+    """Get the path of an archived file on the backup share."""
+    return str(Path(archive_folder()) / file_hash[:2] / file_hash)
+
+
+def archive_lock(path: str) -> Any:
+    """Lock an archived file while a run holds it, or the clean job removes it."""
+    return redis_client.lock("runner_archive_lock_" + path, timeout=60)
+
+
+def archive_hold(path: str) -> None:
+    """Keep an archived file from being removed while a run uses it.
+
+    Runs hold the file before checking if it is already archived, so it
+    cannot be removed between the check and saving the task file. Holds
+    are dropped by the clean job once they are BACKUP_ARCHIVE_MIN_AGE
+    seconds old.
+    """
+    with archive_lock(path):
+        redis_client.zadd(ARCHIVE_HOLDS, {path: time.time()})
+
+
+def archive_clean(conn: SMBConnection, share_name: str, referenced: Set[str], age: int) -> int:
+    """Remove archived files that no task file points to.
+
+    Files written or held by a run in the last age seconds are kept, they
+    may belong to a run that is still saving its task files.
+
+    :param referenced: paths of archived files that are still used.
+    :returns: number of files removed.
+    """
+    archive = archive_folder()
+    oldest = time.time() - age
+    removed = 0
+
+    # holds of finished runs
+    redis_client.zremrangebyscore(ARCHIVE_HOLDS, "-inf", oldest)
+
+    try:
+        folders = [
+            entry.filename
+            for entry in conn.listPath(share_name, archive)
+            if entry.isDirectory and entry.filename not in [".", ".."]
+        ]
+    # nothing has been archived yet
+    except OperationFailure:
+        return 0
+
+    for folder in folders:
+        for entry in conn.listPath(share_name, str(Path(archive) / folder)):
+            path = str(Path(archive) / folder / entry.filename)
+
+            if entry.isDirectory or path in referenced or entry.last_write_time > oldest:
+                continue
+
+            # a run holding the file waits until it is removed, and then
+            # archives it again.
+            lock = archive_lock(path)
+            if not lock.acquire(blocking=False):
+                continue
+
+            try:
+                if redis_client.zscore(ARCHIVE_HOLDS, path) is not None:
+                    continue
+
+                conn.deleteFiles(share_name, path)
+                removed += 1
+            finally:
+                lock.release()
+
+    return removed
+
+
+class StreamWriter:
+    """File like writer, handing downloaded blocks to a reader."""
+
+    def __init__(self, reader: TeeReader, offset: int = 0) -> None:
+        """Set up class parameters."""
+        self.reader = reader
+        self.position = offset
+
+    def write(self, data: bytes) -> int:
+        """Add a block. Raises once the reader is closed, to stop the download."""
+        if self.reader.closed:
+            raise OSError("Download stopped by the reader.")
+
+        self.reader.put(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """Get the position in the network file."""
+        return self.position
+
+
 class Smb:
     """SMB Connection Handler Class.
 
@@ -145,28 +307,41 @@ class Smb:
             self.server_name = app.config["SMB_SERVER_NAME"]
             self.subfolder = app.config.get("SMB_SUBFOLDER")
 
-        self.conn = self.__connect()
+        self.pool = pool(
+            str(self.username),
+            str(self.password),
+            str(self.server_name),
+            str(self.server_ip),
+        )
+
+        # checked out from the pool by each operation.
+        self.conn: SMBConnection
 
     def __connect(self) -> SMBConnection:
-        """Connect to SMB server.
+        """Get a connection from the pool."""
+        try:
+            return self.pool.checkout()
+        except ValueError as e:
+            raise RunnerException(self.task, self.run_id, 10, str(e))
 
-        After making a connection we save it to redis. Next time we need a connection
-        we can grab if from redis and attempt to use. If it is no longer connected
-        then reconnect.
+    @contextmanager
+    def __connection(self) -> Generator[SMBConnection, None, None]:
+        """Check out a connection, then return it to the pool.
 
-        Because we want to use existing connection we will not close them...
+        Connections that failed are closed instead of being reused.
         """
+        self.conn = self.__connect()
+
         try:
-            return connect(
-                str(self.username),
-                str(self.password),
-                str(self.server_name),
-                str(self.server_ip),
-            )
-        except ValueError as e:
-            raise RunnerException(self.task, self.run_id, 10, str(e))
+            yield self.conn
+        except BaseException:
+            self.pool.checkin(self.conn, discard=True)
+            raise
 
-    def _walk(self, directory: str) -> Generator[Tuple[str, List[Any], List[str]], None, None]:
+        self.pool.checkin(self.conn)
+
+    def _list_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        """List the folders and files in a folder."""
         dirs = []
         nondirs = []
 
@@ -176,52 +351,96 @@ class Smb:
             if entry.isDirectory and entry.filename not in ["/", ".", ".."]:
                 dirs.append(entry.filename)
             elif entry.isDirectory is False:
-                nondirs.append(str(Path(directory).joinpath(entry.filename)))
-
-        yield directory, dirs, nondirs
+                nondirs.append(entry.filename)
 
-        # Recurse into sub-directories
-        for dirname in dirs:
-            new_path = str(Path(directory).joinpath(dirname))
-            yield from self._walk(new_path)
+        return dirs, nondirs
 
-    def __load_file(self, file_name: str, index: int, length: int) -> IO[str]:
-        RunnerLog(self.task, self.run_id, 10, f"({index} of {length}) downloading {file_name}")
-
-        director = urllib.request.build_opener(SMBHandler)
-
-        password = em_decrypt(self.password, app.config["PASS_KEY"])
+    def __retrieve(
+        self,
+        conn: Optional[SMBConnection],
+        file_name: str,
+        destination: IO[bytes],
+        max_length: int = -1,
+    ) -> None:
+        """Download a file, resuming after network errors.
+
+        The download is resumed from the last byte written, on a new
+        connection from the pool, up to SMB_DOWNLOAD_RETRIES times.
+
+        :param max_length: number of bytes to download, or -1 for the rest
+            of the file.
+        """
+        retries = int(app.config.get("SMB_DOWNLOAD_RETRIES", 3))
+        timeout = int(app.config.get("SMB_DOWNLOAD_TIMEOUT", 120))
+        start = destination.tell()
 
-        open_file_for_read = director.open(
-            f"smb://{self.username}:{password}@{self.server_name},{self.server_ip}/{self.share_name}/{file_name}"
-        )
+        for attempt in range(retries + 1):
+            length = max_length - (destination.tell() - start) if max_length >= 0 else -1
+            try:
+                if conn is not None:
+                    conn.retrieveFileFromOffset(
+                        self.share_name,
+                        file_name,
+                        destination,
+                        offset=destination.tell(),
+                        max_length=length,
+                        timeout=timeout,
+                    )
+                else:
+                    with self.pool.connection() as pooled_conn:
+                        pooled_conn.retrieveFileFromOffset(
+                            self.share_name,
+                            file_name,
+                            destination,
+                            offset=destination.tell(),
+                            max_length=length,
+                            timeout=timeout,
+                        )
+                return
 
-        def load_data(file_obj: TextIOWrapper) -> Generator:
-            with file_obj as this_file:
-                while True:
-                    data = this_file.read(1024)
-                    if not data:
-                        break
-                    yield data
+            except (SMBTimeout, NotConnectedError, ConnectionError, TimeoutError) as e:
+                if attempt == retries:
+                    raise
 
-        # send back contents
+                RunnerLog(
+                    self.task,
+                    self.run_id,
+                    10,
+                    f"Download of {file_name} stopped at {file_size(destination.tell())}, "
+                    f"resuming.\n{e}",
+                )
+                conn = None
 
-        with tempfile.NamedTemporaryFile(mode="wb+", delete=False, dir=self.dir) as data_file:
-            for data in load_data(open_file_for_read):
-                if self.task.source_smb_ignore_delimiter != 1 and self.task.source_smb_delimiter:
-                    my_delimiter = self.task.source_smb_delimiter or ","
+    # pylint: disable=too-many-arguments
+    def __load_file(
+        self,
+        file_name: str,
+        index: int,
+        length: int,
+        conn: Optional[SMBConnection] = None,
+        local_name: Optional[str] = None,
+    ) -> IO[str]:
+        RunnerLog(self.task, self.run_id, 10, f"({index} of {length}) downloading {file_name}")
 
-                    csv_reader = csv.reader(
-                        data.splitlines(),
-                        delimiter=my_delimiter,
-                    )
-                    writer = csv.writer(data_file)
-                    writer.writerows(csv_reader)
+        block_size = app.config.get("SOURCE_FILE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE)
+        delimiter = (
+            self.task.source_smb_delimiter if self.task.source_smb_ignore_delimiter != 1 else None
+        )
 
-                else:
-                    data_file.write(data)
+        with tempfile.NamedTemporaryFile(
+            mode="wb+", delete=False, dir=self.dir, buffering=block_size
+        ) as data_file:
+            if delimiter:
+                # the raw file is kept until it is transcoded, so a failed
+                # download can be resumed.
+                with tempfile.TemporaryFile(dir=self.dir, buffering=block_size) as raw_file:
+                    self.__retrieve(conn, file_name, raw_file)
+                    raw_file.seek(0)
+                    transcode(raw_file, data_file, delimiter, block_size)
+            else:
+                self.__retrieve(conn, file_name, data_file)
 
-            original_name = str(self.dir.joinpath(file_name.split("/")[-1]))
+            original_name = str(self.dir.joinpath(local_name or file_name.split("/")[-1]))
             if os.path.islink(original_name):
                 os.unlink(original_name)
             elif os.path.isfile(original_name):
@@ -229,35 +448,119 @@ class Smb:
             os.link(data_file.name, original_name)
             data_file.name = original_name  # type: ignore[misc]
 
-        open_file_for_read.close()
-
         return data_file
 
-    def read(self, file_name: str) -> List[IO[str]]:
+    def read(self, file_name: str, local_name: Optional[str] = None) -> List[IO[str]]:
         """Read file contents of network file path.
 
         Data is loaded into a temp file.
 
+        :param local_name: name of the temp file, when it should not be named
+            like the network file. Archived files are named by their hash.
         Returns a path or raises an exception.
         """
+        with self.__connection():
+            return self.__read(file_name, local_name)
+
+    def size(self, file_name: str) -> int:
+        """Get the size of a network file."""
+        with self.__connection() as conn:
+            return conn.getAttributes(self.share_name, file_name).file_size
+
+    def stream(
+        self, file_name: str, offset: int = 0, length: int = -1
+    ) -> Generator[bytes, None, None]:
+        """Read a network file in blocks, while it downloads.
+
+        Blocks are downloaded ahead of the reader into a buffer of
+        STREAM_DELIVERY_BUFFERS blocks. When the reader stops early, the
+        download is stopped.
+
+        :param offset: first byte to read.
+        :param length: number of bytes to read, or -1 for the rest of the file.
+        """
+        block_size = int(app.config.get("SOURCE_FILE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE))
+        reader = TeeReader(int(app.config.get("STREAM_DELIVERY_BUFFERS", 8)))
+        writer = StreamWriter(reader, offset)
+
+        # pylint: disable=protected-access
+        flask_app = app._get_current_object()  # type: ignore[attr-defined]
+
+        with self.__connection() as conn:
+
+            def download() -> None:
+                try:
+                    with flask_app.app_context():
+                        self.__retrieve(conn, file_name, writer, length)
+                # pylint: disable=broad-except
+                except BaseException as e:
+                    reader.finish(e)
+                else:
+                    reader.finish()
+
+            thread = threading.Thread(target=download, daemon=True)
+            thread.start()
+
+            try:
+                yield from iter(lambda: reader.read(block_size), b"")
+            finally:
+                reader.close()
+                thread.join()
+
+    def save(
+        self, overwrite: int, file_name: str, source: Optional[IO[bytes]] = None
+    ) -> Optional[str]:
+        """Load data into network file path, creating location if not existing.
+
+        :param source: file to upload, instead of the local file.
+        :returns: path of the file, or None if it already exists and was not loaded.
+        """
+        with self.__connection():
+            return self.__save(overwrite, file_name, source)
+
+    def archive(self, file_name: str, file_hash: str, source: Optional[IO[bytes]] = None) -> str:
+        """Save an output file to the backup archive.
+
+        Files are archived once, under their md5 hash. When a file with the
+        same hash and size is already archived, it is not uploaded again.
+
+        :param source: file to upload, instead of the local file.
+        :returns: path of the archived file.
+        """
+        dest_path = archive_path(file_hash)
+
+        # the clean job keeps the file until this run saves its task file.
+        archive_hold(dest_path)
+
+        with self.__connection():
+            try:
+                archived = self.conn.getAttributes(self.share_name, dest_path)
+                if archived.file_size == self.dir.joinpath(file_name).stat().st_size:
+                    RunnerLog(
+                        self.task,
+                        self.run_id,
+                        10,
+                        "File is already archived on backup server and will not be loaded.",
+                    )
+                    return dest_path
+
+            # the file is not archived yet
+            except OperationFailure:
+                pass
+
+            return self.__save(1, file_name, source, dest_path) or dest_path
+
+    def __read(self, file_name: str, local_name: Optional[str]) -> List[IO[str]]:
         try:
             # if there is a wildcard in the filename
             if "*" in file_name:
                 RunnerLog(self.task, self.run_id, 10, "Searching for matching files...")
 
-                # a smb file name can be a path, but listpath
-                # will only list current folder.
-                # we need to split the filename path and iter
-                # through the folders that match.
-
-                # get the path up to the *.
-                base_dir = str(Path(file_name.split("*")[0]).parent)
-
-                file_list = []
-                for _, _, walk_file_list in self._walk(base_dir):
-                    for this_file in walk_file_list:
-                        if fnmatch.fnmatch(this_file, file_name):
-                            file_list.append(this_file)
+                file_list = find_files(
+                    file_name,
+                    self._list_dir,
+                    f"smb-{self.connection.id if self.connection else 0}",
+                )
 
                 RunnerLog(
                     self.task,
@@ -271,13 +574,19 @@ class Smb:
                     ),
                 )
 
-                # if a file was found, try to open.
-                return [
-                    self.__load_file(file_name, i, len(file_list))
-                    for i, file_name in enumerate(file_list, 1)
-                ]
+                # if a file was found, try to open. each download
+                # worker takes a connection from the pool.
+                return download_files(
+                    f"smb-{self.server_name}/{self.share_name}",
+                    file_list,
+                    lambda conn, file_name, index, length: self.__load_file(
+                        file_name, index, length, conn
+                    ),
+                    self.pool.checkout,
+                    self.pool.checkin,
+                )
 
-            return [self.__load_file(file_name, 1, 1)]
+            return [self.__load_file(file_name, 1, 1, self.conn, local_name)]
         except BaseException as e:
             raise RunnerException(
                 self.task,
@@ -286,13 +595,51 @@ class Smb:
                 f"File failed to load file from server.\n{e}",
             )
 
+    def __make_dirs(self, directory: str) -> None:
+        """Create a folder and its missing parents.
+
+        Folders are checked from the deepest up, so usually one request finds
+        the part of the path that exists. Folders known to exist are not
+        checked again for SMB_DIRECTORY_CACHE_SECONDS.
+        """
+        ttl = float(app.config.get("SMB_DIRECTORY_CACHE_SECONDS", 3600))
+        folders = [str(folder) for folder in [*reversed(Path(directory).parents), Path(directory)]]
+        missing = []
+
+        for folder in reversed([folder for folder in folders if folder not in [".", "/"]]):
+            if directory_cache.exists(self.server_name, self.share_name, folder):
+                break
+
+            try:
+                self.conn.getAttributes(self.share_name, folder)
+            except OperationFailure:
+                missing.append(folder)
+                continue
+
+            directory_cache.add(self.server_name, self.share_name, folder, ttl)
+            break
+
+        for folder in reversed(missing):
+            try:
+                self.conn.createDirectory(self.share_name, folder)
+            except OperationFailure:
+                # another run may have created it first
+                self.conn.getAttributes(self.share_name, folder)
+
+            directory_cache.add(self.server_name, self.share_name, folder, ttl)
+
     # pylint: disable=R1710
-    def save(self, overwrite: int, file_name: str) -> str:  # type: ignore[return]
-        """Load data into network file path, creating location if not existing."""
+    def __save(  # type: ignore[return]
+        self,
+        overwrite: int,
+        file_name: str,
+        source: Optional[IO[bytes]],
+        dest_path: Optional[str] = None,
+    ) -> Optional[str]:
         try:
-            if self.connection is not None:
+            if dest_path is None and self.connection is not None:
                 dest_path = str(Path(self.connection.path or "").joinpath(file_name))
-            else:
+            elif dest_path is None:
                 dest_path = str(
                     Path(
                         (
@@ -309,46 +656,36 @@ class Smb:
                     )
                 )
 
-            # path must be created one folder at a time.. the docs say the path will all be
-            # created if not existing, but it doesn't seem to be the case :)
-            my_dir = dest_path.split("/")[:-1]
-
-            path_builder = ""
-            for my_path in my_dir:
-                # only create directories in the backup drive. For tasks
-                # the user must already have a usable folder created.
-                if self.connection is None:
-                    path_builder += my_path + "/"
-
-                    try:
-                        self.conn.listPath(self.share_name, path_builder)
-                    # pylint: disable=broad-except
-                    except OperationFailure:
-                        self.conn.createDirectory(self.share_name, path_builder)
-
-            # pylint: disable=useless-else-on-loop
-            else:
-                if overwrite != 1:
-                    try:
-                        # try to get security of the file. if it doesn't exist,
-                        # we crash and then can create the file.
-                        self.conn.getSecurity(self.share_name, dest_path)
-                        RunnerLog(
-                            self.task,
-                            self.run_id,
-                            10,
-                            "File already exists and will not be loaded",
-                        )
-                        return dest_path
-
-                    # pylint: disable=broad-except
-                    except BaseException:
-                        pass
-
-                with open(str(self.dir.joinpath(file_name)), "rb", buffering=0) as file_obj:
-                    uploaded_size = self.conn.storeFile(
-                        self.share_name, dest_path, file_obj, timeout=120
+            # only create directories in the backup drive. For tasks
+            # the user must already have a usable folder created.
+            if self.connection is None:
+                self.__make_dirs(str(Path(dest_path).parent))
+
+            if overwrite != 1:
+                try:
+                    # try to get security of the file. if it doesn't exist,
+                    # we crash and then can create the file.
+                    self.conn.getSecurity(self.share_name, dest_path)
+                    RunnerLog(
+                        self.task,
+                        self.run_id,
+                        10,
+                        "File already exists and will not be loaded",
                     )
+                    return None
+
+                # pylint: disable=broad-except
+                except BaseException:
+                    pass
+
+            with (
+                source
+                if source is not None
+                else open(str(self.dir.joinpath(file_name)), "rb", buffering=0)
+            ) as file_obj:
+                uploaded_size = self.conn.storeFile(
+                    self.share_name, dest_path, file_obj, timeout=120
+                )
 
             server_name = "backup" if self.connection is None else self.connection.server_name
 
@@ -363,6 +700,9 @@ class Smb:
 
         # pylint: disable=broad-except
         except BaseException as e:
+            # folders may have been removed
+            directory_cache.forget(self.server_name, self.share_name)
+
             raise RunnerException(
                 self.task, self.run_id, 10, f"Failed to save file on server.\n{e}"
             )
@@ -1,16 +1,22 @@
 """Connection handler for SQL Server Databases."""
 
 import csv
-import itertools
 import sys
-import tempfile
+from contextlib import suppress
 from pathlib import Path
 from typing import IO, Any, Generator, List, Optional, Tuple
 
 import pyodbc
+from flask import current_app as app
 
-from runner import db
-from runner.model import Task, TaskLog
+from runner.model import Task
+from runner.scripts.em_fetch import AdaptiveFetcher
+from runner.scripts.em_parquet import PARQUET_FILE_TYPE, write_parquet
+from runner.scripts.em_partition import PartitionedQuery, partitioned
+from runner.scripts.em_pipeline import OutputPipeline
+from runner.scripts.em_pool import ConnectionPool, get_pool
+from runner.scripts.em_progress import ProgressReporter
+from runner.scripts.em_watermark import Watermark
 
 # set the limit for a csv cell value to something massive.
 # this is needed when users are building xml in a sql query
@@ -43,6 +49,151 @@ def connect(connection: str, timeout: int) -> Tuple[Any, Any]:
         raise ValueError(f"Failed to connection to database.\n{e}")
 
 
+def validate(conn: Any) -> None:
+    """Check a pooled connection still works."""
+    conn.cursor().execute("SELECT 1").fetchall()
+
+
+# settings a session starts with. a session can always see its own row.
+SESSION_QUERY = """
+SELECT DB_NAME(), language, date_format, date_first, transaction_isolation_level,
+    lock_timeout, deadlock_priority, @@OPTIONS, quoted_identifier, arithabort,
+    ansi_null_dflt_on, ansi_warnings, ansi_padding, ansi_nulls, concat_null_yields_null
+FROM sys.dm_exec_sessions WHERE session_id = @@SPID
+"""
+
+SESSION_FLAGS = [
+    "QUOTED_IDENTIFIER",
+    "ARITHABORT",
+    "ANSI_NULL_DFLT_ON",
+    "ANSI_WARNINGS",
+    "ANSI_PADDING",
+    "ANSI_NULLS",
+    "CONCAT_NULL_YIELDS_NULL",
+]
+
+# SET options that are only in @@OPTIONS, by their bit.
+SESSION_OPTIONS = [
+    ("IMPLICIT_TRANSACTIONS", 2),
+    ("CURSOR_CLOSE_ON_COMMIT", 4),
+    ("NOCOUNT", 512),
+    ("NUMERIC_ROUNDABORT", 8192),
+    ("XACT_ABORT", 16384),
+]
+
+ISOLATION_LEVELS = {
+    1: "READ UNCOMMITTED",
+    2: "READ COMMITTED",
+    3: "REPEATABLE READ",
+    4: "SERIALIZABLE",
+    5: "SNAPSHOT",
+}
+
+# local temp tables of the current session. other sessions' tables with
+# the same name do not resolve through OBJECT_ID.
+TEMP_TABLES_QUERY = """
+SELECT COUNT(*) FROM tempdb.sys.tables
+WHERE name LIKE '#%' AND name NOT LIKE '##%'
+AND object_id = OBJECT_ID('tempdb..' + LEFT(name, CHARINDEX('___', name + '___') - 1))
+"""
+
+
+def quote_name(name: str) -> str:
+    """Quote a database name."""
+    return "[%s]" % name.replace("]", "]]")
+
+
+def session_defaults(row: Any) -> str:
+    """Get a batch that sets a session back to the settings in SESSION_QUERY."""
+    (
+        database,
+        language,
+        date_format,
+        date_first,
+        isolation_level,
+        lock_timeout,
+        deadlock_priority,
+        options,
+        *flags,
+    ) = row
+
+    # language goes first, it also sets the date format and first day.
+    statements = [
+        "SET LANGUAGE N'%s'" % language.replace("'", "''"),
+        "SET DATEFORMAT %s" % "".join(filter(str.isalpha, date_format)),
+        "SET DATEFIRST %d" % date_first,
+        "SET TRANSACTION ISOLATION LEVEL %s"
+        % ISOLATION_LEVELS.get(isolation_level, "READ COMMITTED"),
+        "SET LOCK_TIMEOUT %d" % lock_timeout,
+        "SET DEADLOCK_PRIORITY %d" % deadlock_priority,
+    ]
+    statements.extend(
+        "SET %s %s" % (name, "ON" if value else "OFF") for name, value in zip(SESSION_FLAGS, flags)
+    )
+    statements.extend(
+        "SET %s %s" % (name, "ON" if options & bit else "OFF") for name, bit in SESSION_OPTIONS
+    )
+    statements.append("USE %s" % quote_name(database))
+
+    return ";\n".join(statements)
+
+
+class Session:
+    """Open connections of a pool, and set them back to a new session on reuse.
+
+    The settings are read from the first connection. Every connection of
+    the pool uses the same login, so they all start the same way.
+    """
+
+    def __init__(self, connection: str, timeout: int) -> None:
+        """Set up class parameters."""
+        self.connection = connection
+        self.timeout = timeout
+        self.defaults: Optional[str] = None
+
+    def connect(self) -> Any:
+        """Open a connection, reading the session settings from the first one."""
+        conn = connect(self.connection, self.timeout)[0]
+
+        # without the settings connections are not reused.
+        if self.defaults is None:
+            with suppress(pyodbc.Error):
+                self.defaults = session_defaults(conn.cursor().execute(SESSION_QUERY).fetchone())
+
+        return conn
+
+    def reset(self, conn: Any) -> None:
+        """Clear session state before a pooled connection is reused.
+
+        Open transactions are rolled back, and SET options and the database
+        go back to how the session started. Temp tables last until the
+        session ends, so sessions that made them are closed instead.
+        """
+        if self.defaults is None:
+            raise ValueError("Session settings are unknown.")
+
+        cur = conn.cursor()
+        cur.execute("IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION")
+
+        if cur.execute(TEMP_TABLES_QUERY).fetchone()[0]:
+            raise ValueError("Session has temp tables.")
+
+        cur.execute(self.defaults)
+
+
+def pool(database_id: int, connection: str, timeout: int) -> ConnectionPool:
+    """Get the connection pool of a database."""
+    connection = connection.strip()
+    session = Session(connection, timeout)
+    return get_pool(
+        database_id,
+        ("sqlserver", connection, timeout),
+        session.connect,
+        validate,
+        session.reset,
+    )
+
+
 class SqlServer:
     """Functions to query against sql server."""
 
@@ -53,53 +204,108 @@ class SqlServer:
         connection: str,
         timeout: int,
         directory: Path,
+        max_fetch_size: Optional[int] = None,
+        connection_pool: Optional[ConnectionPool] = None,
+        watermark: Optional[Watermark] = None,
     ):
-        """Initialize class."""
+        """Initialize class.
+
+        When a connection pool is passed in, the connection is taken
+        from the pool and returned to it after the query. A watermark
+        is updated from the query rows.
+        """
         self.task = task
         self.run_id = run_id
         self.connection = connection
         self.timeout = timeout
+        self.pool = connection_pool
         self.conn, self.cur = self.__connect()
         self.run_id = run_id
         self.dir = directory
         self.row_count = 0
+        self.itersize = int(app.config.get("SQL_ITERSIZE", 5000))
+        self.max_fetch_size = max_fetch_size
+        self.watermark = watermark
 
-    def __rows(self, size: int = 500) -> Generator:
-        """Return data from query by a generator."""
-        log = TaskLog(
-            task_id=self.task.id,
-            job_id=self.run_id,
-            status_id=20,
-            message=("Getting first %d query rows." % size),
-        )
-        db.session.add(log)
-        db.session.commit()
+    def __batches(self) -> Generator:
+        """Return batches of query rows by a generator."""
+        fetcher = AdaptiveFetcher.from_config(self.cur, self.max_fetch_size)
 
-        for iteration in itertools.count():
+        with ProgressReporter(
+            self.task, self.run_id, "Getting first %d query rows." % fetcher.size
+        ) as progress:
             if self.cur.description is None:
-                break
+                return
 
-            rows = self.cur.fetchmany(size)
+            for rows in fetcher.batches():
+                self.row_count += len(rows)
+                progress.update(len(rows))
 
-            if not rows:
-                break
+                if self.watermark is not None:
+                    self.watermark.update(self.cur.description, rows)
 
-            self.row_count = size * iteration + len(rows)
+                yield rows
 
-            log.message = "Getting query rows %d-%d of %s" % (
-                (size * iteration),
-                (size * iteration + len(rows)),
-                (str(size * iteration + len(rows)) if len(rows) < size else "?"),
-            )
-            db.session.add(log)
-            db.session.commit()
+    def __rows(self) -> Generator:
+        """Return data from query by a generator."""
+        for rows in self.__batches():
             yield from rows
 
     def __connect(self) -> Tuple[Any, Any]:
+        if self.pool is not None:
+            conn = self.pool.checkout()
+            return conn, conn.cursor()
+
         return connect(self.connection.strip(), self.timeout)
 
-    def __close(self) -> None:
-        self.conn.close()
+    def __close(self, failed: bool = False) -> None:
+        if self.conn is None:
+            return
+
+        if self.pool is not None:
+            self.pool.checkin(self.conn, discard=failed)
+        else:
+            self.conn.close()
+
+        self.conn = None
+
+    def __partition_cursor(self, conn: Any, query: str) -> Any:
+        """Run one partition of the query."""
+        cur = conn.cursor()
+        cur.execute(query)
+        return cur
+
+    def __run_partitioned(self, query: str) -> Tuple[int, List[IO[str]]]:
+        """Run the query in partitions, each on a connection from the pool."""
+        partitions = PartitionedQuery(
+            self.task,
+            self.run_id,
+            self.dir,
+            self.pool
+            or ConnectionPool(
+                lambda: connect(self.connection.strip(), self.timeout)[0],
+                validate,
+                # connections are closed, not reused.
+                lambda conn: None,
+                max_size=0,
+                idle_timeout=0,
+            ),
+            self.__partition_cursor,
+            self.max_fetch_size,
+            self.watermark,
+        )
+
+        predicates = partitions.predicates(self.cur, query)
+
+        # the partitions use their own connections.
+        self.__close()
+
+        self.row_count, data_files = partitions.run(query, predicates)
+
+        if self.task.source_require_sql_output == 1 and self.row_count == 0:
+            raise ValueError("SQL output is required but no records returned.")
+
+        return self.row_count, data_files
 
     def run(self, query: str) -> Tuple[int, List[IO[str]]]:
         """Run a sql query and return temp file location.
@@ -108,13 +314,33 @@ class SqlServer:
 
         Returns a path or raises an exception.
         """
+        try:
+            return self.__run(query)
+        except BaseException:
+            self.__close(failed=True)
+            raise
+
+    def __run(self, query: str) -> Tuple[int, List[IO[str]]]:
+        if partitioned(self.task):
+            return self.__run_partitioned(query)
+
         self.cur.execute(query)
 
-        with tempfile.NamedTemporaryFile(
-            mode="w+", newline="", delete=False, dir=self.dir
-        ) as data_file:
-            writer = csv.writer(data_file)
+        # parquet files are written straight from the fetched batches.
+        # processing scripts get csv, their output is converted on save.
+        if (
+            self.task.destination_file_type_id == PARQUET_FILE_TYPE
+            and not self.task.processing_type_id
+        ):
+            parquet_file = write_parquet(self.cur, self.__batches(), self.dir)
+            self.__close()
+
+            if self.task.source_require_sql_output == 1 and self.row_count == 0:
+                raise ValueError("SQL output is required but no records returned.")
+
+            return self.row_count, [parquet_file]
 
+        with OutputPipeline(self.task, self.run_id, self.dir) as writer:
             if self.task.source_query_include_header:
                 writer.writerow(
                     [i[0] for i in self.cur.description] if self.cur.description else []
@@ -128,4 +354,4 @@ class SqlServer:
         if self.task.source_require_sql_output == 1 and self.row_count == 0:
             raise ValueError("SQL output is required but no records returned.")
 
-        return self.row_count, [data_file]
+        return self.row_count, [writer.data_file]
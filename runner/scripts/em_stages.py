@@ -0,0 +1,299 @@
+"""Streaming output stages.
+
+Output files are encrypted, hashed and zipped while they are written.
+Each stage passes its output to the next, so only the final file is
+written to disk.
+
+.. code-block:: text
+
+    data > gpg > md5 > zip > disk
+
+GPG keys are imported once into a keyring owned by the runner process
+and reused by later runs with the same key.
+"""
+
+import hashlib
+import io
+import os
+import subprocess
+import tempfile
+import threading
+import zipfile
+from contextlib import suppress
+from pathlib import Path
+from types import TracebackType
+from typing import IO, Any, Dict, List, Optional, Set, Type
+
+import gnupg
+from crypto import em_decrypt
+from flask import current_app as app
+
+from runner.model import Task
+
+GPG_BINARY = "/usr/local/bin/gpg"
+
+BUFFER_SIZE = 1024 * 1024
+
+_keyring_lock = threading.Lock()
+
+# the process keyring, created on first use
+_keyring: Dict[str, gnupg.GPG] = {}
+
+# fingerprints of each key, by hash of the key text
+_key_fingerprints: Dict[str, List[str]] = {}
+
+# fingerprints already in the process keyring
+_imported: Set[str] = set()
+
+
+def gpg_keyring() -> gnupg.GPG:
+    """Get the runner process gpg keyring."""
+    if "gpg" not in _keyring:
+        _keyring["gpg"] = gnupg.GPG(
+            GPG_BINARY, gnupghome=tempfile.mkdtemp(prefix="atlas_hub_gpg_")
+        )
+
+    return _keyring["gpg"]
+
+
+def gpg_fingerprints(key: str) -> List[str]:
+    """Import a public key into the process keyring, if it is not there already.
+
+    :returns: fingerprints of the key.
+    """
+    key_hash = hashlib.sha256(key.encode("utf8")).hexdigest()
+
+    with _keyring_lock:
+        fingerprints = _key_fingerprints.get(key_hash, [])
+
+        if fingerprints and _imported.issuperset(fingerprints):
+            return fingerprints
+
+        keychain = gpg_keyring().import_keys(key)
+
+        if not keychain.fingerprints:
+            raise ValueError("Failed to import gpg key.\n%s" % keychain.stderr)
+
+        _key_fingerprints[key_hash] = keychain.fingerprints
+        _imported.update(keychain.fingerprints)
+
+        return keychain.fingerprints
+
+
+class HashStage(io.RawIOBase):
+    """Pass bytes to the next stage, updating an md5 hash."""
+
+    def __init__(self, next_stage: IO[bytes]) -> None:
+        """Set up class parameters."""
+        super().__init__()
+        self.next_stage = next_stage
+        self.file_hash = hashlib.md5()  # noqa: S303
+
+    def writable(self) -> bool:
+        """Stage is write only."""
+        return True
+
+    def write(self, data: Any) -> int:
+        """Hash and pass on a chunk of data."""
+        self.file_hash.update(data)
+        self.next_stage.write(data)
+        return memoryview(data).nbytes
+
+
+class GpgStage(io.RawIOBase):
+    """Encrypt bytes with gpg, passing the encrypted output to the next stage.
+
+    Data is piped through a gpg process. A thread copies the encrypted
+    output on to the next stage while data is still being written.
+    """
+
+    def __init__(self, next_stage: IO[bytes], fingerprints: List[str]) -> None:
+        """Start the gpg process."""
+        super().__init__()
+        self.next_stage = next_stage
+        self.error: Optional[BaseException] = None
+        self.stderr = b""
+
+        recipients: List[str] = []
+        for fingerprint in fingerprints:
+            recipients.extend(["--recipient", fingerprint])
+
+        # same ascii armored output as python-gnupg's encrypt_file.
+        self.process = subprocess.Popen(  # noqa: S603
+            [
+                gpg_keyring().gpgbinary,
+                "--homedir",
+                str(gpg_keyring().gnupghome),
+                "--batch",
+                "--no-tty",
+                "--yes",
+                "--trust-model",
+                "always",
+                "--armor",
+                "--encrypt",
+                *recipients,
+                "--output",
+                "-",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+
+        self.readers = [
+            threading.Thread(target=self.__copy_output, daemon=True),
+            threading.Thread(target=self.__read_errors, daemon=True),
+        ]
+        for reader in self.readers:
+            reader.start()
+
+    def __copy_output(self) -> None:
+        try:
+            while True:
+                chunk = self.process.stdout.read(BUFFER_SIZE)  # type: ignore[union-attr]
+                if not chunk:
+                    break
+                self.next_stage.write(chunk)
+        # pylint: disable=broad-except
+        except BaseException as e:
+            self.error = e
+
+            # gpg would block on a full output pipe, and the writer on gpg.
+            self.process.kill()
+            while self.process.stdout.read(BUFFER_SIZE):  # type: ignore[union-attr]
+                pass
+
+    def __read_errors(self) -> None:
+        self.stderr = self.process.stderr.read()  # type: ignore[union-attr]
+
+    def writable(self) -> bool:
+        """Stage is write only."""
+        return True
+
+    def write(self, data: Any) -> int:
+        """Send a chunk of data to gpg."""
+        if self.error:
+            raise self.error
+
+        try:
+            self.process.stdin.write(data)  # type: ignore[union-attr]
+        except BrokenPipeError:
+            if self.error:
+                raise self.error
+            raise ValueError(
+                "File failed to encrypt.\n%s" % self.stderr.decode("utf8", errors="replace")
+            )
+        return memoryview(data).nbytes
+
+    def close(self) -> None:
+        """Finish encrypting and wait for the output to be written."""
+        if self.closed:
+            return
+
+        super().close()
+
+        with suppress(BrokenPipeError):
+            self.process.stdin.close()  # type: ignore[union-attr]
+
+        for reader in self.readers:
+            reader.join()
+
+        returncode = self.process.wait()
+
+        if self.error:
+            raise self.error
+
+        if returncode != 0:
+            raise ValueError(
+                "File failed to encrypt.\n%s" % self.stderr.decode("utf8", errors="replace")
+            )
+
+
+class OutputStages:
+    """Open the stages an output file is written through.
+
+    Write the file contents to ``binary``. When closed, the file is moved
+    to its final name.
+
+    :param task: task the file belongs to.
+    :param directory: folder the file is saved in.
+    :param file_name: file name, before encrypting.
+    :param zip_name: name of the zip archive, if the file is zipped.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        task: Task,
+        directory: str,
+        file_name: str,
+        zip_name: Optional[str] = None,
+    ) -> None:
+        """Set up class parameters."""
+        self.task = task
+        self.directory = directory
+        self.file_name = file_name
+        self.zip_name = zip_name
+        self.encrypted = task.file_gpg == 1
+
+        if self.encrypted:
+            self.file_name += ".gpg"
+
+        self.file_hash: Any = None
+        self.file_path = str(Path(directory).joinpath(self.zip_name or self.file_name))
+
+        self.binary: Any = None
+        self.__raw: Any = None
+        self.__stages: List[Any] = []
+
+    def __enter__(self) -> "OutputStages":
+        """Open the stages, last stage first."""
+        self.__raw = tempfile.NamedTemporaryFile(  # noqa: SIM115
+            mode="wb+", delete=False, dir=self.directory
+        )
+        stage: Any = self.__raw.file
+
+        if self.zip_name:
+            zip_file = zipfile.ZipFile(stage, "w", compression=zipfile.ZIP_DEFLATED)
+            self.__stages.insert(0, zip_file)
+            stage = zip_file.open(self.file_name, "w", force_zip64=True)
+            self.__stages.insert(0, stage)
+
+        # hash is taken after encrypting, before zipping
+        stage = HashStage(stage)
+        self.file_hash = stage.file_hash
+
+        if self.encrypted:
+            stage = GpgStage(
+                stage,
+                gpg_fingerprints(em_decrypt(self.task.file_gpg_conn.key, app.config["PASS_KEY"])),
+            )
+            self.__stages.insert(0, stage)
+
+        self.binary = io.BufferedWriter(stage, buffer_size=BUFFER_SIZE)
+        self.__stages.insert(0, self.binary)
+
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the stages, first stage first, and move the file to its final name."""
+        try:
+            for stage in self.__stages:
+                stage.close()
+
+        except BaseException:
+            self.__raw.close()
+            Path(self.__raw.name).unlink(missing_ok=True)
+            raise
+
+        self.__raw.close()
+
+        if exc_type is None:
+            os.replace(self.__raw.name, self.file_path)
+        else:
+            Path(self.__raw.name).unlink(missing_ok=True)
@@ -3,12 +3,19 @@
 import psutil
 from flask import current_app as app
 
+from runner.scripts.em_cache import file_cache
+
 
 def system_monitor() -> None:
     """Group of functions to monitor host OS."""
     # Check if free disk space is below threshold set in config.py.
     my_disk = psutil.disk_usage("/")
 
+    if my_disk.free < app.config["MIN_DISK_SPACE"]:
+        # cached output files are removed first
+        file_cache.trim()
+        my_disk = psutil.disk_usage("/")
+
     if my_disk.free < app.config["MIN_DISK_SPACE"]:
         raise ValueError("System is below minimum disk space threshold.")
 
@@ -0,0 +1,140 @@
+"""Read one file for several readers at the same time.
+
+Output files that are delivered to several destinations are read from
+disk once. Each block is handed to every destination through a small
+buffer of STREAM_DELIVERY_BUFFERS blocks. When the buffer of a slow
+destination is full, reading stops until it catches up, so memory use
+stays bounded and the file is sent at the speed of the slowest
+destination.
+
+A reader that is closed early, for example because the destination
+already has the file, is skipped and does not hold up the others.
+"""
+
+import threading
+from collections import deque
+from typing import IO, Any, Deque, List, Optional
+
+from runner.scripts.em_transcode import DEFAULT_BLOCK_SIZE
+
+
+class TeeReader:
+    """File like reader of one copy of the file."""
+
+    def __init__(self, buffers: int) -> None:
+        """Set up class parameters."""
+        self.buffers = max(1, buffers)
+        self.blocks: Deque[bytes] = deque()
+        self.ready = threading.Condition()
+        self.buffer = b""
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.closed = False
+
+    def put(self, block: bytes) -> None:
+        """Add a block, waiting while the buffer is full."""
+        with self.ready:
+            while len(self.blocks) >= self.buffers and not self.closed:
+                self.ready.wait()
+
+            if not self.closed:
+                self.blocks.append(block)
+                self.ready.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        """Mark the end of the file, or a failed read."""
+        with self.ready:
+            self.done = True
+            self.error = error
+            self.ready.notify_all()
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes. An empty result is the end of the file."""
+        if size is None or size < 0:
+            return b"".join(iter(lambda: self.read(DEFAULT_BLOCK_SIZE), b""))
+
+        with self.ready:
+            while not self.buffer:
+                while not self.blocks and not self.done:
+                    self.ready.wait()
+
+                if self.error is not None:
+                    raise OSError(f"Failed to read output file.\n{self.error}")
+
+                if not self.blocks:
+                    return b""
+
+                self.buffer = self.blocks.popleft()
+                self.ready.notify_all()
+
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+            return data
+
+    def close(self) -> None:
+        """Stop reading. The rest of the file is skipped."""
+        with self.ready:
+            self.closed = True
+            self.blocks.clear()
+            self.ready.notify_all()
+
+    def __enter__(self) -> "TeeReader":
+        """Use in a with block."""
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close at the end of a with block."""
+        self.close()
+
+
+class Tee:
+    """Copy a file to several readers.
+
+    .. code-block:: python
+
+        with open(path, "rb") as source, Tee(source, 3) as tee:
+            for reader in tee.readers:
+                ...
+    """
+
+    def __init__(
+        self,
+        source: IO[bytes],
+        count: int,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        buffers: int = 8,
+    ) -> None:
+        """Set up class parameters."""
+        self.source = source
+        self.block_size = block_size
+        self.readers: List[TeeReader] = [TeeReader(buffers) for _ in range(count)]
+        self.thread = threading.Thread(target=self.__copy, daemon=True)
+
+    def __copy(self) -> None:
+        try:
+            while not all(reader.closed for reader in self.readers):
+                block = self.source.read(self.block_size)
+                if not block:
+                    break
+
+                for reader in self.readers:
+                    reader.put(block)
+
+        # pylint: disable=broad-except
+        except BaseException as e:
+            for reader in self.readers:
+                reader.finish(e)
+            return
+
+        for reader in self.readers:
+            reader.finish()
+
+    def __enter__(self) -> "Tee":
+        """Start reading the file."""
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        """Close all readers and wait for the file to be released."""
+        for reader in self.readers:
+            reader.close()
+        self.thread.join()
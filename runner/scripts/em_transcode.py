@@ -0,0 +1,92 @@
+"""Rewrite delimited source files as csv while they download.
+
+SMB, SFTP and FTP sources can have a delimiter other than a comma. The
+file is read in large blocks and decoded as utf-8 with an incremental
+decoder, so characters split between two blocks are decoded correctly.
+
+Lines are fed to a single csv reader for the whole file. Rows that span
+two blocks, or quoted values with line breaks, are read as one row.
+"""
+
+import codecs
+import csv
+import io
+import re
+import shutil
+from typing import IO, Iterator, List, Optional
+
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+# split after \n or \r\n, and after a \r that is not followed by \n.
+LINE_END = re.compile(r"(?<=\n)|(?<=\r)(?!\n)")
+
+
+def split_lines(text: str) -> List[str]:
+    """Split text after each line break.
+
+    The last item is the text after the last line break, it can be empty.
+    """
+    # the regex is slow, only use it for files with \r line breaks.
+    if text.count("\r") != text.count("\r\n"):
+        return LINE_END.split(text)
+
+    lines = text.split("\n")
+    last = lines.pop()
+
+    return [line + "\n" for line in lines] + [last]
+
+
+def read_lines(
+    source: IO[bytes], block_size: int = DEFAULT_BLOCK_SIZE, encoding: str = "utf-8"
+) -> Iterator[str]:
+    """Read a binary file as lines of text, keeping the line endings."""
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    remainder = ""
+
+    while True:
+        block = source.read(block_size)
+        text = remainder + decoder.decode(block or b"", final=not block)
+
+        if not block:
+            yield from (line for line in split_lines(text) if line)
+            return
+
+        # a \r at the end of a block may be the start of a \r\n.
+        held = ""
+        if text.endswith("\r"):
+            text, held = text[:-1], "\r"
+
+        lines = split_lines(text)
+        remainder = lines.pop() + held
+
+        yield from lines
+
+
+def transcode(
+    source: IO[bytes],
+    destination: IO[bytes],
+    delimiter: Optional[str],
+    block_size: int = DEFAULT_BLOCK_SIZE,
+) -> None:
+    """Copy a source file, rewriting it as comma separated.
+
+    Without a delimiter the file is copied unchanged.
+
+    :param source: binary file opened for reading.
+    :param destination: binary file opened for writing.
+    :param delimiter: delimiter of the source file.
+    """
+    if not delimiter:
+        shutil.copyfileobj(source, destination, block_size)
+        return
+
+    output = io.TextIOWrapper(destination, encoding="utf-8", newline="")  # type: ignore[arg-type]
+
+    try:
+        writer = csv.writer(output)
+        writer.writerows(csv.reader(read_lines(source, block_size), delimiter=delimiter))
+        output.flush()
+
+    finally:
+        # leave the destination file open for the caller.
+        output.detach()
@@ -0,0 +1,133 @@
+"""Incremental extraction watermarks.
+
+Incremental tasks only pull rows that changed since their last run. The
+largest value of a chosen column, like an id or a modified date, is
+tracked while the query rows are fetched. After the run completes, it
+is saved as the task's watermark.
+
+On the next run the watermark is passed to the query as a parameter,
+written as a sql literal.
+
+.. code-block:: sql
+
+    declare @last_modified datetime = '1900-01-01';
+
+    select * from orders where modified > @last_modified;
+
+The declared value is the starting point, used when the task has no
+watermark yet.
+
+Dates with a time are saved to the millisecond, so they can be read into a
+SQL Server ``datetime`` parameter. Rows changed in the same millisecond as
+the watermark can be fetched again by the next run.
+
+Watermarks also work for partitioned queries, where the parameter is
+declared before the final select.
+"""
+
+import datetime
+import decimal
+import threading
+from typing import Any, List, Optional, Sequence
+
+from runner.extensions import db
+from runner.model import Task, TaskWatermark
+
+
+def watermark_literal(value: Any) -> str:
+    """Write a watermark value as a sql literal."""
+    if isinstance(value, datetime.datetime):
+        # sql server cannot convert more than three fractional digits to a
+        # datetime. the value is rounded down, so no rows are skipped.
+        text = value.strftime("%Y-%m-%d %H:%M:%S.") + "%03d" % (value.microsecond // 1000)
+        text = text.rstrip("0").rstrip(".")
+
+        if value.utcoffset() is not None:
+            offset = value.strftime("%z")
+            text += offset[:3] + ":" + offset[3:5]
+
+        return "'%s'" % text
+
+    if isinstance(value, datetime.date):
+        return "'%s'" % value.isoformat()
+
+    if isinstance(value, (bytes, bytearray)):
+        # sql server rowversion
+        return "0x" + value.hex().upper()
+
+    if isinstance(value, (int, float, decimal.Decimal)) and not isinstance(value, bool):
+        return str(value)
+
+    return "'%s'" % str(value).replace("'", "''")
+
+
+def watermark_param(task: Task) -> Optional[str]:
+    """Get the saved watermark of a task, if it has one."""
+    if not task.source_watermark_column or not task.source_watermark_param:
+        return None
+
+    watermark = TaskWatermark.query.filter_by(task_id=task.id).first()
+
+    return watermark.value if watermark else None
+
+
+class Watermark:
+    """Track the largest value of the watermark column in query rows."""
+
+    def __init__(self, task: Task) -> None:
+        """Set up class parameters."""
+        self.task = task
+        self.column = str(task.source_watermark_column).strip()
+        self.index: Optional[int] = None
+        self.value: Any = None
+        self.lock = threading.Lock()
+
+    def __column_index(self, description: Optional[Sequence[Any]]) -> int:
+        names = [str(column[0]).lower() for column in description or []]
+
+        if self.column.lower() not in names:
+            raise ValueError(f"Watermark column {self.column} is not in the query output.")
+
+        return names.index(self.column.lower())
+
+    def update(self, description: Optional[Sequence[Any]], rows: List[Any]) -> None:
+        """Update the watermark from a batch of rows."""
+        if not rows:
+            return
+
+        # partitions share the watermark, the first batch finds the column.
+        with self.lock:
+            if self.index is None:
+                self.index = self.__column_index(description)
+            index = self.index
+
+        values = [row[index] for row in rows if row[index] is not None]
+
+        if not values:
+            return
+
+        largest = max(values)
+
+        with self.lock:
+            if self.value is None or largest > self.value:
+                self.value = largest
+
+    def save(self, run_id: Optional[str]) -> Optional[str]:
+        """Save the watermark. It is left unchanged if no rows were returned.
+
+        :returns: the new watermark.
+        """
+        if self.value is None:
+            return None
+
+        watermark = TaskWatermark.query.filter_by(task_id=self.task.id).first()
+
+        if watermark is None:
+            watermark = TaskWatermark(task_id=self.task.id)
+            db.session.add(watermark)
+
+        watermark.value = watermark_literal(self.value)
+        watermark.job_id = run_id
+        db.session.commit()
+
+        return watermark.value
@@ -11,8 +11,9 @@ import sys
 import tempfile
 import time
 import urllib.parse
+from functools import partial
 from pathlib import Path
-from typing import IO, List, Optional
+from typing import IO, Any, Callable, List, Optional
 
 import azure.devops.credentials as cd
 import requests
@@ -23,22 +24,31 @@ from pathvalidate import sanitize_filename
 
 from runner import db, redis_client
 from runner.model import Task, TaskFile, TaskLog
+from runner.scripts.em_cache import file_cache
 from runner.scripts.em_cmd import Cmd
 from runner.scripts.em_code import SourceCode
 from runner.scripts.em_date import DateParsing
+from runner.scripts.em_deliver import deliver
 from runner.scripts.em_file import File, file_size
 from runner.scripts.em_ftp import Ftp
 from runner.scripts.em_jdbc import Jdbc
+from runner.scripts.em_jdbc import pool as jdbc_pool
+from runner.scripts.em_ledger import destination_key, record_delivery, unchanged
 from runner.scripts.em_messages import RunnerException, RunnerLog
 from runner.scripts.em_params import ParamLoader
 from runner.scripts.em_postgres import Postgres
+from runner.scripts.em_postgres import pool as pg_pool
 from runner.scripts.em_python import PyProcesser
 from runner.scripts.em_sftp import Sftp
 from runner.scripts.em_smb import Smb
 from runner.scripts.em_smtp import Smtp
 from runner.scripts.em_sqlserver import SqlServer
+from runner.scripts.em_sqlserver import pool as sql_pool
 from runner.scripts.em_ssh import Ssh
 from runner.scripts.em_system import system_monitor
+from runner.scripts.em_tee import Tee, TeeReader
+from runner.scripts.em_transcode import DEFAULT_BLOCK_SIZE
+from runner.scripts.em_watermark import Watermark
 from runner.web.filters import datetime_format
 
 sys.path.append(str(Path(__file__).parents[2]) + "/scripts")
@@ -142,6 +152,7 @@ class Runner:
 
         # load file/ run query/ etc to get some sort of data or process something.
         self.query_output_size: Optional[int] = None
+        self.watermark: Optional[Watermark] = None
         self.source_loader = SourceCode(self.task, self.run_id, self.param_loader)
         self.source_files = []
         self.__get_source()
@@ -168,6 +179,12 @@ class Runner:
         # any cleanup process. remove file from local storage
         self.__clean_up()
 
+        # incremental tasks only move on after the run succeeded.
+        if self.watermark is not None:
+            new_watermark = self.watermark.save(self.run_id)
+            if new_watermark is not None:
+                RunnerLog(self.task, self.run_id, 8, f"Watermark updated to {new_watermark}.")
+
         RunnerLog(self.task, self.run_id, 8, "Completed task!")
 
         # remove any retry tracking
@@ -233,16 +250,23 @@ class Runner:
 
             RunnerLog(self.task, self.run_id, 8, "Starting query run, waiting for results...")
 
+            if self.task.source_watermark_column and self.task.source_watermark_param:
+                self.watermark = Watermark(self.task)
+
             if external_db.database_type.id == 1:  # postgres
                 try:
+                    connection = em_decrypt(external_db.connection_string, app.config["PASS_KEY"])
+                    timeout = external_db.timeout or app.config["DEFAULT_SQL_TIMEOUT"]
+
                     self.query_output_size, self.source_files = Postgres(
                         task=self.task,
                         run_id=self.run_id,
-                        connection=em_decrypt(
-                            external_db.connection_string, app.config["PASS_KEY"]
-                        ),
-                        timeout=external_db.timeout or app.config["DEFAULT_SQL_TIMEOUT"],
+                        connection=connection,
+                        timeout=timeout,
                         directory=self.temp_path,
+                        max_fetch_size=external_db.max_fetch_size,
+                        connection_pool=pg_pool(external_db.id, connection, timeout),
+                        watermark=self.watermark,
                     ).run(query)
 
                 except ValueError as message:
@@ -255,14 +279,18 @@ class Runner:
 
             elif external_db.database_type.id == 2:  # mssql
                 try:
+                    connection = em_decrypt(external_db.connection_string, app.config["PASS_KEY"])
+                    timeout = external_db.timeout or app.config["DEFAULT_SQL_TIMEOUT"]
+
                     self.query_output_size, self.source_files = SqlServer(
                         task=self.task,
                         run_id=self.run_id,
-                        connection=em_decrypt(
-                            external_db.connection_string, app.config["PASS_KEY"]
-                        ),
-                        timeout=external_db.timeout or app.config["DEFAULT_SQL_TIMEOUT"],
+                        connection=connection,
+                        timeout=timeout,
                         directory=self.temp_path,
+                        max_fetch_size=external_db.max_fetch_size,
+                        connection_pool=sql_pool(external_db.id, connection, timeout),
+                        watermark=self.watermark,
                     ).run(query)
 
                 except ValueError as message:
@@ -275,13 +303,16 @@ class Runner:
 
             elif external_db.database_type.id == 3:  # jdbc
                 try:
+                    connection = em_decrypt(external_db.connection_string, app.config["PASS_KEY"])
+
                     self.query_output_size, self.source_files = Jdbc(
                         task=self.task,
                         run_id=self.run_id,
-                        connection=em_decrypt(
-                            external_db.connection_string, app.config["PASS_KEY"]
-                        ),
+                        connection=connection,
                         directory=self.temp_path,
+                        max_fetch_size=external_db.max_fetch_size,
+                        connection_pool=jdbc_pool(external_db.id, connection),
+                        watermark=self.watermark,
                     ).run(query)
 
                 except ValueError as message:
@@ -689,12 +720,15 @@ class Runner:
                     with tempfile.NamedTemporaryFile(
                         mode="wb+", delete=False, dir=self.temp_path
                     ) as data_file:
-                        # write contents
-                        data_file.write(original.read_bytes())
-
-                        # set name and remove original
-                        original.unlink()
-
+                        # move contents to the temp name, copying only
+                        # if the file is on another file system.
+                        try:
+                            os.replace(original_name, data_file.name)
+                        except OSError:
+                            shutil.copyfile(original_name, data_file.name)
+                            original.unlink()
+
+                        # set name
                         os.link(data_file.name, original_name)
 
                     data_file.name = original_name  # type: ignore[misc]
@@ -752,27 +786,22 @@ class Runner:
                     8,
                     f"Storing file {file_counter} of {len(self.source_files)}...",
                 )
-            # store
-            # save historical copy
-            smb_path = Smb(
-                task=self.task,
-                run_id=self.run_id,
-                connection=None,  # "default",
-                directory=self.temp_path,
-            ).save(overwrite=1, file_name=file_name)
-
-            # log file details
-            db.session.add(
-                TaskFile(
-                    name=file_name,
-                    path=smb_path,
-                    task_id=self.task.id,
-                    job_id=self.run_id,
-                    file_hash=file_hash,
-                    size=file_size(str(os.path.getsize(file_path))),
+            # store. the historical copy and all destinations are sent at the same time.
+            deliveries: List[partial] = [
+                # save historical copy
+                (
+                    partial(self.__archive_file, file_name, file_hash)
+                    if app.config.get("BACKUP_ARCHIVE", False)
+                    else partial(
+                        self.__save_file,
+                        Smb,
+                        None,  # "default",
+                        1,
+                        file_name,
+                        file_hash,
+                    )
                 )
-            )
-            db.session.commit()
+            ]
 
             # send to sftp
             if self.task.destination_sftp == 1 and self.task.destination_sftp_conn:
@@ -783,15 +812,28 @@ class Runner:
                         8,
                         "Skipping SFTP, file is empty.",
                     )
+                elif self.task.destination_sftp_skip_unchanged == 1 and unchanged(
+                    self.task,
+                    destination_key("sftp", self.task.destination_sftp_id),
+                    file_name,
+                    file_hash,
+                ):
+                    RunnerLog(
+                        self.task,
+                        self.run_id,
+                        8,
+                        "Skipping SFTP, file has not changed since it was last sent.",
+                    )
                 else:
-                    Sftp(
-                        task=self.task,
-                        run_id=self.run_id,
-                        connection=self.task.destination_sftp_conn,
-                        directory=self.temp_path,
-                    ).save(
-                        overwrite=self.task.destination_sftp_overwrite,
-                        file_name=file_name,
+                    deliveries.append(
+                        partial(
+                            self.__save_file,
+                            Sftp,
+                            self.task.destination_sftp_conn,
+                            self.task.destination_sftp_overwrite,
+                            file_name,
+                            file_hash,
+                        )
                     )
 
             # send to ftp
@@ -803,15 +845,28 @@ class Runner:
                         8,
                         "Skipping FTP, file is empty.",
                     )
+                elif self.task.destination_ftp_skip_unchanged == 1 and unchanged(
+                    self.task,
+                    destination_key("ftp", self.task.destination_ftp_id),
+                    file_name,
+                    file_hash,
+                ):
+                    RunnerLog(
+                        self.task,
+                        self.run_id,
+                        8,
+                        "Skipping FTP, file has not changed since it was last sent.",
+                    )
                 else:
-                    Ftp(
-                        task=self.task,
-                        run_id=self.run_id,
-                        connection=self.task.destination_ftp_conn,
-                        directory=self.temp_path,
-                    ).save(
-                        overwrite=self.task.destination_ftp_overwrite,
-                        file_name=file_name,
+                    deliveries.append(
+                        partial(
+                            self.__save_file,
+                            Ftp,
+                            self.task.destination_ftp_conn,
+                            self.task.destination_ftp_overwrite,
+                            file_name,
+                            file_hash,
+                        )
                     )
 
             # save to smb
@@ -823,17 +878,146 @@ class Runner:
                         8,
                         "Skipping SMB, file is empty.",
                     )
+                elif self.task.destination_smb_skip_unchanged == 1 and unchanged(
+                    self.task,
+                    destination_key("smb", self.task.destination_smb_id),
+                    file_name,
+                    file_hash,
+                ):
+                    RunnerLog(
+                        self.task,
+                        self.run_id,
+                        8,
+                        "Skipping SMB, file has not changed since it was last sent.",
+                    )
                 else:
-                    Smb(
-                        task=self.task,
-                        run_id=self.run_id,
-                        connection=self.task.destination_smb_conn,
-                        directory=self.temp_path,
-                    ).save(
-                        overwrite=self.task.destination_smb_overwrite,
-                        file_name=file_name,
+                    deliveries.append(
+                        partial(
+                            self.__save_file,
+                            Smb,
+                            self.task.destination_smb_conn,
+                            self.task.destination_smb_overwrite,
+                            file_name,
+                            file_hash,
+                        )
                     )
 
+            # load the task and connections once, before the deliveries share them
+            for instance in [
+                self.task,
+                self.task.project,
+                *[delivery.args[1] for delivery in deliveries[1:]],
+            ]:
+                db.session.refresh(instance)
+
+            # single output files can be read once for all destinations
+            if (
+                app.config.get("STREAM_DELIVERY", False)
+                and len(self.source_files) == 1
+                and int(app.config.get("DELIVERY_WORKERS", 4)) > 1
+            ):
+                with (
+                    open(file_path, "rb") as output_file,
+                    Tee(
+                        output_file,
+                        len(deliveries),
+                        app.config.get("SOURCE_FILE_BLOCK_SIZE", DEFAULT_BLOCK_SIZE),
+                        int(app.config.get("STREAM_DELIVERY_BUFFERS", 8)),
+                    ) as tee,
+                ):
+                    # every reader must be read at the same time
+                    smb_path = deliver(
+                        [
+                            partial(delivery, source=reader)
+                            for delivery, reader in zip(deliveries, tee.readers)
+                        ],
+                        workers=len(deliveries),
+                    )[0]
+            else:
+                smb_path = deliver(deliveries)[0]
+
+            # log file details
+            task_file = TaskFile(
+                name=file_name,
+                path=smb_path,
+                task_id=self.task.id,
+                job_id=self.run_id,
+                file_hash=file_hash,
+                size=file_size(str(os.path.getsize(file_path))),
+            )
+            db.session.add(task_file)
+            db.session.commit()
+
+            # keep a local copy for resends and downloads
+            try:
+                file_cache.add(task_file.id, file_hash, file_path)
+            except OSError as e:
+                RunnerLog(
+                    self.task,
+                    self.run_id,
+                    8,
+                    f"Output file could not be cached, it will be loaded from the backup server when needed.\n{e}",
+                )
+
+    def __archive_file(
+        self, file_name: str, file_hash: str, source: Optional[TeeReader] = None
+    ) -> str:
+        """Save an output file to the backup archive, once per file hash."""
+        try:
+            return Smb(
+                task=self.task,
+                run_id=self.run_id,
+                connection=None,  # "default",
+                directory=self.temp_path,
+            ).archive(file_name=file_name, file_hash=file_hash, source=source)
+
+        finally:
+            if source is not None:
+                source.close()
+
+    def __save_file(
+        self,
+        destination: Callable[..., Any],
+        connection: Any,
+        overwrite: Optional[int],
+        file_name: str,
+        file_hash: str,
+        source: Optional[TeeReader] = None,
+    ) -> Any:
+        """Send an output file to one destination.
+
+        Files sent to task destinations are saved in the delivery ledger.
+        Files that already exist on the destination, and are not
+        overwritten, are not sent.
+
+        :param source: reader of the output file, instead of the local file.
+        :returns: the result of the destination's save.
+        """
+        # pylint: disable=too-many-arguments
+        try:
+            saved = destination(
+                task=self.task,
+                run_id=self.run_id,
+                connection=connection,
+                directory=self.temp_path,
+            ).save(overwrite=overwrite, file_name=file_name, source=source)
+
+            if connection is not None and saved:
+                record_delivery(
+                    self.task.id,
+                    self.run_id,
+                    destination_key(destination.__name__.lower(), connection.id),
+                    file_name,
+                    file_hash,
+                )
+
+            return saved
+
+        finally:
+            # destinations that already have the file do not read it
+            if source is not None:
+                source.close()
+
     def __send_email(self) -> None:
         logs = (
             TaskLog.query.filter_by(task_id=self.task.id, job_id=self.run_id)
@@ -0,0 +1,92 @@
+"""Test output file cache.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_cache.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import os
+from pathlib import Path
+
+from pytest import fixture
+
+from runner.scripts.em_cache import FileCache
+
+
+def test_cache(client_fixture: fixture, tmp_path: Path) -> None:
+    old_config = client_fixture.application.config.get("FILE_CACHE_SIZE")
+    client_fixture.application.config["FILE_CACHE_SIZE"] = 1000
+
+    cache = FileCache(tmp_path / "cache")
+    output = tmp_path / "output.csv"
+    output.write_bytes(b"a,b\n1,2\n")
+
+    # files without a hash are not cached
+    cache.add(1, None, output)
+    assert not (tmp_path / "cache").exists()
+
+    cache.add(1, "abc", output)
+
+    # a different hash is not the same file
+    assert cache.get(1, "def", tmp_path / "resend.csv") is None
+
+    resend = cache.get(1, "abc", tmp_path / "resend.csv")
+    assert resend == tmp_path / "resend.csv"
+    assert resend.read_bytes() == b"a,b\n1,2\n"
+
+    # an existing file is replaced
+    assert cache.get(1, "abc", tmp_path / "resend.csv") == resend
+
+    # using a file does not change its modified time
+    cached = tmp_path / "cache" / "1-abc"
+    os.utime(cached, (1, 1))
+    assert cache.find(1, "abc") == cached
+    assert cached.stat().st_mtime == 1
+    assert cached.stat().st_atime > 1
+
+    client_fixture.application.config["FILE_CACHE_SIZE"] = old_config
+
+
+def test_cache_trim(client_fixture: fixture, tmp_path: Path) -> None:
+    old_config = client_fixture.application.config.get("FILE_CACHE_SIZE")
+    client_fixture.application.config["FILE_CACHE_SIZE"] = 250
+
+    cache = FileCache(tmp_path / "cache")
+
+    for file_id in range(1, 4):
+        output = tmp_path / f"output_{file_id}.csv"
+        output.write_bytes(b"x" * 100)
+        cache.add(file_id, "abc", output)
+
+        # each file is used a second later
+        os.utime(tmp_path / "cache" / f"{file_id}-abc", (file_id, file_id))
+
+    # the least recently used file is removed
+    assert sorted(path.name for path in (tmp_path / "cache").iterdir()) == [
+        "2-abc",
+        "3-abc",
+    ]
+
+    # files larger than the cache are not cached
+    output = tmp_path / "output_4.csv"
+    output.write_bytes(b"x" * 300)
+    cache.add(4, "abc", output)
+    assert cache.get(4, "abc", tmp_path / "resend.csv") is None
+
+    # files are removed while disk space is low
+    old_disk_space = client_fixture.application.config.get("MIN_DISK_SPACE")
+    client_fixture.application.config["MIN_DISK_SPACE"] = 10000000000000000000
+
+    # files still linked from their run folder would not free any space
+    assert cache.trim() == 0
+
+    (tmp_path / "output_2.csv").unlink()
+    (tmp_path / "output_3.csv").unlink()
+
+    assert cache.trim() == 2
+    assert list((tmp_path / "cache").iterdir()) == []
+
+    client_fixture.application.config["MIN_DISK_SPACE"] = old_disk_space
+    client_fixture.application.config["FILE_CACHE_SIZE"] = old_config
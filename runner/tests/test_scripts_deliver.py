@@ -0,0 +1,86 @@
+"""Test output file delivery.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_deliver.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import threading
+from functools import partial
+from typing import List
+
+import pytest
+from pytest import fixture
+
+from runner.model import Task, TaskLog
+from runner.scripts.em_deliver import deliver
+from runner.scripts.em_messages import RunnerException
+
+from .conftest import create_demo_task
+
+
+def test_deliver(client_fixture: fixture) -> None:
+    # all destinations are sent to at the same time
+    barrier = threading.Barrier(3, timeout=5)
+
+    def send(name: str) -> str:
+        barrier.wait()
+        return name
+
+    assert deliver([partial(send, name) for name in ["backup", "sftp", "ftp"]]) == [
+        "backup",
+        "sftp",
+        "ftp",
+    ]
+
+
+def test_deliver_failure(client_fixture: fixture) -> None:
+    sent: List[str] = []
+
+    def send(name: str) -> str:
+        if name != "backup":
+            raise ValueError(name)
+        sent.append(name)
+        return name
+
+    # other destinations finish, then the first error is raised
+    with pytest.raises(ValueError, match="sftp"):
+        deliver([partial(send, name) for name in ["backup", "sftp", "ftp"]])
+
+    assert sent == ["backup"]
+
+
+def test_deliver_sequential(client_fixture: fixture) -> None:
+    sent: List[str] = []
+
+    def send(name: str) -> str:
+        sent.append(name)
+        if name == "sftp":
+            raise ValueError(name)
+        return name
+
+    # one at a time, stopping at the first error
+    with pytest.raises(ValueError, match="sftp"):
+        deliver([partial(send, name) for name in ["backup", "sftp", "ftp"]], workers=1)
+
+    assert sent == ["backup", "sftp"]
+
+
+def test_deliver_runner_exception(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+    task = Task.query.filter_by(id=t_id).first()
+
+    def send(name: str) -> str:
+        if name != "backup":
+            raise RunnerException(task, None, 9, f"{name} failed")
+        return name
+
+    # errors are handled once, on the run's thread
+    with pytest.raises(RunnerException, match="sftp failed") as e:
+        deliver([partial(send, name) for name in ["backup", "sftp", "ftp"]])
+
+    assert not e.value.deferred
+    assert task.status_id == 2
+    assert TaskLog.query.filter_by(task_id=t_id, status_id=9, error=1).count() == 1
@@ -0,0 +1,116 @@
+"""Test parallel source file downloads.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_download.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import random
+import threading
+import time
+from typing import Any, List
+
+import pytest
+from pytest import fixture
+
+from runner.scripts.em_download import download_files
+
+
+class FakeConnection:
+    """Connection that records when it is closed."""
+
+    def __init__(self) -> None:
+        self.closed = False
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def test_download_files(client_fixture: fixture) -> None:
+    opened: List[FakeConnection] = []
+    running: List[int] = [0, 0]
+    lock = threading.Lock()
+
+    def connect() -> FakeConnection:
+        conn = FakeConnection()
+        with lock:
+            opened.append(conn)
+        return conn
+
+    def load(conn: FakeConnection, file_name: str, index: int, length: int) -> Any:
+        assert length == 20
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+
+        time.sleep(random.random() / 100)  # noqa: S311
+
+        with lock:
+            running[0] -= 1
+        return (file_name, index, conn)
+
+    file_list = [f"file_{x}.csv" for x in range(20)]
+    files = download_files("test-1", file_list, load, connect, FakeConnection.close, 3)
+
+    # files are in the original order
+    assert [file[0] for file in files] == file_list
+    assert [file[1] for file in files] == list(range(1, 21))
+
+    # each worker has its own connection, they are all closed
+    assert len(opened) <= 3
+    assert {id(file[2]) for file in files} <= {id(conn) for conn in opened}
+    assert all(conn.closed for conn in opened)
+
+    assert running[1] <= 3
+
+
+def test_connection_limit(client_fixture: fixture) -> None:
+    # two tasks reading from the same connection share the cap
+    running: List[int] = [0, 0]
+    lock = threading.Lock()
+
+    def load(conn: Any, file_name: str, index: int, length: int) -> Any:
+        with lock:
+            running[0] += 1
+            running[1] = max(running)
+
+        time.sleep(0.01)
+
+        with lock:
+            running[0] -= 1
+        return file_name
+
+    app = client_fixture.application
+
+    def read() -> None:
+        with app.app_context():
+            download_files("test-3", ["a", "b", "c", "d"], load, lambda: None, lambda _: None, 2)
+
+    threads = [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert running[1] == 2
+
+
+def test_download_failure(client_fixture: fixture) -> None:
+    opened: List[FakeConnection] = []
+
+    def connect() -> FakeConnection:
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    def load(conn: FakeConnection, file_name: str, index: int, length: int) -> Any:
+        if index == 2:
+            raise ValueError("download failed")
+        return file_name
+
+    with pytest.raises(ValueError, match="download failed"):
+        download_files("test-2", ["one", "two", "three"], load, connect, FakeConnection.close, 2)
+
+    assert all(conn.closed for conn in opened)
@@ -0,0 +1,71 @@
+"""Test adaptive fetching.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_fetch.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+from typing import Any, List
+
+from pytest import fixture
+
+from runner.scripts.em_fetch import AdaptiveFetcher
+
+
+class ListCursor:
+    """Cursor returning rows from a list."""
+
+    def __init__(self, rows: List[Any]) -> None:
+        self.rows = rows
+        self.sizes: List[int] = []
+
+    def fetchmany(self, size: int) -> List[Any]:
+        self.sizes.append(size)
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+
+def test_fetch_all_rows() -> None:
+    rows = [(x, "a") for x in range(1000)]
+    cursor = ListCursor(list(rows))
+
+    fetched = [row for batch in AdaptiveFetcher(cursor, start=10).batches() for row in batch]
+
+    assert fetched == rows
+
+
+def test_fetch_grows_for_narrow_rows() -> None:
+    cursor = ListCursor([(x,) for x in range(10000)])
+
+    list(AdaptiveFetcher(cursor, start=10, maximum=1000).batches())
+
+    # size doubles at most once per batch, and stops at the ceiling
+    assert cursor.sizes[:3] == [10, 20, 40]
+    assert max(cursor.sizes) == 1000
+
+
+def test_fetch_shrinks_for_wide_rows() -> None:
+    fetcher = AdaptiveFetcher(ListCursor([]), start=100, target_bytes=1000)
+
+    fetcher.resize([("x" * 999,)], 0)
+    assert fetcher.size == 50
+
+    fetcher.resize([("x" * 999,)], 0)
+    assert fetcher.size == 25
+
+
+def test_fetch_slow_batches() -> None:
+    fetcher = AdaptiveFetcher(ListCursor([]), start=100, target_seconds=1)
+
+    # 100 rows in 4 seconds is 25 rows per second, size halves
+    fetcher.resize([(1,)] * 100, 4)
+    assert fetcher.size == 50
+
+
+def test_fetch_from_config(client_fixture: fixture) -> None:
+    fetcher = AdaptiveFetcher.from_config(ListCursor([]), maximum=20)
+
+    assert fetcher.maximum == 20
+    assert fetcher.size <= 20
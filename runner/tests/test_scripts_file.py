@@ -0,0 +1,140 @@
+"""Test file.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_file.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import csv
+import datetime
+import decimal
+import hashlib
+import os
+import tempfile
+import zipfile
+from pathlib import Path
+
+import pytest
+from pytest import fixture
+
+from runner.extensions import db
+from runner.model import Task
+from runner.scripts.em_file import File, passthrough
+from runner.scripts.em_params import ParamLoader
+from runner.scripts.em_pipeline import OutputPipeline
+from runner.scripts.em_stages import OutputStages
+
+from .conftest import create_demo_task
+
+ROWS = [
+    ["id", "name", "empty", "amount"],
+    [1, "x,y", None, decimal.Decimal("1.50")],
+    [2.5, 'he said "hi"', True, "'quoted'"],
+    [datetime.date(2024, 1, 1), "line\nbreak", "", '"'],
+]
+
+
+def read_output(path: str) -> bytes:
+    if path.endswith(".zip"):
+        with zipfile.ZipFile(path) as zip_file:
+            return zip_file.read(zip_file.namelist()[0])
+    return Path(path).read_bytes()
+
+
+@pytest.mark.parametrize(
+    "settings",
+    [
+        {"destination_file_type_id": 1},
+        {"destination_file_type_id": 2, "destination_file_delimiter": "|"},
+        {
+            "destination_file_type_id": 2,
+            "destination_file_delimiter": "\\t",
+            "destination_file_line_terminator": "~",
+        },
+        {"destination_file_type_id": 3},
+        {"destination_file_type_id": 1, "destination_quote_level_id": 4},
+        {"destination_file_type_id": 1, "destination_ignore_delimiter": 1},
+        {"destination_file_type_id": 1, "destination_create_zip": 1},
+        {
+            "destination_file_type_id": 1,
+            "destination_create_zip": 1,
+            "destination_ignore_delimiter": 1,
+        },
+    ],
+)
+def test_pipeline_matches_save(client_fixture: fixture, settings: dict) -> None:
+    _, t_id = create_demo_task()
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.destination_file_name = "output"
+    task.destination_zip_name = "output"
+
+    for key, value in settings.items():
+        setattr(task, key, value)
+
+    db.session.commit()
+
+    # csv temp file, formatted when saved
+    saved_dir = Path(tempfile.mkdtemp())
+    with tempfile.NamedTemporaryFile(
+        mode="w+", newline="", delete=False, dir=saved_dir
+    ) as data_file:
+        writer = csv.writer(data_file)
+        for row in ROWS:
+            writer.writerow(row)
+
+    saved = File(task, None, data_file, ParamLoader(task, None)).save()
+
+    # formatted while written
+    piped_dir = Path(tempfile.mkdtemp())
+    with OutputPipeline(task, None, piped_dir) as pipeline:
+        for row in ROWS:
+            pipeline.writerow(row)
+
+    piped = File(task, None, pipeline.data_file, ParamLoader(task, None)).save()
+
+    assert piped[0] == saved[0]
+    assert piped[2] == saved[2]
+    assert read_output(piped[1]) == read_output(saved[1])
+
+
+def test_passthrough() -> None:
+    temp_dir = Path(tempfile.mkdtemp())
+    source = temp_dir / "source"
+    source.write_bytes(os.urandom(3 * 1024 * 1024))
+
+    # linked, the hash is left for later
+    file_hash = hashlib.md5()
+    assert passthrough(str(source), str(temp_dir / "linked"), file_hash) is False
+    assert (temp_dir / "linked").stat().st_ino == source.stat().st_ino
+
+    # destination exists, copied and hashed in one pass
+    copied = temp_dir / "copied"
+    copied.write_bytes(b"old")
+
+    assert passthrough(str(source), str(copied), file_hash) is True
+    assert copied.read_bytes() == source.read_bytes()
+    assert file_hash.hexdigest() == hashlib.md5(source.read_bytes()).hexdigest()
+
+
+def test_output_stages(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+    task = Task.query.filter_by(id=t_id).first()
+
+    temp_dir = Path(tempfile.mkdtemp())
+
+    with OutputStages(task, str(temp_dir), "output.csv", "output.zip") as stages:
+        stages.binary.write(b"a,b\n")
+
+    assert os.listdir(temp_dir) == ["output.zip"]
+    assert read_output(stages.file_path) == b"a,b\n"
+    assert stages.file_hash.hexdigest() == hashlib.md5(b"a,b\n").hexdigest()
+
+    # failed output is removed
+    with pytest.raises(ValueError), OutputStages(task, str(temp_dir), "failed.csv") as stages:
+        stages.binary.write(b"a,b\n")
+        raise ValueError("failed")
+
+    assert os.listdir(temp_dir) == ["output.zip"]
@@ -0,0 +1,160 @@
+"""Test wildcard source file search.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_glob.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import fnmatch
+import time
+from typing import Dict, List, Tuple
+
+from pytest import fixture
+
+from runner.scripts.em_glob import Pattern, find_files, listing_cache
+
+FOLDERS: Dict[str, Tuple[List[str], List[str]]] = {
+    ".": (["exports", "archive"], ["readme.txt", "orders_1.csv"]),
+    "exports": (["2023-01", "2023-02", "2022-12"], ["orders_0.csv"]),
+    "exports/2023-01": (["old"], ["orders_1.csv", "orders_2.csv", "items_1.csv"]),
+    "exports/2023-02": ([], ["orders_3.csv"]),
+    "exports/2022-12": ([], ["orders_4.csv"]),
+    "exports/2023-01/old": ([], ["orders_5.csv"]),
+    "archive": ([], ["orders_6.csv"]),
+}
+
+
+class FakeServer:
+    """Server that records folder listings."""
+
+    def __init__(self) -> None:
+        self.listed: List[str] = []
+
+    def list_dir(self, directory: str) -> Tuple[List[str], List[str]]:
+        self.listed.append(directory)
+        return FOLDERS[directory]
+
+
+def test_pattern() -> None:
+    pattern = Pattern("exports/2023-*/orders_[0-3].csv")
+
+    assert pattern.match("exports/2023-01/orders_1.csv")
+    assert pattern.match("exports/2023-01/old/orders_1.csv")
+    assert not pattern.match("exports/2023-01/orders_5.csv")
+    assert not pattern.match("exports/2022-12/orders_1.csv")
+
+    assert pattern.match_folder("exports")
+    assert pattern.match_folder("exports/2023-01/old")
+    assert not pattern.match_folder("exports/2022-12")
+    assert not pattern.match_folder("archive")
+
+    # a [ without a ] is a plain character
+    assert Pattern("a[b*").match("a[bc")
+
+    # paths are matched like fnmatch
+    for name, path in [
+        ("*.csv", "exports/2023-01/orders_1.csv"),
+        ("exports/*_?.csv", "exports/2023-01/orders_1.csv"),
+        ("exports/[!a]*/items_*", "exports/2023-01/items_1.csv"),
+        ("exports/*/*/*", "exports/2023-01/orders_1.csv"),
+    ]:
+        assert Pattern(name).match(path) == fnmatch.fnmatchcase(path, name)
+
+
+def test_one_folder(client_fixture: fixture) -> None:
+    listing_cache.clear()
+    server = FakeServer()
+
+    # a * also matches files in sub folders
+    assert find_files("exports/2023-01/*.csv", server.list_dir, "test") == [
+        "exports/2023-01/items_1.csv",
+        "exports/2023-01/orders_1.csv",
+        "exports/2023-01/orders_2.csv",
+        "exports/2023-01/old/orders_5.csv",
+    ]
+
+    # folders before the wildcard are not listed
+    assert server.listed == ["exports/2023-01", "exports/2023-01/old"]
+
+    assert find_files("archive/*.csv", server.list_dir, "test") == ["archive/orders_6.csv"]
+
+    # sub folders that cannot match are not listed
+    listing_cache.clear()
+    server.listed.clear()
+    assert find_files("exports/2023-01/orders_*.csv", server.list_dir, "test") == [
+        "exports/2023-01/orders_1.csv",
+        "exports/2023-01/orders_2.csv",
+    ]
+    assert server.listed == ["exports/2023-01"]
+
+
+def test_folder_wildcard(client_fixture: fixture) -> None:
+    listing_cache.clear()
+    server = FakeServer()
+
+    assert find_files("exports/2023-*/orders_*.csv", server.list_dir, "test") == [
+        "exports/2023-01/orders_1.csv",
+        "exports/2023-01/orders_2.csv",
+        "exports/2023-01/old/orders_5.csv",
+        "exports/2023-02/orders_3.csv",
+    ]
+
+    # 2022-12 cannot match and is never listed
+    assert server.listed == [
+        "exports",
+        "exports/2023-01",
+        "exports/2023-01/old",
+        "exports/2023-02",
+    ]
+
+
+def test_any_folder(client_fixture: fixture) -> None:
+    listing_cache.clear()
+    server = FakeServer()
+
+    assert find_files("*.csv", server.list_dir, "test") == [
+        "orders_1.csv",
+        "archive/orders_6.csv",
+        "exports/orders_0.csv",
+        "exports/2022-12/orders_4.csv",
+        "exports/2023-01/items_1.csv",
+        "exports/2023-01/orders_1.csv",
+        "exports/2023-01/orders_2.csv",
+        "exports/2023-01/old/orders_5.csv",
+        "exports/2023-02/orders_3.csv",
+    ]
+
+    # folders are searched in name order
+    assert find_files("/exports/*", lambda d: FOLDERS[d.lstrip("/")], "abs") == [
+        "/exports/orders_0.csv",
+        "/exports/2022-12/orders_4.csv",
+        "/exports/2023-01/items_1.csv",
+        "/exports/2023-01/orders_1.csv",
+        "/exports/2023-01/orders_2.csv",
+        "/exports/2023-01/old/orders_5.csv",
+        "/exports/2023-02/orders_3.csv",
+    ]
+
+
+def test_listing_cache(client_fixture: fixture) -> None:
+    listing_cache.clear()
+    server = FakeServer()
+
+    client_fixture.application.config["SOURCE_LISTING_CACHE_SECONDS"] = 0.1
+
+    find_files("exports/2023-0*/*.csv", server.list_dir, "test")
+    listed = len(server.listed)
+
+    # a second task polling the same folders uses the cached listings
+    find_files("exports/2023-0*/*.csv", server.list_dir, "test")
+    assert len(server.listed) == listed
+
+    # other connections have their own listings
+    find_files("exports/2023-0*/*.csv", server.list_dir, "other")
+    assert len(server.listed) == listed * 2
+
+    time.sleep(0.2)
+    find_files("exports/2023-0*/*.csv", server.list_dir, "test")
+    assert len(server.listed) == listed * 3
@@ -0,0 +1,38 @@
+"""Test delivery ledger.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_ledger.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+from pytest import fixture
+
+from runner.model import Task, TaskDelivery
+from runner.scripts.em_ledger import destination_key, record_delivery, unchanged
+
+from .conftest import create_demo_task
+
+
+def test_ledger(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+    task = Task.query.filter_by(id=t_id).first()
+    sftp = destination_key("sftp", 1)
+
+    # nothing sent yet
+    assert unchanged(task, sftp, "data.csv", "aaa") is False
+
+    record_delivery(t_id, "run1", sftp, "data.csv", "aaa")
+    assert unchanged(task, sftp, "data.csv", "aaa") is True
+
+    # other files, hashes and destinations are sent
+    assert unchanged(task, sftp, "other.csv", "aaa") is False
+    assert unchanged(task, sftp, "data.csv", "bbb") is False
+    assert unchanged(task, destination_key("sftp", 2), "data.csv", "aaa") is False
+
+    # only the last delivery is kept
+    record_delivery(t_id, "run2", sftp, "data.csv", "bbb")
+    assert unchanged(task, sftp, "data.csv", "aaa") is False
+    assert TaskDelivery.query.filter_by(task_id=t_id).count() == 1
+    assert TaskDelivery.query.filter_by(task_id=t_id).first().job_id == "run2"
@@ -0,0 +1,127 @@
+"""Test partitioned queries.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_partition.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import datetime
+import decimal
+import sqlite3
+
+import pytest
+
+from runner.scripts.em_partition import key_range_predicates, literal, partition_query
+
+
+def test_numeric_ranges() -> None:
+    assert key_range_predicates("id", 1, 1000, 4) == [
+        "(id < 250 OR id IS NULL)",
+        "id >= 250 AND id < 500",
+        "id >= 500 AND id < 750",
+        "id >= 750",
+    ]
+
+    assert key_range_predicates("amount", decimal.Decimal("0"), decimal.Decimal("1"), 2) == [
+        "(amount < 0.5 OR amount IS NULL)",
+        "amount >= 0.5",
+    ]
+
+
+def test_date_ranges() -> None:
+    assert key_range_predicates(
+        "created", datetime.date(2024, 1, 1), datetime.date(2024, 1, 31), 2
+    ) == ["(created < '2024-01-16' OR created IS NULL)", "created >= '2024-01-16'"]
+
+    assert key_range_predicates(
+        "created", datetime.datetime(2024, 1, 1), datetime.datetime(2024, 1, 2), 2
+    ) == [
+        "(created < '2024-01-01 12:00:00' OR created IS NULL)",
+        "created >= '2024-01-01 12:00:00'",
+    ]
+
+
+def test_small_ranges() -> None:
+    # no rows, or too few values to split
+    assert key_range_predicates("id", None, None, 4) == ["1 = 1"]
+    assert key_range_predicates("id", 1, 1, 4) == ["1 = 1"]
+
+    # duplicate boundaries are dropped
+    assert len(key_range_predicates("id", 1, 4, 10)) == 3
+
+
+def test_partition_query() -> None:
+    assert (
+        partition_query("select * from sales;\n", "id < 10")
+        == "SELECT * FROM (select * from sales) AS atlas_hub_partition WHERE id < 10"
+    )
+
+    with pytest.raises(ValueError):
+        literal("text")
+
+
+def test_partition_parameterized_query() -> None:
+    # parameters and temp tables are set up before the partition filter
+    assert partition_query(
+        "DECLARE @start date = '2024-01-01';\n"
+        "SET @start = '2024-02-01';\n"
+        "SELECT * INTO #sales FROM sales WHERE created >= @start;\n"
+        "SELECT id FROM #sales ORDER BY id",
+        "id < 10",
+    ) == (
+        "DECLARE @start date = '2024-01-01';\n"
+        "SET @start = '2024-02-01';\n"
+        "SELECT * INTO #sales FROM sales WHERE created >= @start;\n"
+        "SELECT * FROM (SELECT id FROM #sales) AS atlas_hub_partition WHERE id < 10 ORDER BY id"
+    )
+
+    # common table expressions stay in front
+    assert partition_query(
+        "WITH recent AS (SELECT * FROM sales) SELECT TOP 10 id FROM recent ORDER BY id",
+        "id < 10",
+    ) == (
+        "WITH recent AS (SELECT * FROM sales), atlas_hub_partition AS "
+        "(SELECT TOP 10 id FROM recent ORDER BY id) "
+        "SELECT * FROM atlas_hub_partition WHERE id < 10 ORDER BY id"
+    )
+
+    with pytest.raises(ValueError):
+        partition_query("SELECT id INTO #sales FROM sales", "id < 10")
+
+    with pytest.raises(ValueError):
+        partition_query("DECLARE @start date = '2024-01-01' SELECT 1", "id < 10")
+
+
+def test_partition_order() -> None:
+    # the order is moved out of the subquery, without table names
+    assert partition_query(
+        "SELECT s.id, s.name AS customer FROM sales s ORDER BY s.[name] DESC, 1 NULLS LAST",
+        "id < 10",
+    ) == (
+        "SELECT * FROM (SELECT s.id, s.name AS customer FROM sales s) AS atlas_hub_partition "
+        "WHERE id < 10 ORDER BY [name] DESC, 1 NULLS LAST"
+    )
+
+    # expressions are not in the query output
+    with pytest.raises(ValueError, match="lower"):
+        partition_query("SELECT id FROM sales ORDER BY lower(name)", "id < 10")
+
+    # rows in each partition keep the order of the query
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE sales (id integer, name text)")
+    conn.executemany(
+        "INSERT INTO sales VALUES (?, ?)",
+        list(zip(range(1, 21), "kbtqdmsahfrjcpeolgni")),
+    )
+
+    query = "SELECT id, name FROM sales ORDER BY name DESC"
+    partitions = [
+        conn.execute(partition_query(query, predicate)).fetchall()
+        for predicate in key_range_predicates("id", 1, 20, 4)
+    ]
+
+    assert [len(rows) for rows in partitions] == [4, 5, 5, 6]
+    for rows in partitions:
+        assert rows == sorted(rows, key=lambda row: row[1], reverse=True)
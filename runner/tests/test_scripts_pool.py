@@ -0,0 +1,168 @@
+"""Test database connection pool.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_pool.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import time
+from typing import Any, List
+
+import pytest
+from pytest import fixture
+
+from runner.scripts.em_pool import ConnectionPool, get_pool, pool_stats
+
+
+class FakeConnection:
+    """Connection that records when it is closed."""
+
+    def __init__(self) -> None:
+        self.closed = False
+        self.valid = True
+
+    def close(self) -> None:
+        self.closed = True
+
+
+def validate(conn: Any) -> None:
+    if not conn.valid:
+        raise ValueError("invalid")
+
+
+def make_pool(opened: List[FakeConnection], max_size: int = 2, idle_timeout: int = 60) -> Any:
+    def connect() -> FakeConnection:
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    return ConnectionPool(connect, validate, lambda conn: None, max_size, idle_timeout)
+
+
+def test_reuse() -> None:
+    opened: List[FakeConnection] = []
+    pool = make_pool(opened)
+
+    with pool.connection() as first:
+        pass
+
+    with pool.connection() as second:
+        assert pool.stats()["in_use"] == 1
+
+    assert first is second
+    assert len(opened) == 1
+    assert pool.stats()["reused"] == 1
+
+
+def test_max_size() -> None:
+    opened: List[FakeConnection] = []
+    pool = make_pool(opened, max_size=1)
+
+    conns = [pool.checkout() for _ in range(3)]
+    for conn in conns:
+        pool.checkin(conn)
+
+    # only one connection is kept
+    assert pool.stats()["idle"] == 1
+    assert sum(conn.closed for conn in opened) == 2
+
+
+def test_validation_and_failure() -> None:
+    opened: List[FakeConnection] = []
+    pool = make_pool(opened)
+
+    with pool.connection() as conn:
+        pass
+
+    # broken connections are replaced
+    conn.valid = False
+    with pool.connection() as new_conn:
+        assert new_conn is not conn
+
+    assert conn.closed
+    assert pool.stats()["failed_validation"] == 1
+
+    # connections used in a failed run are not reused
+    with pytest.raises(ValueError), pool.connection() as failed_conn:
+        raise ValueError("query failed")
+
+    assert failed_conn.closed
+    assert pool.stats()["idle"] == 0
+
+
+def test_idle_timeout() -> None:
+    opened: List[FakeConnection] = []
+    pool = make_pool(opened, idle_timeout=0)
+
+    with pool.connection():
+        pass
+
+    time.sleep(0.01)
+
+    with pool.connection():
+        pass
+
+    assert len(opened) == 2
+    assert opened[0].closed
+
+
+def test_get_pool(client_fixture: fixture) -> None:
+    opened: List[FakeConnection] = []
+
+    def connect() -> FakeConnection:
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    pool = get_pool(99, ("test", "one"), connect, validate, lambda conn: None)
+    assert get_pool(99, ("test", "one"), connect, validate, lambda conn: None) is pool
+
+    with pool.connection():
+        pass
+
+    assert pool_stats(99)["idle"] == 1  # type: ignore[index]
+
+    busy = pool.checkout()
+    other = pool.checkout()
+
+    # changed settings start a new pool
+    new_pool = get_pool(99, ("test", "two"), connect, validate, lambda conn: None)
+    assert new_pool is not pool
+
+    # connections of the old pool are closed when they are returned
+    pool.checkin(busy)
+    assert busy.closed
+    assert pool.stats()["idle"] == 0
+    assert not other.closed
+
+    assert pool_stats(98) is None
+
+
+def test_get_pool_size(client_fixture: fixture) -> None:
+    opened: List[FakeConnection] = []
+
+    def connect() -> FakeConnection:
+        conn = FakeConnection()
+        opened.append(conn)
+        return conn
+
+    # pools can be keyed by something other than a database id
+    key = ("smb", "server", "10.0.0.1", "user")
+    pool = get_pool(key, key, connect, validate, lambda conn: None, max_size=1, idle_timeout=5)
+
+    conns = [pool.checkout() for _ in range(2)]
+    for conn in conns:
+        pool.checkin(conn)
+
+    assert pool_stats(key) == {
+        "idle": 1,
+        "in_use": 0,
+        "max_size": 1,
+        "idle_timeout": 5,
+        "created": 2,
+        "reused": 0,
+        "failed_validation": 0,
+        "closed": 1,
+    }
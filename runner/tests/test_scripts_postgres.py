@@ -12,13 +12,17 @@ run with::
 """
 
 from pathlib import Path
+from typing import Tuple
 
 import pytest
 from pytest import fixture
 
 from runner.extensions import db
 from runner.model import Connection, ConnectionDatabase, Task
-from runner.scripts.em_postgres import Postgres
+from runner.scripts.em_file import File, FormattedFile
+from runner.scripts.em_params import ParamLoader
+from runner.scripts.em_pool import pool_stats
+from runner.scripts.em_postgres import Postgres, pool, single_statement
 
 from .conftest import create_demo_task
 
@@ -113,3 +117,238 @@ def test_valid_connection(client_fixture: fixture) -> None:
     )
     data_file = sql_instance.run("SELECT * FROM pg_database where 1=2;")
     assert len(data_file) == 2
+
+    # several statements return the rows of the last one
+    sql_instance = Postgres(
+        task, None, str(task.source_database_conn.connection_string), 90, temp_dir
+    )
+    row_count, data_files = sql_instance.run("SELECT 1 AS a; SELECT 2 AS b UNION SELECT 3;")
+    assert row_count == 2
+    assert Path(data_files[0].name).read_text().splitlines()[0] == "b"
+
+
+def test_single_statement() -> None:
+    assert single_statement("SELECT * FROM pg_database ;")
+    assert single_statement("-- sales\nSELECT ';' FROM sales; -- done")
+    assert not single_statement("SELECT 1; SELECT 2;")
+
+
+def test_pooled_connection(client_fixture: fixture) -> None:
+    p_id, t_id = create_demo_task()
+
+    conn = Connection(name="demo")
+    db.session.add(conn)
+    db.session.commit()
+
+    database = ConnectionDatabase(
+        name="demo sql",
+        type_id=1,
+        connection_string=client_fixture.application.config["PG_SERVER_CONN"],
+        connection_id=conn.id,
+    )
+
+    db.session.add(database)
+    db.session.commit()
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.source_type_id = 1
+    task.source_database_conn = database
+
+    db.session.commit()
+
+    temp_dir = Path(Path(__file__).parent.parent / "temp" / "tests" / "postgres")
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    connection_string = str(task.source_database_conn.connection_string)
+
+    # temp tables do not carry over to the next run
+    for _ in range(2):
+        row_count, _ = Postgres(
+            task,
+            None,
+            connection_string,
+            90,
+            temp_dir,
+            connection_pool=pool(database.id, connection_string, 90),
+        ).run("CREATE TEMP TABLE pooled AS SELECT 1 AS id; SELECT * FROM pooled;")
+
+        assert row_count == 1
+
+    stats = pool_stats(database.id)
+    assert stats["created"] == 1  # type: ignore[index]
+    assert stats["reused"] == 1  # type: ignore[index]
+    assert stats["idle"] == 1  # type: ignore[index]
+
+    # failed runs do not return their connection
+    with pytest.raises(BaseException):
+        Postgres(
+            task,
+            None,
+            connection_string,
+            90,
+            temp_dir,
+            connection_pool=pool(database.id, connection_string, 90),
+        ).run("SELECT * FROM missing_table;")
+
+    assert pool_stats(database.id)["idle"] == 0  # type: ignore[index]
+
+
+def test_partitioned_query(client_fixture: fixture) -> None:
+    p_id, t_id = create_demo_task()
+
+    conn = Connection(name="demo")
+    db.session.add(conn)
+    db.session.commit()
+
+    database = ConnectionDatabase(
+        name="demo sql",
+        type_id=1,
+        connection_string=client_fixture.application.config["PG_SERVER_CONN"],
+        connection_id=conn.id,
+    )
+
+    db.session.add(database)
+    db.session.commit()
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.source_type_id = 1
+    task.source_database_conn = database
+    task.source_query_include_header = 1
+    task.source_require_sql_output = 1
+    task.source_partition_count = 4
+    task.source_partition_column = "id"
+
+    db.session.commit()
+
+    temp_dir = Path(Path(__file__).parent.parent / "temp" / "tests" / "postgres")
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    query = "SELECT x AS id, 'row ' || x AS name FROM generate_series(1, 1000) AS x;"
+
+    row_count, data_files = Postgres(
+        task, None, str(task.source_database_conn.connection_string), 90, temp_dir
+    ).run(query)
+
+    assert row_count == 1000
+
+    with open(data_files[0].name) as data_file:
+        lines = data_file.read().splitlines()
+
+    # one header, rows in partition order
+    assert lines[0] == "id,name"
+    assert [line.split(",")[0] for line in lines[1:]] == [str(x) for x in range(1, 1001)]
+
+    # partitions from filters, with no output
+    task.source_partition_predicates = "id < 0\nid > 5000"
+    db.session.commit()
+
+    with pytest.raises(ValueError) as e:
+        Postgres(task, None, str(task.source_database_conn.connection_string), 90, temp_dir).run(
+            query
+        )
+    assert "SQL output is required but no records returned." in str(e.value)
+
+
+def test_parquet_output(client_fixture: fixture) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    p_id, t_id = create_demo_task()
+
+    conn = Connection(name="demo")
+    db.session.add(conn)
+    db.session.commit()
+
+    database = ConnectionDatabase(
+        name="demo sql",
+        type_id=1,
+        connection_string=client_fixture.application.config["PG_SERVER_CONN"],
+        connection_id=conn.id,
+    )
+
+    db.session.add(database)
+    db.session.commit()
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.source_type_id = 1
+    task.source_database_conn = database
+    task.destination_file_type_id = 5
+
+    db.session.commit()
+
+    temp_dir = Path(Path(__file__).parent.parent / "temp" / "tests" / "postgres")
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    sql_instance = Postgres(
+        task, None, str(task.source_database_conn.connection_string), 90, temp_dir
+    )
+
+    row_count, data_files = sql_instance.run(
+        "SELECT x AS id, x::numeric(10, 2) AS amount, 'row ' || x AS name "
+        "FROM generate_series(1, 100) AS x;"
+    )
+
+    assert row_count == 100
+
+    table = pq.read_table(data_files[0].name)
+    assert table.num_rows == 100
+    assert table.schema.names == ["id", "amount", "name"]
+    assert str(table.schema.field("id").type) == "int32"
+    assert str(table.schema.field("amount").type) == "decimal128(10, 2)"
+
+
+def test_copy_matches_cursor(client_fixture: fixture) -> None:
+    p_id, t_id = create_demo_task()
+
+    conn = Connection(name="demo")
+    db.session.add(conn)
+    db.session.commit()
+
+    database = ConnectionDatabase(
+        name="demo sql",
+        type_id=1,
+        connection_string=client_fixture.application.config["PG_SERVER_CONN"],
+        connection_id=conn.id,
+    )
+
+    db.session.add(database)
+    db.session.commit()
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.source_type_id = 1
+    task.source_database_conn = database
+    task.source_query_include_header = 1
+    task.destination_file_type_id = 2
+    task.destination_file_delimiter = "|"
+    task.destination_file_line_terminator = "~"
+    task.destination_file_name = "output"
+
+    db.session.commit()
+
+    temp_dir = Path(Path(__file__).parent.parent / "temp" / "tests" / "postgres")
+    temp_dir.mkdir(parents=True, exist_ok=True)
+
+    connection_string = str(task.source_database_conn.connection_string)
+
+    def output(query: str, copy: int) -> Tuple[bool, bytes]:
+        task.source_postgres_copy = copy
+        db.session.commit()
+
+        _, data_files = Postgres(task, None, connection_string, 90, temp_dir).run(query)
+        _, file_path, _ = File(task, None, data_files[0], ParamLoader(task, None)).save()
+
+        return not isinstance(data_files[0], FormattedFile), Path(file_path).read_bytes()
+
+    # run with COPY, the output is formatted the same way
+    query = (
+        "SELECT x AS id, 'a|b \"' || x AS name, NULL::text AS empty, "
+        "'2024-01-01'::date + x AS created FROM generate_series(1, 10) AS x;"
+    )
+    copied, copy_output = output(query, 1)
+    assert copied
+    assert copy_output == output(query, 0)[1]
+
+    # booleans, timestamps and numerics are fetched with a cursor
+    query = "SELECT true AS flag, now() AS created, 1.50::numeric AS amount;"
+    copied, copy_output = output(query, 1)
+    assert not copied
+    assert copy_output == output(query, 0)[1]
@@ -0,0 +1,50 @@
+"""Test query progress reporting.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_progress.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import pytest
+from pytest import fixture
+
+from runner.extensions import redis_client
+from runner.model import Task
+from runner.scripts.em_progress import ProgressReporter, progress_key
+
+from .conftest import create_demo_task
+
+
+def test_progress(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+    task = Task.query.filter_by(id=t_id).first()
+
+    with ProgressReporter(task, "run1", "Getting first rows.", interval=0) as progress:
+        assert redis_client.hget(progress_key(t_id), "status") == b"running"
+
+        progress.update(10)
+        assert progress.log.message == "Getting query rows, 10 received."
+
+    assert redis_client.hget(progress_key(t_id), "status") == b"done"
+    assert redis_client.hget(progress_key(t_id), "rows") == b"10"
+    assert progress.log.message == "Query returned 10 rows."
+
+    redis_client.delete(progress_key(t_id))
+
+
+def test_progress_failed(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+    task = Task.query.filter_by(id=t_id).first()
+
+    # a failed query is not left running
+    with pytest.raises(ValueError):
+        with ProgressReporter(task, "run1", "Getting first rows.") as progress:
+            progress.update(5)
+            raise ValueError("query failed")
+
+    assert redis_client.hget(progress_key(t_id), "status") == b"failed"
+    assert progress.log.message == "Query failed after 5 rows."
+
+    redis_client.delete(progress_key(t_id))
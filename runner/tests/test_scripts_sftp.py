@@ -14,6 +14,7 @@ run with::
 import sys
 import tempfile
 from pathlib import Path
+from typing import Any, Generator, List, Tuple
 
 import pytest
 from pytest import fixture
@@ -21,7 +22,7 @@ from pytest import fixture
 from runner.extensions import db
 from runner.model import Connection, ConnectionSftp, Task
 from runner.scripts.em_messages import RunnerException
-from runner.scripts.em_sftp import Sftp
+from runner.scripts.em_sftp import Sftp, WindowedFile, transfer_window
 
 from .conftest import create_demo_task
 
@@ -70,6 +71,45 @@ def test_connection_failure(client_fixture: fixture) -> None:
         assert "SFTP connection failed." in e
 
 
+def test_transfer_window(client_fixture: fixture) -> None:
+    # paramiko default window
+    assert transfer_window(ConnectionSftp()) == 2 * 1024 * 1024
+
+    assert transfer_window(ConnectionSftp(window_size=16)) == 16 * 1024 * 1024
+
+
+class FakeSftpFile:
+    """Remote file that records the ranges read."""
+
+    def __init__(self, data: bytes) -> None:
+        self.data = data
+        self.ranges: List[Tuple[int, int]] = []
+
+    def readv(self, chunks: List[Tuple[int, int]], **kwargs: Any) -> Generator:
+        for offset, length in chunks:
+            self.ranges.append((offset, length))
+            yield self.data[offset : offset + length]
+
+
+def test_windowed_file() -> None:
+    data = bytes(range(256)) * 4096
+    window = 256 * 1024
+
+    # the file is requested a window at a time
+    sftp_file = FakeSftpFile(data)
+    windowed = WindowedFile(sftp_file, len(data), window)  # type: ignore[arg-type]
+
+    blocks = []
+    while block := windowed.read(100000):
+        blocks.append(block)
+
+    assert b"".join(blocks) == data
+    assert sftp_file.ranges == [(offset, window) for offset in range(0, len(data), window)]
+
+    sftp_file = FakeSftpFile(data)
+    assert WindowedFile(sftp_file, len(data), window).read() == data  # type: ignore[arg-type]
+
+
 # def test_valid_connection(client_fixture: fixture) -> None:
 #     p_id, t_id = create_demo_task()
 
@@ -0,0 +1,115 @@
+"""Test smb connections and backup archive.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_smb.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import tempfile
+import time
+from pathlib import Path, PurePosixPath
+from types import SimpleNamespace
+from typing import Dict, List
+
+from pytest import fixture
+from smb.smb_structs import OperationFailure
+
+from runner.extensions import redis_client
+from runner.model import Task
+from runner.scripts.em_smb import (
+    ARCHIVE_HOLDS,
+    Smb,
+    archive_clean,
+    archive_hold,
+    archive_lock,
+    archive_path,
+)
+
+from .conftest import create_demo_task
+
+
+class FakeConnection:
+    """Share with a few archived files."""
+
+    def __init__(self, files: Dict[str, float]) -> None:
+        self.files = files
+        self.deleted: List[str] = []
+
+    def listPath(self, share_name: str, path: str) -> List[SimpleNamespace]:  # noqa: N802
+        entries = {}
+        for name, modified in self.files.items():
+            parent = PurePosixPath(name).parent
+            if parent == PurePosixPath(path):
+                entries[PurePosixPath(name).name] = SimpleNamespace(
+                    filename=PurePosixPath(name).name, isDirectory=False, last_write_time=modified
+                )
+            elif parent.parent == PurePosixPath(path):
+                entries[parent.name] = SimpleNamespace(
+                    filename=parent.name, isDirectory=True, last_write_time=modified
+                )
+
+        if not entries:
+            raise OperationFailure("not found", [])
+
+        return [SimpleNamespace(filename=".", isDirectory=True), *entries.values()]
+
+    def deleteFiles(self, share_name: str, path: str) -> None:  # noqa: N802
+        self.deleted.append(path)
+        del self.files[path]
+
+
+def test_archive_clean(client_fixture: fixture) -> None:
+    old = time.time() - 60 * 60 * 48
+    used = archive_path("ab01")
+    unused = archive_path("ab02")
+    new = archive_path("cd03")
+
+    conn = FakeConnection({used: old, unused: old, new: time.time()})
+
+    # only old files that are not used are removed
+    assert archive_clean(conn, "share", {used}, 60 * 60 * 24) == 1
+    assert conn.deleted == [unused]
+
+    # nothing archived yet
+    assert archive_clean(FakeConnection({}), "share", set(), 0) == 0
+
+
+def test_archive_clean_held(client_fixture: fixture) -> None:
+    old = time.time() - 60 * 60 * 48
+    held = archive_path("ab01")
+    locked = archive_path("ab02")
+
+    conn = FakeConnection({held: old, locked: old})
+
+    # a run uses the file, or is about to
+    archive_hold(held)
+    lock = archive_lock(locked)
+    lock.acquire()
+
+    try:
+        assert archive_clean(conn, "share", set(), 60 * 60 * 24) == 0
+    finally:
+        lock.release()
+
+    assert conn.deleted == []
+
+    # holds of finished runs are dropped
+    redis_client.zadd(ARCHIVE_HOLDS, {held: old})
+    assert archive_clean(conn, "share", set(), 60 * 60 * 24) == 2
+    assert redis_client.zscore(ARCHIVE_HOLDS, held) is None
+
+    redis_client.delete(ARCHIVE_HOLDS)
+
+
+def test_lazy_connection(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+    task = Task.query.filter_by(id=t_id).first()
+
+    # connections are only taken from the pool by each operation
+    smb = Smb(task, None, None, Path(tempfile.mkdtemp()))
+    stats = smb.pool.stats()
+
+    assert stats["in_use"] == 0
+    assert stats["created"] == 0
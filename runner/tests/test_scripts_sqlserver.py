@@ -12,13 +12,14 @@ run with::
 """
 
 from pathlib import Path
+from typing import Any, List
 
 import pytest
 from pytest import fixture
 
 from runner.extensions import db
 from runner.model import Connection, ConnectionDatabase, Task
-from runner.scripts.em_sqlserver import SqlServer
+from runner.scripts.em_sqlserver import Session, SqlServer, session_defaults
 
 from .conftest import create_demo_task
 
@@ -53,6 +54,75 @@ def test_connection_failure(client_fixture: fixture) -> None:
         assert "Neither DSN nor SERVER keyword supplied" in e
 
 
+class FakeCursor:
+    """Cursor that records queries, and answers the temp table count."""
+
+    def __init__(self, queries: List[str], temp_tables: int) -> None:
+        self.queries = queries
+        self.temp_tables = temp_tables
+
+    def execute(self, query: str) -> "FakeCursor":
+        self.queries.append(query)
+        return self
+
+    def fetchone(self) -> Any:
+        return [self.temp_tables]
+
+
+class FakeConnection:
+    def __init__(self, temp_tables: int = 0) -> None:
+        self.queries: List[str] = []
+        self.temp_tables = temp_tables
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self.queries, self.temp_tables)
+
+
+def test_session_reset() -> None:
+    defaults = session_defaults(
+        ["sales]db", "us_english", "mdy", 7, 2, -1, 0, 5496, 1, 1, 1, 1, 1, 1, 1]
+    )
+
+    assert defaults.split(";\n") == [
+        "SET LANGUAGE N'us_english'",
+        "SET DATEFORMAT mdy",
+        "SET DATEFIRST 7",
+        "SET TRANSACTION ISOLATION LEVEL READ COMMITTED",
+        "SET LOCK_TIMEOUT -1",
+        "SET DEADLOCK_PRIORITY 0",
+        "SET QUOTED_IDENTIFIER ON",
+        "SET ARITHABORT ON",
+        "SET ANSI_NULL_DFLT_ON ON",
+        "SET ANSI_WARNINGS ON",
+        "SET ANSI_PADDING ON",
+        "SET ANSI_NULLS ON",
+        "SET CONCAT_NULL_YIELDS_NULL ON",
+        "SET IMPLICIT_TRANSACTIONS OFF",
+        "SET CURSOR_CLOSE_ON_COMMIT OFF",
+        "SET NOCOUNT OFF",
+        "SET NUMERIC_ROUNDABORT OFF",
+        "SET XACT_ABORT OFF",
+        "USE [sales]]db]",
+    ]
+
+    session = Session("", 1)
+
+    # settings were not read, the connection is not reused
+    with pytest.raises(ValueError):
+        session.reset(FakeConnection())
+
+    session.defaults = defaults
+
+    conn = FakeConnection()
+    session.reset(conn)
+    assert conn.queries[0] == "IF @@TRANCOUNT > 0 ROLLBACK TRANSACTION"
+    assert conn.queries[-1] == defaults
+
+    # sessions with temp tables are closed
+    with pytest.raises(ValueError, match="temp tables"):
+        session.reset(FakeConnection(temp_tables=1))
+
+
 # def test_valid_connection(client_fixture: fixture) -> None:
 #     p_id, t_id = create_demo_task()
 
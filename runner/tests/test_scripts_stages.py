@@ -0,0 +1,65 @@
+"""Test output file stages.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_stages.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import shutil
+import subprocess
+import threading
+from types import SimpleNamespace
+from typing import Any, List
+
+import pytest
+from pytest import MonkeyPatch
+
+from runner.scripts import em_stages
+from runner.scripts.em_stages import GpgStage
+
+
+class FailingStage:
+    """Next stage that fails on its first write, like a full disk."""
+
+    def write(self, data: Any) -> int:
+        raise OSError("No space left on device")
+
+
+@pytest.mark.skipif(shutil.which("cat") is None, reason="cat is not installed")
+def test_gpg_stage_next_stage_error(monkeypatch: MonkeyPatch) -> None:
+    popen = subprocess.Popen
+
+    # cat stands in for gpg, passing the data straight through.
+    monkeypatch.setattr(
+        em_stages, "gpg_keyring", lambda: SimpleNamespace(gpgbinary="gpg", gnupghome="")
+    )
+    monkeypatch.setattr(
+        em_stages.subprocess, "Popen", lambda _, **kwargs: popen(["cat"], **kwargs)
+    )
+
+    errors: List[BaseException] = []
+
+    def encrypt() -> None:
+        stage = GpgStage(FailingStage(), [])  # type: ignore[arg-type]
+        try:
+            # more than the pipe buffers hold
+            for _ in range(64):
+                stage.write(b"x" * 1024 * 1024)
+        except OSError as e:
+            errors.append(e)
+
+        try:
+            stage.close()
+        except OSError as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=encrypt, daemon=True)
+    thread.start()
+    thread.join(timeout=30)
+
+    # the error of the next stage is raised, and nothing hangs
+    assert not thread.is_alive()
+    assert errors
+    assert all("No space left on device" in str(error) for error in errors)
@@ -0,0 +1,67 @@
+"""Test reading one file for several readers.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_tee.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import io
+import os
+import shutil
+import threading
+import time
+from typing import List
+
+import pytest
+
+from runner.scripts.em_tee import Tee, TeeReader
+
+DATA = os.urandom(100_000)
+
+
+def test_tee() -> None:
+    outputs: List[io.BytesIO] = [io.BytesIO() for _ in range(3)]
+
+    def copy(reader: TeeReader, output: io.BytesIO, size: int) -> None:
+        with reader:
+            shutil.copyfileobj(reader, output, size)
+
+    with Tee(io.BytesIO(DATA), 3, block_size=1000, buffers=2) as tee:
+        threads = [
+            threading.Thread(target=copy, args=(reader, output, size))
+            for reader, output, size in zip(tee.readers, outputs, [7, 1000, 4096])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert [output.getvalue() for output in outputs] == [DATA] * 3
+
+
+def test_backpressure() -> None:
+    source = io.BytesIO(DATA)
+
+    with Tee(source, 2, block_size=1000, buffers=2) as tee:
+        fast, slow = tee.readers
+
+        # nothing is read from the slow reader, so the file is only read
+        # until its buffer is full
+        assert fast.read(1000) == DATA[:1000]
+        time.sleep(0.1)
+        assert source.tell() == 3000
+
+        # a closed reader no longer holds up the others
+        slow.close()
+        assert fast.read() == DATA[1000:]
+
+
+def test_read_error() -> None:
+    class BrokenFile(io.BytesIO):
+        def read(self, *args: int) -> bytes:  # type: ignore[override]
+            raise ValueError("disk error")
+
+    with Tee(BrokenFile(), 1) as tee, pytest.raises(OSError, match="disk error"):
+        tee.readers[0].read()
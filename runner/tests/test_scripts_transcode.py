@@ -0,0 +1,56 @@
+"""Test source file delimiter transcoder.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_transcode.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import io
+import tempfile
+
+import pytest
+
+from runner.scripts.em_transcode import read_lines, transcode
+
+SOURCE = 'a|"b\r\nc"|café 😀\r\n1|2|3\nx|y\rz|"q|r"\r\n'.encode("utf-8")
+OUTPUT = 'a,"b\r\nc",café 😀\r\n1,2,3\r\nx,y\r\nz,q|r\r\n'.encode("utf-8")
+
+
+@pytest.mark.parametrize("block_size", range(1, len(SOURCE) + 1))
+def test_block_boundaries(block_size: int) -> None:
+    # rows and multibyte characters split between blocks are kept whole
+    assert list(read_lines(io.BytesIO(SOURCE), block_size)) == [
+        'a|"b\r\n',
+        'c"|café 😀\r\n',
+        "1|2|3\n",
+        "x|y\r",
+        'z|"q|r"\r\n',
+    ]
+
+    output = io.BytesIO()
+    transcode(io.BytesIO(SOURCE), output, "|", block_size)
+    assert output.getvalue() == OUTPUT
+
+
+def test_no_delimiter() -> None:
+    output = io.BytesIO()
+    transcode(io.BytesIO(SOURCE), output, None, 4)
+    assert output.getvalue() == SOURCE
+
+
+def test_invalid_utf8() -> None:
+    output = io.BytesIO()
+    transcode(io.BytesIO(b"a|\xff\nb|c"), output, "|")
+    assert output.getvalue() == "a,�\r\nb,c\r\n".encode("utf-8")
+
+
+def test_temp_file() -> None:
+    # the destination file is left open
+    with tempfile.NamedTemporaryFile(mode="wb+") as data_file:
+        transcode(io.BytesIO(b"a;b"), data_file, ";")
+        data_file.write(b"c")
+        data_file.seek(0)
+
+        assert data_file.read() == b"a,b\r\nc"
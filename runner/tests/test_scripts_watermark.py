@@ -0,0 +1,85 @@
+"""Test incremental extract watermarks.
+
+run with::
+
+   poetry run pytest runner/tests/test_scripts_watermark.py \
+       --cov --cov-append --cov-branch --cov-report=term-missing --disable-warnings
+
+"""
+
+import datetime
+import decimal
+
+import pytest
+from pytest import fixture
+
+from runner.extensions import db
+from runner.model import Task, TaskWatermark
+from runner.scripts.em_params import ParamLoader
+from runner.scripts.em_watermark import Watermark, watermark_literal
+
+from .conftest import create_demo_task
+
+
+def test_watermark_literal() -> None:
+    assert watermark_literal(10) == "10"
+    assert watermark_literal(decimal.Decimal("1.50")) == "1.50"
+    assert watermark_literal(datetime.date(2024, 1, 2)) == "'2024-01-02'"
+    assert watermark_literal(datetime.datetime(2024, 1, 2, 3, 4, 5)) == "'2024-01-02 03:04:05'"
+    assert (
+        watermark_literal(datetime.datetime(2024, 1, 2, 3, 4, 5, 120000))
+        == "'2024-01-02 03:04:05.12'"
+    )
+    # sql server datetimes only have milliseconds
+    assert (
+        watermark_literal(datetime.datetime(2024, 1, 2, 3, 4, 5, 123999))
+        == "'2024-01-02 03:04:05.123'"
+    )
+    assert (
+        watermark_literal(datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc))
+        == "'2024-01-02 00:00:00+00:00'"
+    )
+    assert watermark_literal(b"\x00\x01") == "0x0001"
+    assert watermark_literal("it's") == "'it''s'"
+
+
+def test_watermark(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task()
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.source_watermark_column = "ID"
+    task.source_watermark_param = "@last_id"
+    db.session.commit()
+
+    description = [("name", None), ("id", None)]
+
+    # no watermark yet, the declared value is used
+    assert ParamLoader(task, None).watermark_params == {}
+
+    watermark = Watermark(task)
+    watermark.update(description, [("a", 3), ("b", None), ("c", 7)])
+    watermark.update(description, [("d", 5)])
+
+    assert watermark.save("run1") == "7"
+    assert TaskWatermark.query.filter_by(task_id=t_id).first().job_id == "run1"
+
+    params = ParamLoader(task, None)
+    assert params.watermark_params == {"@last_id": "7"}
+    assert (
+        params.insert_query_params(
+            "declare @last_id int = 0;\nselect * from t where id > @last_id"
+        )
+        == "declare @last_id int = 7;\nselect * from t where id > @last_id"
+    )
+
+    # file names and script params do not get the watermark
+    assert "@last_id" not in params.read()
+    assert params.insert_file_params("sales_@last_id") == "sales_@last_id"
+
+    # runs without rows keep the last watermark
+    assert Watermark(task).save("run2") is None
+    assert ParamLoader(task, None).watermark_params == {"@last_id": "7"}
+
+    # column must be in the query
+    with pytest.raises(ValueError):
+        Watermark(task).update([("name", None)], [("a",)])
@@ -12,10 +12,13 @@ run with::
 
 """
 
+from pathlib import Path
+
 from pytest import fixture
 
 from runner.extensions import db
-from runner.model import Project, Task
+from runner.model import Project, Task, TaskFile
+from runner.scripts.em_cache import file_cache
 
 # def test_source_code(client_fixture: fixture) -> None:
 #     project = Project(name="demo")
@@ -40,3 +43,46 @@ def test_alive(client_fixture: fixture) -> None:
 def test_run_missing_task(client_fixture: fixture) -> None:
     page = client_fixture.get("/api/999999")
     assert page.json == {"error": "Task 999999 not found."}
+
+
+def test_stream_missing_file(client_fixture: fixture) -> None:
+    page = client_fixture.get("/api/file/999999/stream")
+    assert page.status_code == 404
+
+
+def test_stream_cached_file(client_fixture: fixture, tmp_path: Path) -> None:
+    project = Project(name="demo")
+    db.session.add(project)
+    db.session.commit()
+
+    task = Task(name="stream", project_id=project.id)
+    db.session.add(task)
+    db.session.commit()
+
+    task_file = TaskFile(name="data.csv", task_id=task.id, job_id="1", file_hash="abc")
+    db.session.add(task_file)
+    db.session.commit()
+
+    output = tmp_path / "data.csv"
+    output.write_bytes(b"a,b\n1,2\n")
+    file_cache.add(task_file.id, "abc", output)
+
+    page = client_fixture.get(f"/api/file/{task_file.id}/stream")
+    assert page.status_code == 200
+    assert page.data == b"a,b\n1,2\n"
+    assert page.headers["Accept-Ranges"] == "bytes"
+    assert "data.csv" in page.headers["Content-Disposition"]
+
+    # downloads can be resumed
+    page = client_fixture.get(f"/api/file/{task_file.id}/stream", headers={"Range": "bytes=4-"})
+    assert page.status_code == 206
+    assert page.data == b"1,2\n"
+    assert page.headers["Content-Range"] == "bytes 4-7/8"
+
+    # a download is resumed while the file has not changed
+    page = client_fixture.get(
+        f"/api/file/{task_file.id}/stream",
+        headers={"Range": "bytes=4-", "If-Range": page.headers["ETag"]},
+    )
+    assert page.status_code == 206
+    assert page.data == b"1,2\n"
@@ -1,18 +1,22 @@
 """Runner API routes."""
 
 import datetime
+import mimetypes
 import re
 import sys
+import tempfile
 from pathlib import Path
+from typing import Generator, Iterator
 
 from flask import Blueprint
 from flask import current_app as app
-from flask import jsonify
+from flask import jsonify, request, send_file, stream_with_context
 from jinja2 import Environment, PackageLoader, select_autoescape
 from pathvalidate import sanitize_filename
+from werkzeug.datastructures import ContentRange
 from werkzeug.wrappers import Response
 
-from runner import executor
+from runner import db, executor
 from runner.model import (
     ConnectionDatabase,
     ConnectionFtp,
@@ -22,19 +26,23 @@ from runner.model import (
     Task,
     TaskFile,
 )
+from runner.scripts.em_cache import file_cache
 from runner.scripts.em_code import SourceCode
 from runner.scripts.em_date import DateParsing
 from runner.scripts.em_ftp import Ftp
 from runner.scripts.em_ftp import connect as ftp_connect
-from runner.scripts.em_jdbc import connect as jdbc_connect
+from runner.scripts.em_jdbc import pool as jdbc_pool
 from runner.scripts.em_params import ParamLoader
-from runner.scripts.em_postgres import connect as pg_connect
+from runner.scripts.em_pool import pool_stats
+from runner.scripts.em_postgres import pool as pg_pool
 from runner.scripts.em_sftp import Sftp
 from runner.scripts.em_sftp import connect as sftp_connect
 from runner.scripts.em_smb import Smb
-from runner.scripts.em_smb import connect as smb_connect
+from runner.scripts.em_smb import archive_clean as smb_archive_clean
+from runner.scripts.em_smb import archive_folder
+from runner.scripts.em_smb import pool as smb_pool
 from runner.scripts.em_smtp import Smtp
-from runner.scripts.em_sqlserver import connect as sql_connect
+from runner.scripts.em_sqlserver import pool as sql_pool
 from runner.scripts.em_ssh import connect as ssh_connect
 from runner.scripts.task_runner import Runner
 
@@ -49,6 +57,44 @@ sys.path.append(str(Path(__file__).parents[2]) + "/scripts")
 from crypto import em_decrypt
 
 
+def load_file(my_file: TaskFile, temp_path: Path) -> Path:
+    """Get an output file from the local cache, or the SMB backup server."""
+    cached = file_cache.get(my_file.id, my_file.file_hash, temp_path / my_file.name)
+
+    if cached is not None:
+        return cached
+
+    temp_file = Path(
+        Smb(
+            task=my_file.task,
+            run_id=my_file.job_id,
+            connection=None,  # "default",
+            directory=temp_path,
+        )
+        .read(my_file.path, local_name=my_file.name)[0]
+        .name
+    )
+
+    file_cache.add(my_file.id, my_file.file_hash, temp_file)
+
+    return temp_file
+
+
+def cache_stream(
+    my_file: TaskFile, blocks: Iterator[bytes], temp_path: Path
+) -> Generator[bytes, None, None]:
+    """Pass on the blocks of a file, adding the whole file to the cache."""
+    temp_path.mkdir(parents=True, exist_ok=True)
+
+    with tempfile.NamedTemporaryFile(dir=temp_path) as temp_file:
+        for block in blocks:
+            temp_file.write(block)
+            yield block
+
+        temp_file.flush()
+        file_cache.add(my_file.id, my_file.file_hash, temp_file.name)
+
+
 @web_bp.route("/api")
 def alive() -> dict:
     """Check API status."""
@@ -77,12 +123,7 @@ def send_ftp(task_id: int, run_id: int, file_id: int) -> dict:
         temp_path.mkdir(parents=True, exist_ok=True)
 
         # download the file
-        Smb(
-            task=task,
-            run_id=my_file.job_id,
-            connection=None,  # "default",
-            directory=temp_path,
-        ).read(my_file.path)
+        load_file(my_file, temp_path)
 
         # upload the file
         Ftp(
@@ -121,12 +162,7 @@ def send_sftp(run_id: int, file_id: int) -> dict:
         temp_path.mkdir(parents=True, exist_ok=True)
 
         # download the file
-        Smb(
-            task=task,
-            run_id=my_file.job_id,
-            connection=None,  # "default",
-            directory=temp_path,
-        ).read(my_file.path)
+        load_file(my_file, temp_path)
 
         # upload the file
         Sftp(
@@ -168,12 +204,7 @@ def send_smb(run_id: int, file_id: int) -> dict:
         temp_path.mkdir(parents=True, exist_ok=True)
 
         # download the file
-        Smb(
-            task=task,
-            run_id=my_file.job_id,
-            connection=None,  # "default",
-            directory=temp_path,
-        ).read(my_file.path)
+        load_file(my_file, temp_path)
 
         # upload the file
         Smb(
@@ -215,12 +246,7 @@ def send_email(run_id: int, file_id: int) -> dict:
         temp_path.mkdir(parents=True, exist_ok=True)
 
         # download the file
-        downloaded_files = Smb(
-            task=task,
-            run_id=my_file.job_id,
-            connection=None,  # "default",
-            directory=temp_path,
-        ).read(my_file.path)
+        downloaded_file = load_file(my_file, temp_path)
 
         # send the file
 
@@ -237,7 +263,7 @@ def send_email(run_id: int, file_id: int) -> dict:
             message=template.render(
                 task=task, success=1, date=date, logs=[], org=app.config["ORG_NAME"]
             ),
-            attachments=[x.name for x in downloaded_files],
+            attachments=[str(downloaded_file)],
         )
 
         return jsonify({"message": "successfully sent file."})
@@ -328,18 +354,69 @@ def get_task_file_download(file_id: int) -> dict:
 
     temp_path.mkdir(parents=True, exist_ok=True)
 
-    temp_file = (
-        Smb(
-            task=task,
-            run_id=my_file.job_id,
-            connection=None,  # "default",
-            directory=temp_path,
+    temp_file = load_file(my_file, temp_path)
+
+    return jsonify({"message": str(temp_file)})
+
+
+@web_bp.route("/api/file/<file_id>/stream")
+def stream_task_file(file_id: int) -> Response:
+    """Stream a file from the local cache or the SMB backup server.
+
+    Cached files are sent from disk. Other files are sent while they
+    download from the backup server, and are then cached. Range requests
+    are supported, so downloads can be resumed.
+    """
+    my_file = TaskFile.query.filter_by(id=file_id).first()
+
+    if not my_file:
+        response = jsonify({"error": "no such file."})
+        response.status_code = 404
+        return response
+
+    cached = file_cache.find(my_file.id, my_file.file_hash)
+
+    if cached is not None:
+        return send_file(
+            cached, as_attachment=True, download_name=my_file.name, conditional=True, max_age=0
         )
-        .read(my_file.path)[0]
-        .name
+
+    temp_path = Path(__file__).parent.parent / "temp"
+
+    smb = Smb(
+        task=my_file.task,
+        run_id=my_file.job_id,
+        connection=None,  # "default",
+        directory=temp_path,
     )
 
-    return jsonify({"message": temp_file})
+    size = smb.size(my_file.path)
+    byte_range = request.range.range_for_length(size) if request.range else None
+
+    if request.range and byte_range is None:
+        return Response(status=416, headers={"Content-Range": f"bytes */{size}"})
+
+    start, stop = byte_range or (0, size)
+    blocks = smb.stream(my_file.path, start, stop - start)
+
+    # whole files are cached as they are sent
+    if byte_range is None and int(app.config.get("FILE_CACHE_SIZE", 0)) > 0:
+        blocks = cache_stream(my_file, blocks, temp_path)
+
+    response = Response(
+        stream_with_context(blocks),
+        status=206 if byte_range else 200,
+        mimetype=mimetypes.guess_type(my_file.name)[0] or "application/octet-stream",
+        direct_passthrough=True,
+    )
+    response.content_length = stop - start
+    response.accept_ranges = "bytes"
+    response.headers.set("Content-Disposition", "attachment", filename=my_file.name)
+
+    if byte_range:
+        response.content_range = ContentRange("bytes", start, stop, size)
+
+    return response
 
 
 @web_bp.route("/api/ssh/<ssh_id>/status")
@@ -359,29 +436,74 @@ def database_online(database_id: int) -> str:
     """Check if connection is online."""
     try:
         database_connection = ConnectionDatabase.query.filter_by(id=database_id).first()
+        connection = em_decrypt(database_connection.connection_string, app.config["PASS_KEY"])
+        timeout = database_connection.timeout or app.config["DEFAULT_SQL_TIMEOUT"]
+
+        # pooled connections are checked before they are handed out.
         if database_connection.type_id == 2:
-            conn, _ = sql_connect(
-                em_decrypt(database_connection.connection_string, app.config["PASS_KEY"]).strip(),
-                database_connection.timeout or app.config["DEFAULT_SQL_TIMEOUT"],
-            )
-            conn.close()
+            connection_pool = sql_pool(database_connection.id, connection, timeout)
         elif database_connection.type_id == 3:
-            conn, _ = jdbc_connect(
-                em_decrypt(database_connection.connection_string, app.config["PASS_KEY"]).strip(),
-            )
-            conn.close()
+            connection_pool = jdbc_pool(database_connection.id, connection)
         else:
-            conn, _ = pg_connect(
-                em_decrypt(database_connection.connection_string, app.config["PASS_KEY"]).strip(),
-                database_connection.timeout or app.config["DEFAULT_SQL_TIMEOUT"],
-            )
-            conn.close()
+            connection_pool = pg_pool(database_connection.id, connection, timeout)
+
+        with connection_pool.connection():
+            pass
 
         return '<span class="tag is-success is-light">Online</span>'
     except BaseException as e:
         return f'<span class="has-tooltip-arrow has-tooltip-right has-tooltip-multiline tag is-danger is-light" data-tooltip="{e}">Offline</span>'
 
 
+@web_bp.route("/api/database/<database_id>/pool")
+def database_pool(database_id: int) -> dict:
+    """Get connection pool statistics of a database."""
+    return jsonify(pool_stats(int(database_id)) or {})
+
+
+@web_bp.route("/api/smb/<smb_id>/pool")
+def smb_pool_stats(smb_id: int) -> dict:
+    """Get connection pool statistics of a SMB connection.
+
+    Created connections are pool misses, and reused connections are hits.
+    """
+    smb_connection = ConnectionSmb.query.filter_by(id=smb_id).first_or_404()
+    return jsonify(
+        smb_pool(
+            str(smb_connection.username),
+            str(smb_connection.password),
+            str(smb_connection.server_name),
+            str(smb_connection.server_ip),
+        ).stats()
+    )
+
+
+@web_bp.route("/api/archive/clean")
+def archive_clean() -> dict:
+    """Remove archived backup files that are no longer used."""
+    referenced = {
+        path
+        for (path,) in db.session.query(TaskFile.path)
+        .filter(TaskFile.path.like(archive_folder() + "/%"))  # type: ignore[union-attr]
+        .all()
+    }
+
+    with smb_pool(
+        str(app.config["SMB_USERNAME"]),
+        str(app.config["SMB_PASSWORD"]),
+        str(app.config["SMB_SERVER_NAME"]),
+        str(app.config["SMB_SERVER_IP"]),
+    ).connection() as conn:
+        removed = smb_archive_clean(
+            conn,
+            app.config["SMB_DEFAULT_SHARE"].strip("/").strip("\\"),
+            referenced,
+            int(app.config.get("BACKUP_ARCHIVE_MIN_AGE", 60 * 60 * 24)),
+        )
+
+    return jsonify({"removed": removed})
+
+
 @web_bp.route("/api/sftp/<sftp_id>/status")
 def sftp_online(sftp_id: int) -> str:
     """Check if connection is online."""
@@ -412,13 +534,13 @@ def smb_online(smb_id: int) -> str:
     """Check if connection is online."""
     try:
         smb_connection = ConnectionSmb.query.filter_by(id=smb_id).first()
-        smb_connect(
-            smb_connection.username,
-            em_decrypt(smb_connection.password, app.config["PASS_KEY"]),
-            smb_connection.server_name,
-            smb_connection.server_ip,
-        )
-        # we do not close smb connections. they are recycled.
+        with smb_pool(
+            str(smb_connection.username),
+            str(smb_connection.password),
+            str(smb_connection.server_name),
+            str(smb_connection.server_ip),
+        ).connection():
+            pass
         return '<span class="tag is-success is-light">Online</span>'
     except BaseException as e:
         return f'<span class="has-tooltip-arrow has-tooltip-right has-tooltip-multiline tag is-danger is-light" data-tooltip="{e}">Offline</span>'
@@ -7,6 +7,7 @@ from pathlib import Path
 
 import psutil
 from flask import current_app as app
+from requests import get
 from sqlalchemy import update
 
 from scheduler.extensions import atlas_scheduler, db
@@ -78,6 +79,27 @@ def job_clean_orphans() -> None:
         print(str(e))  # noqa: T201
 
 
+@atlas_scheduler.task(
+    "interval",
+    id="archive_clean",
+    hours=24,
+    max_instances=1,
+    start_date="2000-01-01 02:37:00",
+)
+def archive_clean() -> None:
+    """Job to remove archived backup files that no task file uses."""
+    try:
+        with atlas_scheduler.app.app_context():
+            if not app.config.get("BACKUP_ARCHIVE", False):
+                return
+
+            get(app.config["RUNNER_HOST"] + "/archive/clean", timeout=60 * 60)
+
+    # pylint: disable=broad-except
+    except BaseException as e:
+        print(str(e))  # noqa: T201
+
+
 def drop_them(temp_path: Path, age: int) -> None:
     """Cleanup function to remove files older than age."""
     for temp_file in temp_path.glob("*/*/*"):
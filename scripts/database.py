@@ -74,6 +74,7 @@ def seed(session: SqlSession, model: Any) -> None:
         name="Other (specify in filename)",
         ext="",
     )
+    get_or_create(session, model.TaskDestinationFileType, name="Parquet (.parquet)", ext="parquet")
 
     # task status
     get_or_create(session, model.TaskStatus, name="Running")
@@ -595,6 +595,9 @@
       p.querySelector('.task-query-headers').style.display = 'none';
       p.querySelector('.task-query-cache').style.display = 'none';
       p.querySelector('.task-query-requireOut').style.display = 'none';
+      p.querySelector('.task-query-postgresCopy').style.display = 'none';
+      p.querySelector('.task-query-partition').style.display = 'none';
+      p.querySelector('.task-query-watermark').style.display = 'none';
 
       if (t.value === '1') {
         p.querySelector('.task-sourceDatabase').style.removeProperty('display');
@@ -604,6 +607,15 @@
         p.querySelector('.task-query-requireOut').style.removeProperty(
           'display',
         );
+        p.querySelector('.task-query-postgresCopy').style.removeProperty(
+          'display',
+        );
+        p.querySelector('.task-query-partition').style.removeProperty(
+          'display',
+        );
+        p.querySelector('.task-query-watermark').style.removeProperty(
+          'display',
+        );
       } else if (t.value === '2') {
         p.querySelector('.task-sourceSmb').style.removeProperty('display');
       } else if (t.value === '3') {
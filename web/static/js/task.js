@@ -46,9 +46,43 @@
       };
     }
   }
+  function taskProgress(task_id) {
+    if (window.ajaxOn === true) {
+      var q = new XMLHttpRequest();
+      q.open('get', '/task/{}/progress'.format(task_id), true);
+      q.send();
+      q.onload = function () {
+        var data = JSON.parse(q.responseText),
+          row = d.querySelector('.task-progress');
+
+        if (!row) return;
+
+        // only show progress while a query is running
+        if (data.status !== 'running') {
+          row.classList.add('is-hidden');
+          return;
+        }
+
+        for (var key in data) {
+          var els = Array.prototype.slice.call(
+            d.querySelectorAll('.progress_{}'.format(key)),
+          );
+
+          for (var x = 0; x < els.length; x++) {
+            els[x].innerHTML =
+              typeof data[key] === 'number'
+                ? data[key].toLocaleString()
+                : data[key];
+          }
+        }
+        row.classList.remove('is-hidden');
+      };
+    }
+  }
   if (task_id) {
     setInterval(function () {
       taskHello(task_id.getAttribute('task_id'));
+      taskProgress(task_id.getAttribute('task_id'));
     }, 3000);
   }
 
@@ -288,6 +288,7 @@ def test_new_sftp(client_fixture: fixture) -> None:
         "username": "albany",
         "password": "new york",
         "ssh_key": "cool key",
+        "window_size": "16",
     }
 
     response = client_fixture.post(
@@ -304,6 +305,7 @@ def test_new_sftp(client_fixture: fixture) -> None:
     assert data["username"] in response.get_data(as_text=True)
     assert data["password"] in response.get_data(as_text=True)
     assert data["ssh_key"] in response.get_data(as_text=True)
+    assert "16 MB" in response.get_data(as_text=True)
 
     # edit
     soup = BeautifulSoup(response.data, features="lxml")
@@ -18,7 +18,7 @@ import time
 from flask import request, url_for
 from pytest import fixture
 
-from web.extensions import db
+from web.extensions import db, redis_client
 
 from .conftest import create_demo_task
 
@@ -129,6 +129,35 @@ def test_valid_task_status(client_fixture: fixture) -> None:
     assert json.loads(page.get_data(as_text=True))["status"] == ""
 
 
+def test_task_progress(client_fixture: fixture) -> None:
+    _, t_id = create_demo_task(db.session)
+    redis_client.delete(f"runner_{t_id}_progress")
+
+    page = client_fixture.get(url_for("task_controls_bp.task_progress", task_id=t_id))
+    assert page.status_code == 200
+    assert json.loads(page.get_data(as_text=True)) == {}
+
+    now = int(time.time())
+    redis_client.hset(
+        f"runner_{t_id}_progress",
+        mapping={
+            "run_id": "1",
+            "status": "running",
+            "rows": 5000,
+            "started": now - 10,
+            "updated": now,
+        },
+    )
+
+    page = client_fixture.get(url_for("task_controls_bp.task_progress", task_id=t_id))
+    progress = json.loads(page.get_data(as_text=True))
+    assert progress["status"] == "running"
+    assert progress["rows"] == 5000
+    assert progress["rows_per_second"] == 500
+
+    redis_client.delete(f"runner_{t_id}_progress")
+
+
 def test_delete_invalid_task(client_fixture: fixture) -> None:
     # test invalid task
     page = client_fixture.get(
@@ -140,12 +169,18 @@ def test_delete_invalid_task(client_fixture: fixture) -> None:
 
 
 def test_delete_valid_task(client_fixture: fixture) -> None:
+    from web.model import TaskDelivery
+
     _, t_id = create_demo_task(db.session)
+    db.session.add(TaskDelivery(task_id=t_id, destination="sftp-1", file_hash="aaa"))
+    db.session.commit()
+
     page = client_fixture.get(
         url_for("task_controls_bp.delete_task", task_id=t_id), follow_redirects=True
     )
     assert page.status_code == 200
     assert b"Deleting task" in page.data
+    assert TaskDelivery.query.filter_by(task_id=t_id).first() is None
 
     # this will show in executor messages
     executor = client_fixture.get(url_for("executors_bp.executor_status"))
@@ -197,3 +232,25 @@ def test_reset_valid_task(client_fixture: fixture) -> None:
     assert page.status_code == 200
 
     assert "Task has been reset to completed." in page.get_data(as_text=True)
+
+
+def test_reset_watermark(client_fixture: fixture) -> None:
+    from web.model import Task, TaskWatermark
+
+    _, t_id = create_demo_task(db.session)
+
+    task = Task.query.filter_by(id=t_id).first()
+    task.source_watermark_column = "id"
+    task.source_watermark_param = "@last_id"
+    db.session.add(TaskWatermark(task_id=t_id, value="100"))
+    db.session.commit()
+
+    page = client_fixture.get(url_for("task_bp.one_task", task_id=t_id))
+    assert page.status_code == 200
+
+    page = client_fixture.get(
+        url_for("task_controls_bp.reset_watermark", task_id=t_id), follow_redirects=True
+    )
+    assert page.status_code == 200
+    assert "Task watermark has been reset." in page.get_data(as_text=True)
+    assert TaskWatermark.query.filter_by(task_id=t_id).first() is None
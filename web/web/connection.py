@@ -131,6 +131,7 @@ def _cleanup_sftp_tasks(sftp_ids: list[int]) -> set[int]:
                     "destination_sftp": 0,
                     "destination_sftp_overwrite": None,
                     "destination_sftp_dont_send_empty_file": None,
+                    "destination_sftp_skip_unchanged": None,
                 },
             ),
         ]
@@ -192,6 +193,7 @@ def _cleanup_ftp_tasks(ftp_ids: list[int]) -> set[int]:
                     "destination_ftp": 0,
                     "destination_ftp_overwrite": None,
                     "destination_ftp_dont_send_empty_file": None,
+                    "destination_ftp_skip_unchanged": None,
                 },
             ),
         ]
@@ -238,6 +240,7 @@ def _cleanup_smb_tasks(smb_ids: list[int]) -> set[int]:
                     "destination_smb": 0,
                     "destination_smb_overwrite": None,
                     "destination_smb_dont_send_empty_file": None,
+                    "destination_smb_skip_unchanged": None,
                 },
             ),
         ]
@@ -469,6 +472,7 @@ def edit_connection_sftp(connection_id: int, sftp_id: int) -> Response:
                 if form.get("key_password", type=str)
                 else None
             ),
+            "window_size": form.get("window_size", None, type=int),
         }
     )
 
@@ -525,6 +529,7 @@ def new_connection_sftp(connection_id: int) -> Response:
             if form.get("key_password", type=str)
             else None
         ),
+        window_size=form.get("window_size", None, type=int),
     )
 
     db.session.add(sftp)
@@ -1024,6 +1029,7 @@ def edit_connection_database(connection_id: int, database_id: int) -> Response:
                 else None
             ),
             "timeout": form.get("timeout", app.config["DEFAULT_SQL_TIMEOUT"], type=int),
+            "max_fetch_size": form.get("max_fetch_size", None, type=int),
         }
     )
 
@@ -1068,6 +1074,7 @@ def new_connection_database(connection_id: int) -> Response:
             else None
         ),
         timeout=form.get("timeout", app.config["DEFAULT_SQL_TIMEOUT"], type=int),
+        max_fetch_size=form.get("max_fetch_size", None, type=int),
     )
 
     db.session.add(database)
@@ -13,7 +13,17 @@ from sqlalchemy.sql import functions as func
 from werkzeug import Response
 
 from web import cache, db
-from web.model import Project, ProjectParam, Task, TaskFile, TaskLog, TaskParam, User
+from web.model import (
+    Project,
+    ProjectParam,
+    Task,
+    TaskDelivery,
+    TaskFile,
+    TaskLog,
+    TaskParam,
+    TaskWatermark,
+    User,
+)
 from web.web import submit_executor
 
 from . import get_or_create
@@ -310,6 +320,18 @@ def delete_project(project_id: int) -> Response:
     )
     db.session.commit()
 
+    # delete task watermarks
+    db.session.query(TaskWatermark).filter(TaskWatermark.task_id.in_(tasks)).delete(  # type: ignore[attr-defined,union-attr]
+        synchronize_session=False
+    )
+    db.session.commit()
+
+    # delete task delivery ledger
+    db.session.query(TaskDelivery).filter(TaskDelivery.task_id.in_(tasks)).delete(  # type: ignore[attr-defined,union-attr]
+        synchronize_session=False
+    )
+    db.session.commit()
+
     # delete tasks
     db.session.query(Task).filter(Task.project_id == project_id).delete(synchronize_session=False)
     db.session.commit()
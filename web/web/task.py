@@ -25,6 +25,7 @@ from web.model import (
     Project,
     Task,
     TaskLog,
+    TaskWatermark,
     User,
 )
 from web.web import submit_executor
@@ -151,6 +152,7 @@ def one_task(task_id: int) -> Union[str, Response]:
             title=task.name,
             language=("bash" if task.source_type_id == 6 else "sql"),
             has_secrets=any(p.sensitive == 1 for p in task.params),
+            watermark=TaskWatermark.query.filter_by(task_id=task.id).first(),
         )
 
     flash("Task does not exist.")
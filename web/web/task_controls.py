@@ -1,5 +1,7 @@
 """Task web views."""
 
+import datetime
+
 import requests
 from flask import Blueprint
 from flask import current_app as app
@@ -9,7 +11,7 @@ from RelativeToNow import relative_to_now
 from werkzeug.wrappers import Response
 
 from web import db, redis_client
-from web.model import Task, TaskFile, TaskLog, TaskParam
+from web.model import Task, TaskDelivery, TaskFile, TaskLog, TaskParam, TaskWatermark
 from web.web import submit_executor
 
 task_controls_bp = Blueprint("task_controls_bp", __name__)
@@ -169,6 +171,37 @@ def task_status(task_id: int) -> Response:
     return jsonify({})
 
 
+@task_controls_bp.route("/task/<task_id>/progress")
+@login_required
+def task_progress(task_id: int) -> Response:
+    """Get live query progress of a running task.
+
+    The runner counts rows in redis while a query is extracting.
+    """
+    progress = {
+        key.decode("utf-8"): value.decode("utf-8")
+        for key, value in redis_client.hgetall("runner_" + str(task_id) + "_progress").items()
+    }
+
+    if not progress:
+        return jsonify({})
+
+    rows = int(progress.get("rows", 0))
+    started = float(progress.get("started", 0))
+    updated = float(progress.get("updated", 0))
+    elapsed = updated - started
+
+    return jsonify(
+        {
+            "run_id": progress.get("run_id"),
+            "status": progress.get("status"),
+            "rows": rows,
+            "rows_per_second": int(rows / elapsed) if elapsed > 0 else 0,
+            "updated": relative_to_now(datetime.datetime.fromtimestamp(updated).astimezone()),
+        }
+    )
+
+
 @task_controls_bp.route("/task/<task_id>/delete")
 @login_required
 def delete_task(task_id: int) -> Response:
@@ -186,6 +219,10 @@ def delete_task(task_id: int) -> Response:
         db.session.commit()
         TaskParam.query.filter_by(task_id=task_id).delete()
         db.session.commit()
+        TaskWatermark.query.filter_by(task_id=task_id).delete()
+        db.session.commit()
+        TaskDelivery.query.filter_by(task_id=task_id).delete()
+        db.session.commit()
         Task.query.filter_by(id=task_id).delete()
         db.session.commit()
 
@@ -255,3 +292,28 @@ def reset_task(task_id: int) -> Response:
         return redirect(url_for("task_bp.one_task", task_id=task_id))
     flash("Task does not exist.")
     return redirect(url_for("task_bp.all_tasks"))
+
+
+@task_controls_bp.route("/task/<task_id>/watermark/reset")
+@login_required
+def reset_watermark(task_id: int) -> Response:
+    """Clear the watermark of an incremental task.
+
+    The next run starts again from the value declared in the query.
+    """
+    task = Task.query.filter_by(id=task_id).first()
+    if task:
+        TaskWatermark.query.filter_by(task_id=task_id).delete()
+        db.session.commit()
+
+        log = TaskLog(  # type: ignore[call-arg]
+            task_id=task.id,
+            status_id=7,
+            message=(current_user.full_name or "none") + ": Reset task watermark.",
+        )
+        db.session.add(log)
+        db.session.commit()
+        flash("Task watermark has been reset.")
+        return redirect(url_for("task_bp.one_task", task_id=task_id))
+    flash("Task does not exist.")
+    return redirect(url_for("task_bp.all_tasks"))
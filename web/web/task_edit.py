@@ -94,6 +94,12 @@ def task_new(project_id: int) -> Union[str, Response]:
         source_sftp_ignore_delimiter=form.get("task_sftp_ignore_delimiter", None, type=int),
         enable_source_cache=form.get("task_enable_source_cache", None, type=int),
         source_require_sql_output=form.get("task_require_sql_output", None, type=int),
+        source_postgres_copy=form.get("task_postgres_copy", None, type=int),
+        source_partition_count=form.get("sourcePartitionCount", None, type=int),
+        source_partition_column=form.get("sourcePartitionColumn", None, type=str),
+        source_partition_predicates=form.get("sourcePartitionPredicates", None, type=str),
+        source_watermark_column=form.get("sourceWatermarkColumn", None, type=str),
+        source_watermark_param=form.get("sourceWatermarkParam", None, type=str),
         source_sftp_delimiter=form.get("sourceSftpDelimiter", None, type=str),
         source_ftp_id=form.get("task-source-ftp", None, type=int),
         source_ftp_file=form.get("sourceFtpFile", None, type=str),
@@ -141,14 +147,17 @@ def task_new(project_id: int) -> Union[str, Response]:
         destination_sftp_id=form.get("task-destination-sftp", None, type=int),
         destination_sftp_overwrite=form.get("task_overwrite_sftp", None, type=int),
         destination_sftp_dont_send_empty_file=form.get("task_sftp_dont_send_empty", 0, type=int),
+        destination_sftp_skip_unchanged=form.get("task_sftp_skip_unchanged", 0, type=int),
         destination_ftp=form.get("task_save_ftp", 0, type=int),
         destination_ftp_id=form.get("task-destination-ftp", None, type=int),
         destination_ftp_overwrite=form.get("task_overwrite_ftp", None, type=int),
         destination_ftp_dont_send_empty_file=form.get("task_ftp_dont_send_empty", 0, type=int),
+        destination_ftp_skip_unchanged=form.get("task_ftp_skip_unchanged", 0, type=int),
         destination_smb=form.get("task_save_smb", 0, type=int),
         destination_smb_id=form.get("task-destination-smb", None, type=int),
         destination_smb_overwrite=form.get("task_overwrite_smb", None, type=int),
         destination_smb_dont_send_empty_file=form.get("task_smb_dont_send_empty", 0, type=int),
+        destination_smb_skip_unchanged=form.get("task_smb_skip_unchanged", 0, type=int),
         email_completion=form.get("task_send_completion_email", 0, type=int),
         email_completion_recipients=form.get("completionEmailRecip", "", type=str),
         email_completion_message=form.get("completion_email_msg", "", type=str),
@@ -375,6 +384,12 @@ def task_edit_post(task_id: int) -> Response:
             source_ftp_ignore_delimiter=form.get("task_ftp_ignore_delimiter", None, type=int),
             enable_source_cache=form.get("task_enable_source_cache", None, type=int),
             source_require_sql_output=form.get("task_require_sql_output", None, type=int),
+            source_postgres_copy=form.get("task_postgres_copy", None, type=int),
+            source_partition_count=form.get("sourcePartitionCount", None, type=int),
+            source_partition_column=form.get("sourcePartitionColumn", None, type=str),
+            source_partition_predicates=form.get("sourcePartitionPredicates", None, type=str),
+            source_watermark_column=form.get("sourceWatermarkColumn", None, type=str),
+            source_watermark_param=form.get("sourceWatermarkParam", None, type=str),
             source_ftp_delimiter=form.get("sourceFtpDelimiter", None, type=str),
             source_ssh_id=form.get("task-source-ssh", None, type=int),
             source_query_type_id=form.get("sourceQueryType", None, type=int),
@@ -420,14 +435,17 @@ def task_edit_post(task_id: int) -> Response:
             destination_sftp_dont_send_empty_file=form.get(
                 "task_sftp_dont_send_empty", 0, type=int
             ),
+            destination_sftp_skip_unchanged=form.get("task_sftp_skip_unchanged", 0, type=int),
             destination_ftp=form.get("task_save_ftp", 0, type=int),
             destination_ftp_id=form.get("task-destination-ftp", None, type=int),
             destination_ftp_overwrite=form.get("task_overwrite_ftp", None, type=int),
             destination_ftp_dont_send_empty_file=form.get("task_ftp_dont_send_empty", 0, type=int),
+            destination_ftp_skip_unchanged=form.get("task_ftp_skip_unchanged", 0, type=int),
             destination_smb=form.get("task_save_smb", 0, type=int),
             destination_smb_id=form.get("task-destination-smb", None, type=int),
             destination_smb_overwrite=form.get("task_overwrite_smb", None, type=int),
             destination_smb_dont_send_empty_file=form.get("task_smb_dont_send_empty", 0, type=int),
+            destination_smb_skip_unchanged=form.get("task_smb_skip_unchanged", 0, type=int),
             email_completion=form.get("task_send_completion_email", 0, type=int),
             email_completion_recipients=form.get("completionEmailRecip", "", type=str),
             email_completion_message=form.get("completion_email_msg", "", type=str),
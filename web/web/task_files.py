@@ -1,15 +1,12 @@
 """Task web views."""
 
-import json
-import os
-import zipfile
 from dataclasses import dataclass
 from typing import Generator, Optional
 
 import requests
 from flask import Blueprint
 from flask import current_app as app
-from flask import jsonify, redirect, send_file, url_for
+from flask import jsonify, redirect, request, url_for
 from flask_login import current_user, login_required
 from werkzeug.wrappers import Response
 
@@ -19,6 +16,9 @@ from web.model import TaskFile
 
 task_files_bp = Blueprint("task_files_bp", __name__)
 
+# bytes sent to the browser at a time
+DOWNLOAD_BLOCK_SIZE = 1024 * 1024
+
 
 @dataclass
 class RunnerLog:
@@ -197,27 +197,53 @@ def one_task_file_download(file_id: int) -> Response:
             f"{current_user.full_name} Manually downloading file.\n{my_file.name}",
         )
 
-        source_file = json.loads(
-            requests.get("%s/file/%s" % (app.config["RUNNER_HOST"], file_id), timeout=60).text,
-        ).get("message")
-
-        def stream_and_remove_file() -> Generator:
-            yield from file_handle
-            os.remove(source_file)
+        # the runner sends the file while it loads, and supports resuming
+        headers = {
+            header: request.headers[header]
+            for header in ["Range", "If-Range"]
+            if header in request.headers
+        }
+
+        runner = requests.get(
+            f"{app.config['RUNNER_HOST']}/file/{file_id}/stream",
+            headers=headers,
+            stream=True,
+            timeout=60,
+        )
 
-        # check if it is a zip
+        if runner.status_code == 416:
+            runner.close()
+            return Response(
+                status=416, headers={"Content-Range": runner.headers.get("Content-Range", "")}
+            )
 
-        if zipfile.is_zipfile(source_file):
-            return send_file(source_file, as_attachment=True, download_name=my_file.name)  # type: ignore[call-arg]
+        if runner.status_code not in [200, 206]:
+            runner.close()
+            return jsonify({"error": "failed to load file."})
 
-        # otherwise, stream it.
-        # pylint: disable=R1732
-        file_handle = open(source_file, "r")  # noqa:SIM115
+        def stream_file() -> Generator:
+            try:
+                yield from runner.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE)
+            finally:
+                runner.close()
 
         return Response(
-            stream_and_remove_file(),
-            mimetype="text",
-            headers={"Content-disposition": "attachment; filename=" + my_file.name},
+            stream_file(),
+            status=runner.status_code,
+            headers={
+                header: runner.headers[header]
+                for header in [
+                    "Content-Type",
+                    "Content-Length",
+                    "Content-Range",
+                    "Content-Disposition",
+                    "Accept-Ranges",
+                    "ETag",
+                    "Last-Modified",
+                ]
+                if header in runner.headers
+            },
+            direct_passthrough=True,
         )
 
     return jsonify({"error": "no such file."})